@@ -0,0 +1,182 @@
+# ASGI entry point, for uvicorn or hypercorn:
+#
+#   uvicorn asgi:app --host 0.0.0.0 --port 10000
+#
+# Serves the same /api contract as main.py, from the same route handlers.
+# Keep-alive connections and the /api/events streams live on the event loop
+# and cost no thread while idle; the Flask handlers themselves run on a
+# bounded thread pool, so a request waiting for its write to become durable
+# (store.sync) or a slow client reading an export never blocks the loop.
+# Event streams are served natively from Broadcaster.astream().
+#
+# Run one process per core with --workers and the SQLite storage backend,
+# exactly as with several gunicorn workers.
+
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, List, Tuple
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import Headers
+from werkzeug.exceptions import ClientDisconnected
+
+import main
+
+THREADS = int(os.environ.get("LIBRARY_ASGI_THREADS", 32))
+
+executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix="wsgi")
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif scope["type"] == "http":
+        if scope["path"] == "/api/events" and scope["method"] == "GET":
+            await stream_events(scope, receive, send)
+        else:
+            await call_flask(scope, receive, send)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await asyncio.get_running_loop().run_in_executor(executor, main.store.close)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def stream_events(scope, receive, send):
+    headers = Headers([(k.decode("latin-1"), v.decode("latin-1")) for k, v in scope["headers"]])
+    args = dict(parse_qsl(scope["query_string"].decode("latin-1")))
+    loop = asyncio.get_running_loop()
+    # Pick up other workers' changes before computing the resume point.
+    await loop.run_in_executor(executor, main.store.refresh)
+    cursor = main.event_cursor(headers, args)
+
+    response_headers = [(b"content-type", b"text/event-stream; charset=utf-8"),
+                        (b"x-store-id", main.store.store_id.encode())]
+    response_headers += [(k.lower().encode(), v.encode()) for k, v in main.EVENT_HEADERS.items()]
+    await send({"type": "http.response.start", "status": 200, "headers": response_headers})
+
+    async def pump():
+        async for frame in main.events.astream(cursor):
+            await send({"type": "http.response.body", "body": frame, "more_body": True})
+
+    async def disconnected():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    # Servers don't necessarily fail send() once the client has gone, so the
+    # stream ends when the disconnect message arrives.
+    tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class RequestBody(io.RawIOBase):
+    # wsgi.input for a handler running on the pool: each read waits for the
+    # next body message from the loop, so an import streams through instead
+    # of being buffered whole before the handler starts.
+
+    def __init__(self, receive, loop: asyncio.AbstractEventLoop):
+        self._receive = receive
+        self._loop = loop
+        self._chunk = memoryview(b"")
+        self._more = True
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnected()
+            self._chunk = memoryview(message.get("body", b""))
+            self._more = message.get("more_body", False)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
+async def call_flask(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    environ = wsgi_environ(scope, io.BufferedReader(RequestBody(receive, loop)))
+
+    def run():
+        # Runs on the pool; every ASGI message is handed back to the loop and
+        # waited for, so a slow reader throttles the response producer.
+        def send_sync(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        started: List[Tuple[bytes, bytes]] = []
+        status = []
+
+        def start_response(status_line, headers, exc_info=None):
+            status[:] = [int(status_line.split(" ", 1)[0])]
+            started[:] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+        result = main.app(environ, start_response)
+        try:
+            head_sent = False
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not head_sent:
+                    send_sync({"type": "http.response.start", "status": status[0],
+                               "headers": started})
+                    head_sent = True
+                send_sync({"type": "http.response.body", "body": chunk, "more_body": True})
+            if not head_sent:
+                send_sync({"type": "http.response.start", "status": status[0],
+                           "headers": started})
+            send_sync({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+    await loop.run_in_executor(executor, run)
+
+
+def wsgi_environ(scope, body: IO[bytes]) -> dict:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    path = scope.get("raw_path") or scope["path"].encode()
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": path.split(b"?", 1)[0].decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        "wsgi.input_terminated": True,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        key = "HTTP_" + name
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
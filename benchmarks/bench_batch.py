@@ -0,0 +1,70 @@
+# Circulation desk scan: per-book requests versus the batch endpoints.
+#
+#   python benchmarks/bench_batch.py [books] [--storage SPEC]
+#
+# Issues and then returns `books` books, once the way the frontend does it
+# today (one POST per book followed by a /api/stats refetch) and once with
+# POST /api/books/issue and /api/books/return. Uses a temporary WAL store by
+# default so the per-request durability wait is part of the measurement.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument("books", nargs="?", type=int, default=500)
+parser.add_argument("--storage", default=None, help="LIBRARY_STORAGE spec to use")
+args = parser.parse_args()
+os.environ["LIBRARY_STORAGE"] = args.storage or f"wal:{tempfile.mkdtemp()}"
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import main  # noqa: E402
+
+
+FIRST_ID = 1_000_000
+
+
+def seed(client, count: int):
+    body = "".join(f'{{"id": {i}, "title": "T{i}", "author": "A", "year": 2000}}\n'
+                   for i in range(FIRST_ID, FIRST_ID + count))
+    client.post("/api/books/import", data=body, content_type="application/x-ndjson")
+
+
+def per_book(client, ids) -> int:
+    requests = 0
+    for action in ("issue", "return"):
+        for book_id in ids:
+            assert client.post(f"/api/books/{book_id}/{action}").status_code == 200
+            client.get("/api/stats")
+            requests += 2
+    return requests
+
+
+def batched(client, ids) -> int:
+    requests = 0
+    for action in ("issue", "return"):
+        for start in range(0, len(ids), main.MAX_BATCH_SIZE):
+            chunk = ids[start:start + main.MAX_BATCH_SIZE]
+            result = client.post(f"/api/books/{action}", json={"ids": chunk}).get_json()
+            assert result["failed"] == 0, result
+            requests += 1
+    return requests
+
+
+def run():
+    client = main.app.test_client()
+    seed(client, args.books)
+    ids = list(range(FIRST_ID, FIRST_ID + args.books))
+    for name, fn in (("per-book", per_book), ("batch", batched)):
+        start = time.perf_counter()
+        requests = fn(client, ids)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<9} {requests:>6} requests  {elapsed * 1000:>9.1f} ms  "
+              f"{2 * args.books / elapsed:>10,.0f} books/s")
+
+
+if __name__ == "__main__":
+    run()
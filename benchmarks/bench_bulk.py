@@ -0,0 +1,59 @@
+# Rows/second for bulk import and streaming export through the Flask app.
+#
+#   python benchmarks/bench_bulk.py [rows]
+#
+# Imports `rows` books as NDJSON and again as CSV into an empty catalogue via
+# POST /api/books/import, then streams them back out with
+# GET /api/books/export in both formats.
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import main as server  # noqa: E402
+
+DEFAULT_ROWS = 500_000
+
+
+def ndjson_body(rows: int) -> bytes:
+    return "".join(json.dumps({"id": i, "title": f"Title {i}", "author": f"Author {i % 5000}",
+                               "year": 1900 + i % 120}) + "\n"
+                   for i in range(rows)).encode()
+
+
+def csv_body(rows: int) -> bytes:
+    return ("id,title,author,year\n" + "".join(
+        f"{i},Title {i},Author {i % 5000},{1900 + i % 120}\n" for i in range(rows))).encode()
+
+
+def timed_import(client, body: bytes, content_type: str, rows: int):
+    server.books_db.clear()
+    start = time.perf_counter()
+    result = client.post("/api/books/import", data=body, content_type=content_type).get_json()
+    elapsed = time.perf_counter() - start
+    assert result["imported"] == rows, result
+    print(f"import {content_type:<20} {rows / elapsed:>12,.0f} rows/s")
+
+
+def timed_export(client, fmt: str, rows: int):
+    start = time.perf_counter()
+    response = client.get(f"/api/books/export?format={fmt}")
+    size = sum(len(chunk) for chunk in response.response)
+    elapsed = time.perf_counter() - start
+    print(f"export {fmt:<20} {rows / elapsed:>12,.0f} rows/s ({size / 1e6:.1f} MB)")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    client = server.app.test_client()
+    timed_import(client, ndjson_body(rows), "application/x-ndjson", rows)
+    timed_import(client, csv_body(rows), "text/csv", rows)
+    timed_export(client, "ndjson", rows)
+    timed_export(client, "csv", rows)
+
+
+if __name__ == "__main__":
+    main()
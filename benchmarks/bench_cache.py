@@ -0,0 +1,67 @@
+# Effect of the response cache on read routes under a mixed workload.
+#
+#   python benchmarks/bench_cache.py [size ...]
+#
+# Seeds the catalogue like suite.py, then sends read requests through the
+# Flask test client, with one issue or return of a random book after every
+# `--reads-per-write` reads, once with the cache off and once with it on.
+# Reports per-request latency and the cache's hit rate.
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ["LIBRARY_STORAGE"] = "memory"
+
+import main as server  # noqa: E402
+from suite import FIRST_ID, seed  # noqa: E402
+
+ROUTES = ["/api/books?limit=50", "/api/books?limit=50&author=Author%2042",
+          "/api/books?limit=50&isIssued=false", "/api/books?limit=50&sort=title",
+          "/api/books?limit=20&sort=dueDate", "/api/search?q=title%2012",
+          "/api/overdue?limit=50", "/api/stats"]
+
+
+def run(size: int, reads: int, reads_per_write: int):
+    client = server.app.test_client()
+    cache = server.response_cache
+    rng = random.Random(size)
+    results = []
+    for max_bytes in (0, cache.max_bytes):
+        cache.clear()
+        cache.max_bytes = max_bytes
+        hits, misses = cache.hits, cache.misses
+        spent = 0.0
+        for i in range(reads):
+            if i % reads_per_write == 0:
+                book_id = FIRST_ID + rng.randrange(size)
+                action = "return" if server.books_db.get(book_id).is_issued else "issue"
+                client.post(f"/api/books/{book_id}/{action}")
+            path = ROUTES[i % len(ROUTES)]
+            start = time.perf_counter()
+            client.get(path).get_data()
+            spent += time.perf_counter() - start
+        lookups = cache.hits - hits + cache.misses - misses
+        results.append((spent / reads * 1e6, (cache.hits - hits) / lookups if max_bytes else 0))
+    (off, _), (on, hit_rate) = results
+    print(f"{size:>10,} | {reads_per_write:>15} | {off:>11.1f} | {on:>10.1f} | {hit_rate:>8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", nargs="*", type=int, default=[10_000, 100_000])
+    parser.add_argument("--reads", type=int, default=20_000)
+    parser.add_argument("--reads-per-write", type=int, default=10)
+    args = parser.parse_args()
+    print("      size | reads per write |  off us/req |  on us/req | hit rate")
+    for size in sorted(args.sizes):
+        # The catalogue grows between sizes; add_many skips books already in.
+        seed(size)
+        run(size, args.reads, args.reads_per_write)
+
+
+if __name__ == "__main__":
+    main()
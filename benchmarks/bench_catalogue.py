@@ -0,0 +1,67 @@
+# Per-operation latency of the catalogue store at growing catalogue sizes.
+#
+#   python benchmarks/bench_catalogue.py [size ...]
+#
+# Lookup, duplicate check, insert and delete should stay flat as the
+# catalogue grows; the "list scan" column shows the old find_book_index cost.
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from catalogue import Book, Catalogue  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+OPS = 20_000
+
+
+def build(size: int) -> Catalogue:
+    return Catalogue(Book(i, f"Title {i}", f"Author {i % 1000}", 1900 + i % 120)
+                     for i in range(size))
+
+
+def per_op_ns(fn, ids) -> float:
+    start = time.perf_counter_ns()
+    for book_id in ids:
+        fn(book_id)
+    return (time.perf_counter_ns() - start) / len(ids)
+
+
+def list_scan(books, book_id):
+    for i, b in enumerate(books):
+        if b.id == book_id:
+            return i
+    return -1
+
+
+def run(size: int):
+    catalogue = build(size)
+    rng = random.Random(size)
+    existing = [rng.randrange(size) for _ in range(OPS)]
+    fresh = list(range(size, size + OPS))
+
+    lookup = per_op_ns(catalogue.get, existing)
+    dup_check = per_op_ns(catalogue.__contains__, existing)
+    insert = per_op_ns(lambda i: catalogue.add(Book(i, "t", "a", 2000)), fresh)
+    delete = per_op_ns(catalogue.remove, fresh)
+
+    as_list = list(catalogue)
+    scan_ids = existing[:max(1, min(200, 20_000_000 // size))]
+    scan = per_op_ns(lambda i: list_scan(as_list, i), scan_ids)
+
+    print(f"{size:>10,} | {lookup:>9.0f} | {dup_check:>9.0f} | {insert:>9.0f} | "
+          f"{delete:>9.0f} | {scan:>13,.0f}")
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1:]] or DEFAULT_SIZES
+    print("      size | lookup ns |    dup ns | insert ns | delete ns | list scan ns")
+    for size in sizes:
+        run(size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Circulation history: load time and aggregate queries at scale.
+#
+#   python benchmarks/bench_circulation.py [events]
+#
+# Writes `events` synthetic issue/return/fine events spread over 24 monthly
+# segment files (100k distinct books), then times loading them into a
+# CirculationLog and the queries behind /api/circulation/*.
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from catalogue import Catalogue  # noqa: E402
+from circulation import FINE, ISSUE, RETURN, CirculationLog  # noqa: E402
+
+DEFAULT_EVENTS = 10_000_000
+MONTHS = 24
+BOOKS = 100_000
+
+
+def write_segments(directory: str, events: int):
+    rng = random.Random(1)
+    per_month = events // MONTHS
+    month_start = 1_700_000_000_000_000  # Nov 2023, microseconds since 1970
+    month = 30 * 86_400_000_000
+    for m in range(MONTHS):
+        rows = array("q")
+        base = month_start + m * month
+        for i in range(per_month):
+            kind = (ISSUE, RETURN, ISSUE, RETURN, FINE)[i % 5]
+            if kind == FINE:
+                value = 10 * rng.randrange(1, 6)
+            else:
+                value = rng.randrange(1, 21) * 86_400_000_000
+            rows.extend((base + i * (month // per_month), rng.randrange(BOOKS), kind, value))
+        name = time.strftime("%Y-%m", time.gmtime((base + month // 2) / 1e6))
+        with open(os.path.join(directory, f"{name}.log"), "ab") as f:
+            rows.tofile(f)
+
+
+def timed(label: str, fn, repeat: int = 5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    print(f"{label:<34} {(time.perf_counter() - start) / repeat * 1000:10.2f} ms")
+    return result
+
+
+def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_EVENTS
+    directory = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        write_segments(directory, events)
+        print(f"wrote {events:,} events in {time.perf_counter() - start:.1f}s")
+
+        log = timed("load", lambda: CirculationLog(Catalogue(), lambda d, a: 0, directory), 1)
+        print(f"{len(log):,} events in memory")
+        timed("fines per month", log.fines_by_month)
+        timed("fines per month, 6 months", lambda: log.fines_by_month("2024-06", "2024-11"))
+        timed("average loan length", log.loans)
+        timed("top 10 borrowed, all time", lambda: log.most_borrowed(10))
+        timed("top 10 borrowed, 3 months", lambda: log.most_borrowed(10, "2024-06", "2024-08"))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Server-Sent Events fan-out: idle connection cost and change delivery.
+#
+#   python benchmarks/bench_events.py [clients] [changes]
+#
+# Opens `clients` event streams on the Broadcaster (one thread each, as under
+# a threaded server), reports the memory held per idle connection, then
+# issues/returns a book `changes` times and measures how long it takes until
+# every client has received each change.
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from catalogue import Book, Catalogue  # noqa: E402
+from events import Broadcaster  # noqa: E402
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    changes = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    catalogue = Catalogue(Book(i, f"Title {i}", "Author", 2000) for i in range(1000))
+    broadcaster = Broadcaster(catalogue, keepalive=60.0)
+    received = [0] * clients
+    done = threading.Condition()
+
+    def client(n: int):
+        for frame in broadcaster.stream():
+            count = frame.count(b"event: change")
+            if count:
+                with done:
+                    received[n] += count
+                    done.notify_all()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for n in range(clients):
+        threading.Thread(target=client, args=(n,), daemon=True).start()
+    while broadcaster.clients < clients:
+        time.sleep(0.01)
+    per_client = (tracemalloc.get_traced_memory()[0] - before) / clients
+    tracemalloc.stop()
+    print(f"{clients} idle clients: {per_client:,.0f} bytes each (Python heap)")
+
+    due = datetime.now() + timedelta(days=7)
+    latencies = []
+    for i in range(changes):
+        start = time.perf_counter()
+        if i % 2 == 0:
+            catalogue.issue(0, due)
+        else:
+            catalogue.return_book(0)
+        with done:
+            while min(received) <= i:
+                done.wait()
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"{changes} changes to {clients} clients: "
+          f"p50 {p50:.2f} ms, p99 {p99:.2f} ms until all clients received it")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Cost of a filtered page of /api/books as the catalogue grows.
+#
+#   python benchmarks/bench_filters.py [size ...]
+#
+# Compares a page read through the FieldIndex postings against the old walk
+# over every id checking each book, for a rare author (one book in 1000), a
+# three-year range, issued books and an author within a year range.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ["LIBRARY_STORAGE"] = "memory"
+
+from bench_stats import build, per_call_us  # noqa: E402
+from fieldindex import FieldIndex  # noqa: E402
+from main import book_filter  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+PAGE = 50
+QUERIES = {
+    "author": {"author": "author 42"},
+    "years": {"year_from": 1950, "year_to": 1952},
+    "issued": {"is_issued": True},
+    "author+years": {"author": "author 42", "year_from": 1950, "year_to": 1990},
+}
+
+
+def run(size: int):
+    catalogue = build(size)
+    index = FieldIndex()
+    catalogue.add_index(index)
+    row = [f"{size:>10,}"]
+    for filters in QUERIES.values():
+        match = book_filter(filters)
+
+        def indexed():
+            with catalogue.lock:
+                return catalogue.page(None, PAGE, match, index.ids(None, **filters))
+
+        def scan():
+            return catalogue.page(None, PAGE, match)
+
+        assert indexed() == scan()
+        row.append(f"{per_call_us(indexed, 2_000):>8.1f} /{per_call_us(scan, 20):>10,.1f}")
+    print(" | ".join(row))
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1:]] or DEFAULT_SIZES
+    print("      size | " + " | ".join(f"{name + ' us':>20}" for name in QUERIES))
+    print("           | " + " | ".join(f"{'indexed /      scan':>20}" for _ in QUERIES))
+    for size in sizes:
+        run(size)
+
+
+if __name__ == "__main__":
+    main()
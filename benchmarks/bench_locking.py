@@ -0,0 +1,85 @@
+# Throughput and correctness of concurrent issue/return as threads are added.
+#
+#   python benchmarks/bench_locking.py [--ops N] [--books N]
+#
+# Each thread issues or returns random books through the Catalogue. The
+# "hot" run shares 8 books between all threads to force contention on the
+# same per-book locks. After every run the number of successful issues
+# minus returns per book must match its final state and the issued counter,
+# i.e. no book was ever issued twice. Exits non-zero otherwise.
+#
+# Throughput is not expected to grow with threads: the GIL and the catalogue
+# lock, held while each change is published (see Catalogue), serialize the
+# mutations. What the table shows is that it holds up under contention,
+# including many threads on the same few books.
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from catalogue import Book, BookStateError, Catalogue  # noqa: E402
+
+THREADS = [1, 2, 4, 8, 16, 32]
+
+
+def run(threads: int, books: int, ops: int) -> float:
+    catalogue = Catalogue(Book(i, f"Title {i}", "Author", 2000) for i in range(books))
+    due = datetime.now() + timedelta(days=7)
+    net = [[0] * books for _ in range(threads)]
+
+    def work(n: int):
+        rng = random.Random(n)
+        mine = net[n]
+        for _ in range(ops):
+            book_id = rng.randrange(books)
+            try:
+                if rng.random() < 0.5:
+                    catalogue.issue(book_id, due)
+                    mine[book_id] += 1
+                else:
+                    catalogue.return_book(book_id)
+                    mine[book_id] -= 1
+            except BookStateError:
+                pass
+
+    workers = [threading.Thread(target=work, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    issued = 0
+    for book_id in range(books):
+        total = sum(mine[book_id] for mine in net)
+        if total not in (0, 1) or bool(total) != catalogue.get(book_id).is_issued:
+            raise AssertionError(f"book {book_id} net={total} "
+                                 f"is_issued={catalogue.get(book_id).is_issued}")
+        issued += total
+    if catalogue.stats()["issued"] != issued:
+        raise AssertionError(f"issued counter {catalogue.stats()['issued']} != {issued}")
+    return threads * ops / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=20_000, help="operations per thread")
+    parser.add_argument("--books", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print("threads | spread ops/s | hot (8 books) ops/s")
+    for threads in THREADS:
+        spread = run(threads, args.books, args.ops)
+        hot = run(threads, 8, args.ops)
+        print(f"{threads:>7} | {spread:>12,.0f} | {hot:>19,.0f}")
+
+
+if __name__ == "__main__":
+    main()
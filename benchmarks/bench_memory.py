@@ -0,0 +1,64 @@
+# Bytes per book for the Book record, before and after the compact layout.
+#
+#   python benchmarks/bench_memory.py [books]
+#
+# "dict Book" is the original class with a per-instance __dict__ and a
+# datetime due date; "slots Book" is catalogue.Book. Both are built from the
+# same data (30% issued, 5,000 distinct authors) and measured with
+# tracemalloc. The last line adds the catalogue's own indexes on top.
+
+import os
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from catalogue import Book, Catalogue  # noqa: E402
+
+DEFAULT_BOOKS = 200_000
+
+
+class DictBook:
+    def __init__(self, id: int, title: str, author: str, year: int,
+                 is_issued: bool = False, due_date: Optional[datetime] = None):
+        self.id = id
+        self.title = title
+        self.author = author
+        self.year = year
+        self.is_issued = is_issued
+        self.due_date = due_date
+
+
+def rows(count: int):
+    now = datetime.now()
+    for i in range(count):
+        issued = i % 10 < 3
+        # Build fresh strings per row, as a parser would.
+        yield (i, "Title %d" % i, "Author %d" % (i % 5000), 1900 + i % 120,
+               issued, now + timedelta(days=i % 14) if issued else None)
+
+
+def measure(build, count: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build(count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BOOKS
+    old = measure(lambda n: [DictBook(*row) for row in rows(n)], count)
+    new = measure(lambda n: [Book(*row) for row in rows(n)], count)
+    catalogue = measure(lambda n: Catalogue(Book(*row) for row in rows(n)), count)
+    print(f"dict Book      {old:8.1f} bytes/book")
+    print(f"slots Book     {new:8.1f} bytes/book ({(1 - new / old) * 100:.0f}% smaller)")
+    print(f"in Catalogue   {catalogue:8.1f} bytes/book (record plus id dict and sorted ids)")
+
+
+if __name__ == "__main__":
+    main()
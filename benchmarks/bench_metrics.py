@@ -0,0 +1,54 @@
+# Cost of recording one request in the per-route metrics.
+#
+#   python benchmarks/bench_metrics.py [threads]
+#
+# Times RequestMetrics.record() directly (the part added to every request
+# besides two perf_counter() calls) from one and from several threads, and
+# the cost of rendering /metrics for 30 routes.
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from metrics import RequestMetrics  # noqa: E402
+
+CALLS = 1_000_000
+ROUTES = [("GET", f"/api/route{i}") for i in range(30)]
+
+
+def record_loop(metrics: RequestMetrics, calls: int):
+    record = metrics.record
+    for i in range(calls):
+        method, route = ROUTES[i % 30]
+        record(method, route, 0.0001 * (i % 500), 200)
+
+
+def per_call_ns(threads: int) -> float:
+    metrics = RequestMetrics()
+    workers = [threading.Thread(target=record_loop, args=(metrics, CALLS // threads))
+               for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return (time.perf_counter() - start) / CALLS * 1e9
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    print(f"record(), 1 thread:   {per_call_ns(1):6.0f} ns/call")
+    print(f"record(), {threads} threads:  {per_call_ns(threads):6.0f} ns/call (wall / calls)")
+
+    metrics = RequestMetrics()
+    record_loop(metrics, 100_000)
+    start = time.perf_counter()
+    text = "\n".join(metrics.render())
+    print(f"render: {(time.perf_counter() - start) * 1000:.2f} ms, {len(text):,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# Cost of listing overdue books with fines as the catalogue grows.
+#
+#   python benchmarks/bench_overdue.py [size ...]
+#
+# Issues 30% of the books with due dates spread over +-10 days (so about
+# half of the loans are overdue) and compares a page of Catalogue.overdue()
+# plus the outstanding fine total against scanning every book for overdue
+# ones, sorting them and summing fines.
+
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_stats import build, per_call_us  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+PAGE = 50
+
+
+def scan_overdue(books, now: datetime):
+    overdue = sorted((b for b in books if b.is_issued and b.due_date < now),
+                     key=lambda b: (b.due_date, b.id))
+    days = sum((now.date() - b.due_date.date()).days for b in overdue)
+    return overdue[:PAGE], len(overdue), days
+
+
+def run(size: int):
+    catalogue = build(size)
+    as_list = list(catalogue)
+    now = datetime.now()
+    assert catalogue.overdue(now, 0, PAGE) == scan_overdue(as_list, now)
+    indexed = per_call_us(lambda: catalogue.overdue(now, 0, PAGE), 2_000)
+    scan = per_call_us(lambda: scan_overdue(as_list, now), max(1, 1_000_000 // size))
+    overdue = catalogue.stats(now)["overdue"]
+    print(f"{size:>10,} | {overdue:>9,} | {indexed:>10.1f} | {scan:>12,.1f}")
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1:]] or DEFAULT_SIZES
+    print("      size |   overdue | indexed us |      scan us")
+    for size in sizes:
+        run(size)
+
+
+if __name__ == "__main__":
+    main()
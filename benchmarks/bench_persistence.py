@@ -0,0 +1,131 @@
+# Write throughput and recovery time of the WAL + snapshot store.
+#
+#   python benchmarks/bench_persistence.py [--books N] [--tail N] [--dir PATH]
+#
+# Throughput: several threads issue and return books, each waiting for its
+# mutation to be durable, once with group commit (PersistentStore) and once
+# with one write+fsync per record under a lock. Recovery: a snapshot of
+# --books books plus a --tail record log is reopened from disk.
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from catalogue import Book, Catalogue  # noqa: E402
+from persistence import PersistentStore  # noqa: E402
+
+OPS_PER_THREAD = 200
+THREADS = [1, 4, 16]
+
+
+def seeded(size: int) -> Catalogue:
+    return Catalogue(Book(i, f"Title {i}", f"Author {i % 1000}", 1900 + i % 120)
+                     for i in range(size))
+
+
+def churn(catalogue: Catalogue, sync, first_id: int):
+    due = datetime.now() + timedelta(days=7)
+    for n in range(OPS_PER_THREAD):
+        book = catalogue.get(first_id + n)
+        if book.is_issued:
+            catalogue.return_book(book.id)
+        else:
+            catalogue.issue(book.id, due)
+        sync()
+
+
+def run_threads(threads: int, target) -> float:
+    workers = [threading.Thread(target=target, args=(t * OPS_PER_THREAD,))
+               for t in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return threads * OPS_PER_THREAD / (time.perf_counter() - start)
+
+
+def group_commit(directory: str, threads: int) -> float:
+    catalogue = seeded(threads * OPS_PER_THREAD)
+    store = PersistentStore(directory, catalogue)
+    store.recover()
+    try:
+        return run_threads(threads, lambda first: churn(catalogue, store.sync, first))
+    finally:
+        store.close()
+
+
+def fsync_per_record(directory: str, threads: int) -> float:
+    catalogue = seeded(threads * OPS_PER_THREAD)
+    lock = threading.Lock()
+    f = open(os.path.join(directory, "naive.log"), "ab")
+
+    def write(record):
+        with lock:
+            f.write(json.dumps(record).encode() + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    catalogue.subscribe(write)
+    try:
+        return run_threads(threads, lambda first: churn(catalogue, lambda: None, first))
+    finally:
+        f.close()
+
+
+def recovery(directory: str, books: int, tail: int):
+    catalogue = seeded(books)
+    store = PersistentStore(directory, catalogue)
+    store.recover()
+    store.snapshot()
+    due = datetime.now() + timedelta(days=7)
+    for n in range(tail):
+        book = catalogue.get(n % books)
+        if book.is_issued:
+            catalogue.return_book(book.id)
+        else:
+            catalogue.issue(book.id, due)
+    store.close()
+
+    fresh = Catalogue()
+    start = time.perf_counter()
+    reopened = PersistentStore(directory, fresh)
+    reopened.recover()
+    elapsed = time.perf_counter() - start
+    reopened.close()
+    assert len(fresh) == books and fresh.version == catalogue.version
+    print(f"recovery: {books:,} books + {tail:,} log records in {elapsed:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=200_000)
+    parser.add_argument("--tail", type=int, default=50_000)
+    parser.add_argument("--dir", default=None, help="directory on the disk to test")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(dir=args.dir)
+    try:
+        print("threads | group commit ops/s | fsync per record ops/s")
+        for threads in THREADS:
+            gc_dir = os.path.join(root, f"gc-{threads}")
+            naive_dir = os.path.join(root, f"naive-{threads}")
+            os.makedirs(naive_dir)
+            gc = group_commit(gc_dir, threads)
+            naive = fsync_per_record(naive_dir, threads)
+            print(f"{threads:>7} | {gc:>18,.0f} | {naive:>22,.0f}")
+        recovery(os.path.join(root, "recovery"), args.books, args.tail)
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Query latency of the /api/search inverted index at growing catalogue sizes.
+#
+#   python benchmarks/bench_search.py [size ...]
+#
+# Reports bulk build time and median / p99 latency for full-token, prefix and
+# multi-term queries (first page of 20 results). Those carry a rare author
+# number, so they match few books; the last columns do not:
+#
+#   typeahead  a plain 1-4 letter prefix of a common word, as a search box
+#              sends while typing; matches up to the whole catalogue
+#   broad      two plain common-word prefixes, whose whole intersection is
+#              ranked (outside the catalogue lock in the app)
+
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from catalogue import Book  # noqa: E402
+from search import SearchIndex  # noqa: E402
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+WORDS = ("algorithm data system design python library history ocean river "
+         "mountain garden silent empire machine learning secret winter summer "
+         "night shadow light stone glass iron golden").split()
+FIRST = "anna brian carla david elena frank grace henry irene james".split()
+LAST = [f"{w}son" for w in WORDS] + [f"mc{w}" for w in WORDS]
+QUERIES = 300
+
+
+def make_book(rng: random.Random, book_id: int) -> Book:
+    title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+    author = f"{rng.choice(FIRST)} {rng.choice(LAST)} {book_id % 50_000}"
+    return Book(book_id, title.title(), author.title(), rng.randint(1900, 2024))
+
+
+def latencies_us(index: SearchIndex, queries):
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        index.search(q, 0, 20)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def run(size: int):
+    rng = random.Random(size)
+    books = [make_book(rng, i) for i in range(size)]
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.build(books)
+    build_s = time.perf_counter() - start
+
+    token = [f"{rng.choice(LAST)} {rng.randrange(50_000)}" for _ in range(QUERIES)]
+    prefix = [rng.choice(LAST)[:rng.randint(3, 6)] + f" {rng.randrange(50_000)}"
+              for _ in range(QUERIES)]
+    multi = [f"{rng.choice(WORDS)} {rng.choice(FIRST)} {rng.randrange(50_000)}"
+             for _ in range(QUERIES)]
+    typeahead = [rng.choice(WORDS + FIRST)[:rng.randint(1, 4)] for _ in range(QUERIES)]
+    broad = [f"{rng.choice(WORDS)[:3]} {rng.choice(FIRST)[:2]}" for _ in range(QUERIES // 10)]
+    print(f"{size:>10,} | build {build_s:6.1f}s", end="")
+    for name, queries in (("token", token), ("prefix", prefix), ("multi", multi),
+                          ("typeahead", typeahead), ("broad", broad)):
+        p50, p99 = latencies_us(index, queries)
+        print(f" | {name} p50 {p50:7.1f}us p99 {p99:7.1f}us", end="")
+    print()
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1:]] or DEFAULT_SIZES
+    for size in sizes:
+        run(size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Full-catalogue serialization throughput for GET /api/books.
+#
+#   python benchmarks/bench_serialization.py [books ...]
+#
+# "jsonify" is the original path (to_dict() for every book, then Flask's
+# encoder). "cold" builds every per-book encoding from scratch, "warm" joins
+# cached bytes, which is the steady state between mutations. Encoded with
+# the stdlib and, if it is installed, orjson.
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import serialization  # noqa: E402
+from catalogue import Book  # noqa: E402
+from flask import Flask, jsonify  # noqa: E402
+from serialization import json_array  # noqa: E402
+
+DEFAULT_SIZES = [10_000, 100_000]
+app = Flask(__name__)
+
+
+def books(count: int):
+    from datetime import datetime, timedelta
+    now = datetime.now()
+    return [Book(i, f"Title {i}", f"Author {i % 5000}", 1900 + i % 120,
+                 is_issued=i % 3 == 0, due_date=now + timedelta(days=i % 9) if i % 3 == 0 else None)
+            for i in range(count)]
+
+
+def rate(fn, count: int) -> float:
+    start = time.perf_counter()
+    fn()
+    return count / (time.perf_counter() - start)
+
+
+def run(count: int):
+    catalogue = books(count)
+    with app.app_context():
+        old = rate(lambda: jsonify([b.to_dict() for b in catalogue]).get_data(), count)
+    print(f"{count:>9,} | jsonify {old:>11,.0f} books/s", end="")
+
+    encoders = [("stdlib", None)]
+    if serialization.orjson is not None:
+        encoders.append(("orjson", serialization.orjson))
+    saved = serialization.orjson
+    for name, module in encoders:
+        serialization.orjson = module
+        for b in catalogue:
+            b._json = None
+        cold = rate(lambda: json_array(b.to_json() for b in catalogue), count)
+        warm = rate(lambda: json_array(b.to_json() for b in catalogue), count)
+        print(f" | {name} cold {cold:>11,.0f} warm {warm:>12,.0f}", end="")
+    serialization.orjson = saved
+    print()
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1:]] or DEFAULT_SIZES
+    for size in sizes:
+        run(size)
+
+
+if __name__ == "__main__":
+    main()
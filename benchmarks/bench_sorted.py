@@ -0,0 +1,66 @@
+# Cost of sorted pages and top-k queries as the catalogue grows.
+#
+#   python benchmarks/bench_sorted.py [size ...]
+#
+# Compares a page read from an OrderIndex (first page and the 20 soonest
+# due) against sorting the catalogue per request, and reports the memory the
+# three order indexes behind /api/books?sort= take.
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_stats import build, per_call_us  # noqa: E402
+from fieldindex import OrderIndex, due_key, title_key, year_key  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+PAGE = 50
+TOP = 20
+
+
+def scan_page(books, key, limit: int):
+    return [b.id for b in sorted((b for b in books if key(b) is not None),
+                                 key=lambda b: (key(b), b.id))[:limit]]
+
+
+def run(size: int):
+    catalogue = build(size)
+    as_list = list(catalogue)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    indexes = {"title": OrderIndex(title_key), "year": OrderIndex(year_key),
+               "dueDate": OrderIndex(due_key, mutable=True)}
+    for index in indexes.values():
+        catalogue.add_index(index)
+    index_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    row = [f"{size:>10,}"]
+    for name, limit in (("title", PAGE), ("year", PAGE), ("dueDate", TOP)):
+        index = indexes[name]
+
+        def indexed():
+            with catalogue.lock:
+                return [b.id for b in catalogue.page(None, limit, None, index.ids())[0]]
+
+        assert indexed() == scan_page(as_list, index.key, limit)
+        scan = per_call_us(lambda: scan_page(as_list, index.key, limit), max(1, 200_000 // size))
+        row.append(f"{per_call_us(indexed, 2_000):>7.1f} /{scan:>12,.1f}")
+    row.append(f"{index_bytes / size:>8.0f}")
+    print(" | ".join(row))
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1:]] or DEFAULT_SIZES
+    print("      size |     title page us     |      year page us     |    "
+          "top 20 due us      | bytes/book")
+    print("           | indexed /       sort  | indexed /       sort  | "
+          "indexed /       sort  |")
+    for size in sizes:
+        run(size)
+
+
+if __name__ == "__main__":
+    main()
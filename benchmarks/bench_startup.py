@@ -0,0 +1,165 @@
+# Worker time-to-first-request for each way of loading a stored catalogue.
+#
+#   python benchmarks/bench_startup.py [size ...]
+#
+# For each size, a catalogue of `size` books (30% issued) is stored as
+#
+#   wal-jsonl        a WAL directory with a JSON-lines snapshot (the old format)
+#   wal-snapshot     a WAL directory with a binary snapshot
+#   sqlite-rows      a SQLite database without a snapshot file
+#   sqlite-snapshot  the same database with <db>.snapshot next to it
+#
+# and a fresh worker process is started on each: it imports main (opening
+# the store and recovering the catalogue) and serves on a local port. The
+# time from spawning the process to the first answered GET /api/books page
+# is reported, followed by the first search, which builds the lazy search
+# index, and the worker's resident and shared (file-backed) memory.
+
+import http.client
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from catalogue import Book  # noqa: E402
+from snapshot import write_snapshot  # noqa: E402
+from sqlite_store import SCHEMA  # noqa: E402
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+STORE_ID = "benchstartup"
+TIMEOUT = 600.0
+
+
+def make_books(size: int):
+    now = datetime.now()
+    for i in range(1, size + 1):
+        issued = i % 10 < 3
+        yield Book(i, f"Title {i}", f"Author {i % 1000}", 1900 + i % 120, is_issued=issued,
+                   due_date=now + timedelta(days=i % 21 - 10) if issued else None)
+
+
+def prepare(size: int, root: str) -> dict:
+    books = list(make_books(size))
+    stores = {}
+
+    directory = os.path.join(root, "wal-jsonl")
+    os.makedirs(directory)
+    with open(os.path.join(directory, f"snapshot-{size:012d}.jsonl"), "wb") as f:
+        f.write(json.dumps({"version": size, "walSegment": 1, "count": size}).encode() + b"\n")
+        f.writelines(json.dumps(b.to_dict(), separators=(",", ":")).encode() + b"\n"
+                     for b in books)
+    stores["wal-jsonl"] = f"wal:{directory}"
+
+    directory = os.path.join(root, "wal-snapshot")
+    os.makedirs(directory)
+    write_snapshot(os.path.join(directory, f"snapshot-{size:012d}.snap"), books,
+                   version=size, walSegment=1)
+    stores["wal-snapshot"] = f"wal:{directory}"
+
+    path = os.path.join(root, "rows.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO books VALUES (?, ?, ?, ?, ?, ?)",
+                     ((d["id"], d["title"], d["author"], d["year"], int(d["isIssued"]),
+                       d["dueDate"]) for d in (b.to_dict() for b in books)))
+    # One retained change at the catalogue's version, so a worker without a
+    # snapshot has to read the books table.
+    conn.execute("INSERT INTO changes VALUES (?, '{}')", (size,))
+    conn.execute("INSERT INTO meta VALUES ('store_id', ?)", (STORE_ID,))
+    conn.commit()
+    conn.close()
+    stores["sqlite-rows"] = f"sqlite:{path}"
+
+    snapshot_db = os.path.join(root, "snapshot.db")
+    shutil.copy(path, snapshot_db)
+    write_snapshot(snapshot_db + ".snapshot", books, version=size, storeId=STORE_ID)
+    stores["sqlite-snapshot"] = f"sqlite:{snapshot_db}"
+    return stores
+
+
+def get(port: int, path: str) -> int:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=TIMEOUT)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def memory(pid: int):
+    # (resident, shared file-backed) bytes from /proc/<pid>/statm.
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            fields = f.read().split()
+    except OSError:
+        return 0, 0
+    page = os.sysconf("SC_PAGE_SIZE")
+    return int(fields[1]) * page, int(fields[2]) * page
+
+
+def measure(storage: str) -> dict:
+    env = dict(os.environ, LIBRARY_STORAGE=storage)
+    started = time.perf_counter()
+    child = subprocess.Popen([sys.executable, __file__, "--serve"], env=env,
+                             stdout=subprocess.PIPE, cwd=ROOT)
+    try:
+        port = int(child.stdout.readline())
+        listening = time.perf_counter() - started
+        assert get(port, "/api/books?limit=50") == 200
+        first = time.perf_counter() - started
+        rss, shared = memory(child.pid)
+        start = time.perf_counter()
+        assert get(port, "/api/search?q=title%2012") == 200
+        search = time.perf_counter() - start
+        return {"listening": listening, "first": first, "search": search,
+                "rss": rss, "shared": shared}
+    finally:
+        child.terminate()
+        child.wait()
+
+
+def serve():
+    # Runs in the worker process.
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import main
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+
+    server = make_server("127.0.0.1", 0, main.app, threaded=True, request_handler=QuietHandler)
+    print(server.server_port, flush=True)
+    server.serve_forever()
+
+
+def main():
+    if sys.argv[1:2] == ["--serve"]:
+        serve()
+        return
+    sizes = [int(s) for s in sys.argv[1:]] or DEFAULT_SIZES
+    print("      size | store           | first request s | listening s | first search s |"
+          "  rss MiB | shared MiB")
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix="library-startup-")
+        try:
+            for name, storage in prepare(size, root).items():
+                r = measure(storage)
+                print(f"{size:>10,} | {name:<15} | {r['first']:>15.2f} | {r['listening']:>11.2f} | "
+                      f"{r['search']:>14.2f} | {r['rss'] / 2**20:>8,.0f} | "
+                      f"{r['shared'] / 2**20:>10,.0f}")
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
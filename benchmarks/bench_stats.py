@@ -0,0 +1,68 @@
+# Cost of /api/stats as the catalogue grows.
+#
+#   python benchmarks/bench_stats.py [size ...]
+#
+# Compares the maintained counters (Catalogue.stats) against the old
+# per-request list comprehensions over every book.
+
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from catalogue import Book, Catalogue  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def build(size: int) -> Catalogue:
+    rng = random.Random(size)
+    now = datetime.now()
+    catalogue = Catalogue()
+    for i in range(size):
+        book = Book(i, f"Title {i}", f"Author {i % 1000}", 1900 + i % 120)
+        catalogue.add(book)
+        if rng.random() < 0.3:
+            catalogue.issue(book.id, now + timedelta(days=rng.randint(-10, 10)))
+    return catalogue
+
+
+def scan_stats(books):
+    now = datetime.now()
+    return {
+        "total": len(books),
+        "issued": len([b for b in books if b.is_issued]),
+        "available": len([b for b in books if not b.is_issued]),
+        "overdue": len([b for b in books
+                        if b.is_issued and b.due_date is not None and now > b.due_date]),
+    }
+
+
+def per_call_us(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def run(size: int):
+    catalogue = build(size)
+    as_list = list(catalogue)
+    assert catalogue.stats() == scan_stats(as_list)
+    counters = per_call_us(catalogue.stats, 10_000)
+    scan = per_call_us(lambda: scan_stats(as_list), max(1, 2_000_000 // size))
+    print(f"{size:>10,} | {counters:>11.2f} | {scan:>12,.1f}")
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1:]] or DEFAULT_SIZES
+    print("      size | counters us |      scan us")
+    for size in sizes:
+        run(size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# HTTP load test: the sync server versus the ASGI app.
+#
+#   python benchmarks/loadtest.py [--connections 64] [--duration 10]
+#                                 [--servers sync,asgi] [--paths ...]
+#
+# Starts each server on a free port, then drives it from `connections`
+# keep-alive client connections (asyncio, no dependencies) for `duration`
+# seconds, cycling through `paths`, and reports requests/sec and latency
+# percentiles. "sync" is gunicorn with sync workers when gunicorn is
+# installed and the Flask development server otherwise; "asgi" is uvicorn
+# running asgi:app. --workers is passed to gunicorn and uvicorn.
+
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DEFAULT_PATHS = "/api/stats,/api/books?limit=50,/api/search?q=the,/api/changes?since=0"
+
+
+def server_command(kind: str, port: int, workers: int):
+    if kind == "sync" and shutil.which("gunicorn"):
+        return ["gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}", "main:app"]
+    if kind == "sync":
+        return [sys.executable, "main.py"]
+    if kind == "asgi":
+        return [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port),
+                "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+    raise ValueError(kind)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not start on port {port}")
+
+
+async def client(port: int, paths, deadline: float, latencies, errors):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    requests = [f"GET {p} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode() for p in paths]
+    i = 0
+    try:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            writer.write(requests[i % len(requests)])
+            i += 1
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if not head.startswith(b"HTTP/1.1 2") and not head.startswith(b"HTTP/1.0 2"):
+                errors.append(head.split(b"\r\n", 1)[0])
+            if b"connection: close" in head.lower():
+                writer.close()
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    finally:
+        writer.close()
+
+
+async def load(port: int, connections: int, duration: float, paths):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(client(port, paths, deadline, latencies, errors)
+                           for _ in range(connections)))
+    return latencies, errors
+
+
+def run(kind: str, args) -> dict:
+    port = free_port()
+    env = dict(os.environ, PORT=str(port))
+    proc = subprocess.Popen(server_command(kind, port, args.workers), cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        asyncio.run(load(port, args.connections, 1.0, args.paths))  # warm up
+        latencies, errors = asyncio.run(load(port, args.connections, args.duration, args.paths))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    latencies.sort()
+    return {"server": kind, "requests": len(latencies), "errors": len(errors),
+            "rps": len(latencies) / args.duration,
+            "p50": percentile(latencies, 0.50), "p99": percentile(latencies, 0.99)}
+
+
+def percentile(ordered, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--servers", default="sync,asgi")
+    parser.add_argument("--paths", default=DEFAULT_PATHS)
+    args = parser.parse_args()
+    args.paths = args.paths.split(",")
+
+    print(f"{args.connections} keep-alive connections, {args.duration:.0f}s, "
+          f"{args.workers} worker(s), paths {','.join(args.paths)}")
+    for kind in args.servers.split(","):
+        r = run(kind, args)
+        print(f"{r['server']:>5}: {r['rps']:>9,.0f} req/s  p50 {r['p50']:7.2f} ms  "
+              f"p99 {r['p99']:7.2f} ms  ({r['requests']:,} requests, {r['errors']} errors)")
+
+
+if __name__ == "__main__":
+    main()
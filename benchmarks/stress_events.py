@@ -0,0 +1,70 @@
+# Deadlock check for the Server-Sent Events broadcaster.
+#
+#   python benchmarks/stress_events.py [--seconds N] [--readers N]
+#
+# One thread issues and returns books as fast as it can while several others
+# keep asking the broadcaster for a fresh stats frame (keepalive=0, so every
+# call recomputes it), which is what idle SSE streams do on each keepalive.
+# Change delivery holds the catalogue lock and then takes the broadcaster's
+# lock, so stats must never be computed the other way round. The catalogue
+# version has to keep moving for the whole run; exits non-zero if it stalls.
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from catalogue import Book, Catalogue  # noqa: E402
+from events import Broadcaster  # noqa: E402
+
+BOOK_IDS = list(range(1, 9))
+STALL = 3.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--readers", type=int, default=3)
+    args = parser.parse_args()
+
+    catalogue = Catalogue()
+    for book_id in BOOK_IDS:
+        catalogue.add(Book(book_id, f"Title {book_id}", "Author", 2000))
+    events = Broadcaster(catalogue, keepalive=0)
+    stop = threading.Event()
+
+    def mutate():
+        due = datetime.now() + timedelta(days=14)
+        while not stop.is_set():
+            for book_id in BOOK_IDS:
+                catalogue.issue(book_id, due)
+                catalogue.return_book(book_id)
+
+    def read_stats():
+        while not stop.is_set():
+            events._stats()
+
+    threads = [threading.Thread(target=mutate, daemon=True)]
+    threads += [threading.Thread(target=read_stats, daemon=True) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+
+    deadline = time.monotonic() + args.seconds
+    version, moved = catalogue.version, time.monotonic()
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        if catalogue.version != version:
+            version, moved = catalogue.version, time.monotonic()
+        elif time.monotonic() - moved > STALL:
+            print(f"catalogue version stuck at {version} for {STALL:.0f}s: deadlock")
+            sys.exit(1)
+    stop.set()
+    print(f"ok: {version} versions in {args.seconds:.0f}s with {args.readers} stats readers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# Concurrency check for the shared SQLite storage backend.
+#
+#   python benchmarks/stress_multiworker.py [--workers N] [--ops N]
+#
+# Starts several processes, each importing the app the way a gunicorn worker
+# would, and has them issue and return the same handful of books as fast as
+# they can. Afterwards every book's final state must match the number of
+# successful issues minus returns across all workers, and every worker must
+# report the same /api/stats. Exits non-zero on any inconsistency.
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BOOK_IDS = list(range(101, 113))
+
+
+def worker(db_path, ops, seed, barrier, results):
+    os.environ["LIBRARY_STORAGE"] = f"sqlite:{db_path}"
+    sys.path.insert(0, ROOT)
+    import main
+
+    client = main.app.test_client()
+    rng = random.Random(seed)
+    issued = dict.fromkeys(BOOK_IDS, 0)
+    returned = dict.fromkeys(BOOK_IDS, 0)
+    barrier.wait()
+    for _ in range(ops):
+        book_id = rng.choice(BOOK_IDS)
+        if rng.random() < 0.5:
+            if client.post(f"/api/books/{book_id}/issue").status_code == 200:
+                issued[book_id] += 1
+        elif client.post(f"/api/books/{book_id}/return").status_code == 200:
+            returned[book_id] += 1
+    barrier.wait()
+    stats = client.get("/api/stats").get_json()
+    books = {b["id"]: b["isIssued"] for b in client.get("/api/books").get_json()}
+    results.put((issued, returned, stats, books))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=300)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "library.db")
+    sys.path.insert(0, ROOT)
+    os.environ["LIBRARY_STORAGE"] = f"sqlite:{db_path}"
+    import main as seed_app  # creates and seeds the database once
+    initial = {b.id: b.is_issued for b in seed_app.books_db}
+    seed_app.store.close()
+
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(args.workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(db_path, args.ops, n, barrier, results))
+             for n in range(args.workers)]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    outcomes = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    errors = []
+    final = outcomes[0][3]
+    for book_id in BOOK_IDS:
+        net = sum(o[0][book_id] - o[1][book_id] for o in outcomes)
+        expected = int(initial[book_id]) + net
+        if expected not in (0, 1) or bool(expected) != final[book_id]:
+            errors.append(f"book {book_id}: initial={initial[book_id]} net={net} "
+                          f"final={final[book_id]}")
+    if any(o[2] != outcomes[0][2] or o[3] != final for o in outcomes):
+        errors.append("workers disagree: " + ", ".join(str(o[2]) for o in outcomes))
+
+    total_ops = args.workers * args.ops
+    print(f"{args.workers} workers, {total_ops} requests in {elapsed:.2f}s "
+          f"({total_ops / elapsed:,.0f} req/s), stats {outcomes[0][2]}")
+    for error in errors:
+        print("FAIL:", error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
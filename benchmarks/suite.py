@@ -0,0 +1,360 @@
+# Benchmark suite for every API route.
+#
+#   python benchmarks/suite.py [--sizes 1000,10000,100000] [--modes client,http]
+#                              [--requests 200] [--concurrency 8] [--output PATH]
+#   python benchmarks/suite.py compare old.json new.json
+#
+# Each catalogue size runs in its own process: main is imported with the
+# in-memory store, books_db is seeded with `size` books (30% issued, due
+# dates spread over +-10 days) and every route is then driven
+#
+#   client  sequentially through the Flask test client (handler cost only)
+#   http    through a real threaded HTTP server by `concurrency` keep-alive
+#           client threads (adds the WSGI server, sockets and contention)
+#
+# LIBRARY_ADMIN_TOKEN is set for the run and sent with every request, so
+# the admin cache routes are driven too (clearing the cache last). The
+# /api/admin/profile routes are left out: each one samples for seconds.
+#
+# Mutating routes are measured as self-undoing pairs (issue then return, add
+# or import then delete) and every request of a pair is timed. The event
+# stream never ends, so /api/events is timed to its first frame. Throughput,
+# p50/p95/p99 latency and errors are recorded per route, and
+# resident memory after seeding and at the end of the run per size. Routes
+# that return the whole catalogue get fewer requests at large sizes.
+# Results are written as JSON (benchmarks/bench-results.json unless --output
+# says otherwise); `compare` prints the change between runs.
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import count
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench-results.json")
+DEFAULT_SIZES = "1000,10000,100000,1000000"
+FIRST_ID = 1_000_000
+SEED_BATCH = 10_000
+FULL_SCAN_BUDGET = 20_000_000  # books serialized per full-catalogue route
+IMPORT_BATCH = 20
+ADMIN_TOKEN = "bench"
+HEADERS = {"X-Admin-Token": ADMIN_TOKEN}
+# Request "method" for an event stream: a GET read up to its first frame.
+STREAM = "STREAM"
+
+
+def routes(size: int, catalogue):
+    # name -> (whole catalogue?, operation factory). A factory is called once
+    # per operation and returns the requests to send in order, each timed on
+    # its own. Mutating operations undo themselves (issue then return, add
+    # or import then delete) on books no other in-flight operation uses, so
+    # they stay valid however many run concurrently.
+    last = FIRST_ID + size - 1
+    available = max(size * 7 // 10 - 1, 1)
+    ops = count()
+
+    def available_id(n: int) -> int:
+        # Seeded books with i % 10 >= 3 start out available.
+        n %= available
+        return FIRST_ID + n // 7 * 10 + 3 + n % 7
+
+    def issue_return():
+        book_id = available_id(next(ops))
+        return [("POST", f"/api/books/{book_id}/issue", None),
+                ("POST", f"/api/books/{book_id}/return", None)]
+
+    def batch():
+        n = next(ops) * 20
+        body = json.dumps({"ids": [available_id(n + i) for i in range(20)]})
+        return [("POST", "/api/books/issue", body), ("POST", "/api/books/return", body)]
+
+    def add_delete():
+        book_id = FIRST_ID + size + next(ops)
+        body = json.dumps({"id": book_id, "title": "Bench", "author": "Bench", "year": 2024})
+        return [("POST", "/api/books", body), ("DELETE", f"/api/books/{book_id}", None)]
+
+    def import_delete():
+        # Ids past the add/delete ones, IMPORT_BATCH per operation.
+        first = FIRST_ID + 2 * size + next(ops) * IMPORT_BATCH
+        ids = range(first, first + IMPORT_BATCH)
+        body = "\n".join(json.dumps({"id": i, "title": f"Imported {i}", "author": "Bench",
+                                     "year": 2024}) for i in ids)
+        return ([("POST", "/api/books/import", body)]
+                + [("DELETE", f"/api/books/{i}", None) for i in ids])
+
+    def changes():
+        return [("GET", f"/api/changes?since={max(catalogue.version - 100, 0)}", None)]
+
+    def get(path: str):
+        return lambda: [("GET", path, None)]
+
+    import main
+    asset = next(iter(main.assets))
+
+    return {
+        "GET /": (False, get("/")),
+        "GET /api/books": (True, get("/api/books")),
+        "GET /api/books?limit=50": (False, get(f"/api/books?limit=50&cursor={last - 1000}")),
+        "GET /api/books?isIssued=true": (False, get("/api/books?limit=50&isIssued=true")),
+        "GET /api/books?author": (False, get("/api/books?limit=50&author=Author%2042")),
+        "GET /api/books?yearFrom": (False, get("/api/books?limit=50&yearFrom=1950&yearTo=1952")),
+        "GET /api/books?sort=title": (False, get("/api/books?limit=50&sort=title")),
+        "GET /api/books?sort=dueDate": (False, get("/api/books?limit=20&sort=dueDate")),
+        "GET /api/search": (False, get("/api/search?q=title%2012")),
+        "GET /api/changes": (False, changes),
+        "GET /api/stats": (False, get("/api/stats")),
+        "GET /api/overdue": (False, get("/api/overdue?limit=50")),
+        "GET /metrics": (False, get("/metrics")),
+        "GET /api/books/export": (True, get("/api/books/export")),
+        "GET /api/events (first frame)": (False, lambda: [(STREAM, "/api/events", None)]),
+        "GET /assets/<name>": (False, get(f"/assets/{asset}")),
+        "POST /api/books/<id>/issue+return": (False, issue_return),
+        "POST /api/books/issue+return (20)": (False, batch),
+        "POST+DELETE /api/books": (False, add_delete),
+        f"POST /api/books/import ({IMPORT_BATCH})+DELETE": (False, import_delete),
+        # After the issue/return routes, so there is a history to aggregate.
+        "GET /api/circulation/fines": (False, get("/api/circulation/fines")),
+        "GET /api/circulation/loans": (False, get("/api/circulation/loans")),
+        "GET /api/circulation/top": (False, get("/api/circulation/top?limit=10")),
+        "GET /api/admin/cache": (False, get("/api/admin/cache")),
+        "DELETE /api/admin/cache": (False, lambda: [("DELETE", "/api/admin/cache", None)]),
+    }
+
+
+def seed(size: int):
+    import main
+    from catalogue import Book
+    now = datetime.now()
+    for start in range(FIRST_ID, FIRST_ID + size, SEED_BATCH):
+        batch = []
+        for i in range(start, min(start + SEED_BATCH, FIRST_ID + size)):
+            issued = i % 10 < 3
+            batch.append(Book(i, f"Title {i}", f"Author {i % 1000}", 1900 + i % 120,
+                              is_issued=issued,
+                              due_date=now + timedelta(days=i % 21 - 10) if issued else None))
+        main.books_db.add_many(batch)
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def summarize(latencies, errors: int, seconds: float) -> dict:
+    latencies.sort()
+
+    def pct(q):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+
+    return {"requests": len(latencies), "errors": errors, "seconds": round(seconds, 4),
+            "rps": round(len(latencies) / seconds, 1) if seconds else None,
+            "p50_ms": round(pct(0.50), 3), "p95_ms": round(pct(0.95), 3),
+            "p99_ms": round(pct(0.99), 3)}
+
+
+def run_client(factory, operations: int) -> dict:
+    import main
+    client = main.app.test_client()
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(operations):
+        for method, path, body in factory():
+            start = time.perf_counter()
+            if method == STREAM:
+                response = client.get(path, headers=HEADERS, buffered=False)
+                next(iter(response.response))
+                response.close()
+            else:
+                response = client.open(path, method=method, data=body, headers=HEADERS,
+                                       content_type="application/json" if body else None)
+                response.get_data()
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code >= 400
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def first_frame(port: int, path: str) -> http.client.HTTPResponse:
+    # Opens an event stream on its own connection, reads up to the end of
+    # the first frame and hangs up.
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    try:
+        conn.request("GET", path, headers=HEADERS)
+        response = conn.getresponse()
+        while response.readline() not in (b"\n", b"\r\n", b""):
+            pass
+        return response
+    finally:
+        conn.close()
+
+
+def run_http(port: int, factory, operations: int, concurrency: int) -> dict:
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    remaining = count(operations, -1)
+
+    def worker():
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        while True:
+            with lock:
+                if next(remaining) <= 0:
+                    break
+                requests = factory()
+            for method, path, body in requests:
+                start = time.perf_counter()
+                if method == STREAM:
+                    response = first_frame(port, path)
+                else:
+                    headers = dict(HEADERS)
+                    if body:
+                        headers["Content-Type"] = "application/json"
+                    conn.request(method, path, body=body, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    errors[0] += response.status >= 400
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+
+def run_size(args) -> dict:
+    # Runs in the per-size child process.
+    os.environ["LIBRARY_STORAGE"] = "memory"
+    os.environ["LIBRARY_ADMIN_TOKEN"] = ADMIN_TOKEN
+    sys.path.insert(0, ROOT)
+    import main
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    started = time.perf_counter()
+    seed(args.size)
+    seed_seconds = time.perf_counter() - started
+    result = {"size": args.size, "seed_seconds": round(seed_seconds, 2),
+              "rss_after_seed": rss_bytes(), "routes": []}
+
+    server = None
+    if "http" in args.modes:
+        class QuietHandler(WSGIRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_request(self, *args):
+                pass
+
+        server = make_server("127.0.0.1", 0, main.app, threaded=True,
+                             request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    for name, (full, factory) in routes(args.size, main.books_db).items():
+        operations = args.requests
+        if full:
+            operations = max(3, min(operations, FULL_SCAN_BUDGET // args.size))
+        for mode in args.modes:
+            if mode == "client":
+                stats = run_client(factory, operations)
+            else:
+                stats = run_http(server.server_port, factory, operations, args.concurrency)
+            row = {"route": name, "mode": mode, **stats}
+            result["routes"].append(row)
+            print(f"{args.size:>10,}  {mode:<6} {name:<36} {stats['rps']:>9,.0f} req/s  "
+                  f"p50 {stats['p50_ms']:8.2f}  p95 {stats['p95_ms']:8.2f}  "
+                  f"p99 {stats['p99_ms']:8.2f} ms  errors {stats['errors']}",
+                  file=sys.stderr)
+
+    if server is not None:
+        server.shutdown()
+    result["rss_end"] = rss_bytes()
+    result["max_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return result
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(args):
+    results = {
+        "meta": {"date": datetime.now().isoformat(timespec="seconds"),
+                 "revision": git_revision(), "python": platform.python_version(),
+                 "platform": platform.platform(), "cpus": os.cpu_count(),
+                 "requests": args.requests, "concurrency": args.concurrency},
+        "sizes": [],
+    }
+    for size in args.sizes:
+        cmd = [sys.executable, __file__, "--size", str(size), "--modes", ",".join(args.modes),
+               "--requests", str(args.requests), "--concurrency", str(args.concurrency)]
+        output = subprocess.run(cmd, check=True, stdout=subprocess.PIPE).stdout
+        size_result = json.loads(output)
+        results["sizes"].append(size_result)
+        print(f"{size:>10,}  seeded in {size_result['seed_seconds']}s, "
+              f"rss {size_result['rss_after_seed'] / 2**20:,.0f} MiB after seeding, "
+              f"max {size_result['max_rss'] / 2**20:,.0f} MiB", file=sys.stderr)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}", file=sys.stderr)
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    before = {(s["size"], r["mode"], r["route"]): r for s in old["sizes"] for r in s["routes"]}
+    print(f"{old['meta']['revision'] or old_path} -> {new['meta']['revision'] or new_path}")
+    print(f"{'size':>10}  {'mode':<6} {'route':<36} {'req/s':>15} {'p99 ms':>19}")
+    for size in new["sizes"]:
+        for row in size["routes"]:
+            prev = before.get((size["size"], row["mode"], row["route"]))
+            if prev is None or not prev["rps"]:
+                continue
+            print(f"{size['size']:>10,}  {row['mode']:<6} {row['route']:<36} "
+                  f"{row['rps'] / prev['rps'] - 1:>+14.1%} "
+                  f"{prev['p99_ms']:>8.2f} -> {row['p99_ms']:<8.2f}")
+
+
+def main():
+    if sys.argv[1:2] == ["compare"]:
+        compare(*sys.argv[2:4])
+        return
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default=DEFAULT_SIZES)
+    parser.add_argument("--modes", default="client,http")
+    parser.add_argument("--requests", type=int, default=200, help="operations per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.modes = [m for m in args.modes.split(",") if m]
+
+    if args.size is not None:
+        json.dump(run_size(args), sys.stdout)
+        return
+    args.sizes = [int(s) for s in args.sizes.split(",")]
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import IO, Iterable, Iterator, List, Tuple
+
+from catalogue import Book, int64, utf8
+
+BATCH_SIZE = 1000
+READ_CHUNK = 1 << 16
+CSV_COLUMNS = ["id", "title", "author", "year", "isIssued", "dueDate"]
+
+
+def parse_book(data: dict) -> Book:
+    # Same validation as POST /api/books; isIssued/dueDate are optional so
+    # exports from another system (or from /api/books/export) round-trip.
+    # Due dates are naive local time like datetime.now(), so one with an
+    # offset is converted to local time.
+    try:
+        book_id = int64(data.get("id"))
+        title = utf8(data.get("title", ""))
+        author = utf8(data.get("author", ""))
+        year = int64(data.get("year"))
+        is_issued = data.get("isIssued") in (True, "true", "True", "1", 1)
+        due_date = data.get("dueDate") or None
+        due_date = datetime.fromisoformat(due_date) if is_issued and due_date else None
+        if due_date is not None and due_date.tzinfo is not None:
+            due_date = due_date.astimezone().replace(tzinfo=None)
+        book = Book(book_id, title, author, year, is_issued=is_issued, due_date=due_date)
+    except Exception:
+        raise ValueError("Invalid data")
+
+    if not title or not author:
+        raise ValueError("Title and author are required")
+    if is_issued and due_date is None:
+        # It could never become overdue.
+        raise ValueError("dueDate is required for issued books")
+    return book
+
+
+def iter_lines(stream: IO[bytes]) -> Iterator[bytes]:
+    # Read in large chunks: iterating a WSGI input stream directly reads it
+    # one byte at a time looking for newlines.
+    tail = b""
+    while True:
+        chunk = stream.read(READ_CHUNK)
+        if not chunk:
+            break
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+
+def read_ndjson(stream: IO[bytes]) -> Iterator[Tuple[int, dict]]:
+    for line_no, line in enumerate(iter_lines(stream), 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_no, row if isinstance(row, dict) else {}
+
+
+def read_csv(stream: IO[bytes]) -> Iterator[Tuple[int, dict]]:
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    reader = csv.DictReader(text)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def batches(rows: Iterable[Tuple[int, dict]],
+            size: int = BATCH_SIZE) -> Iterator[List[Tuple[int, dict]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_ndjson(books: Iterable[Book]) -> Iterator[bytes]:
+    for chunk in batches(enumerate(books), BATCH_SIZE):
+        yield b"".join(b.to_json() + b"\n" for _, b in chunk)
+
+
+def write_csv(books: Iterable[Book]) -> Iterator[bytes]:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    for chunk in batches(enumerate(books), BATCH_SIZE):
+        for _, book in chunk:
+            row = book.to_dict()
+            row["isIssued"] = "true" if row["isIssued"] else "false"
+            writer.writerow(row)
+        yield out.getvalue().encode()
+        out.seek(0)
+        out.truncate()
+    if out.tell():
+        yield out.getvalue().encode()
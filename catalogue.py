@@ -0,0 +1,608 @@
+import heapq
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from serialization import dumps
+from sortedindex import SortedList
+
+LOCK_STRIPES = 64
+# A lazy index built while books change takes up to CATCH_UP_ROUNDS passes
+# over the changed books without the lock, until at most CATCH_UP are left.
+CATCH_UP = 1000
+CATCH_UP_ROUNDS = 10
+
+
+class CatalogueError(Exception):
+    pass
+
+
+class BookNotFound(CatalogueError):
+    pass
+
+
+class BookStateError(CatalogueError):
+    pass
+
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+# Ids and years are 64-bit everywhere they are stored or encoded (orjson,
+# SQLite, snapshot columns), so wider values are rejected on input.
+INT64_MIN = -2**63
+INT64_MAX = 2**63 - 1
+
+# Years repeat across the catalogue but only ints up to 256 are shared by
+# CPython, so equal years are mapped to one int object.
+_years: Dict[int, int] = {}
+
+
+def int64(value) -> int:
+    number = int(value)
+    if not INT64_MIN <= number <= INT64_MAX:
+        raise ValueError(f"{number} is out of range")
+    return number
+
+
+def utf8(value) -> str:
+    # Stripped text that can be encoded: a lone surrogate ("\ud800" in JSON)
+    # could be neither serialized nor stored, so it raises ValueError here.
+    text = str(value).strip()
+    text.encode("utf-8")
+    return text
+
+
+class Book:
+    # Kept small because catalogues hold millions of these: __slots__ instead
+    # of a per-instance __dict__, the due date as integer microseconds since
+    # EPOCH (exact, so to_dict() output is unchanged), and author strings and
+    # years shared between books.
+    #
+    # to_json() caches the encoded bytes together with the loan state they
+    # were built from. Only is_issued and the due date ever change, so a
+    # cached encoding is reused exactly while those still match; any issue or
+    # return invalidates it without the writer having to know about the cache.
+    __slots__ = ("id", "title", "author", "year", "is_issued", "_due", "_json")
+
+    def __init__(self, id: int, title: str, author: str, year: int,
+                 is_issued: bool = False, due_date: Optional[datetime] = None):
+        self.id = id
+        self.title = title
+        self.author = sys.intern(author)
+        self.year = _years.setdefault(year, year)
+        self.is_issued = is_issued
+        self.due_date = due_date
+        self._json: Optional[Tuple[bool, Optional[int], bytes]] = None
+
+    @property
+    def due_date(self) -> Optional[datetime]:
+        due = self._due
+        return None if due is None else EPOCH + due * MICROSECOND
+
+    @due_date.setter
+    def due_date(self, value: Optional[datetime]):
+        self._due = None if value is None else (value - EPOCH) // MICROSECOND
+
+    def to_dict(self):
+        return self._as_dict(self.is_issued, self._due)
+
+    def to_json(self) -> bytes:
+        is_issued, due = self.is_issued, self._due
+        cached = self._json
+        if cached is not None and cached[0] == is_issued and cached[1] == due:
+            return cached[2]
+        data = dumps(self._as_dict(is_issued, due))
+        self._json = (is_issued, due, data)
+        return data
+
+    def _as_dict(self, is_issued: bool, due: Optional[int]) -> dict:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "author": self.author,
+            "year": self.year,
+            "isIssued": is_issued,
+            "dueDate": None if due is None else (EPOCH + due * MICROSECOND).isoformat(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Book":
+        due_date = data.get("dueDate")
+        return cls(data["id"], data["title"], data["author"], data["year"],
+                   is_issued=data.get("isIssued", False),
+                   due_date=datetime.fromisoformat(due_date) if due_date else None)
+
+
+class DueDateIndex:
+    # Min-heap of (due_date, book_id) for issued books. Entries are moved into
+    # the overdue set as the clock passes them, so counting overdue books costs
+    # O(log n) per book that came due since the last call instead of a scan.
+    # Returned or deleted books leave stale heap entries that are skipped when
+    # popped and compacted away once they outnumber the live ones.
+    #
+    # The overdue set is ordered by (due_date, book_id), most overdue first,
+    # and keeps the sum of its due days so the total number of overdue days,
+    # and with it the outstanding fines, is O(1) on any day.
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int]] = []
+        self._due: Dict[int, datetime] = {}
+        self._overdue = SortedList()
+        self._due_days = 0
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def add(self, book: Book):
+        if book.is_issued and book.due_date is not None:
+            self.add_due(book.id, book.due_date)
+
+    def add_due(self, book_id: int, due_date: datetime):
+        self._due[book_id] = due_date
+        heapq.heappush(self._heap, (due_date, book_id))
+
+    def discard(self, book_id: int):
+        due_date = self._due.pop(book_id, None)
+        if due_date is None:
+            return
+        if self._overdue.discard((due_date, book_id)):
+            self._due_days -= due_date.toordinal()
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._compact()
+
+    def advance(self, now: datetime) -> Optional[datetime]:
+        # Moves every book due before `now` into the overdue set and returns
+        # the next due date still ahead, if any.
+        heap = self._heap
+        while heap and heap[0][0] < now:
+            due_date, book_id = heapq.heappop(heap)
+            if self._due.get(book_id) == due_date:
+                self._overdue.add((due_date, book_id))
+                self._due_days += due_date.toordinal()
+        while heap and self._due.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def overdue_count(self, now: datetime) -> int:
+        self.advance(now)
+        return len(self._overdue)
+
+    def overdue_days(self, now: datetime) -> int:
+        # Sum over overdue books of whole calendar days past the due date.
+        self.advance(now)
+        return len(self._overdue) * now.toordinal() - self._due_days
+
+    def overdue(self, now: datetime) -> Iterator[Tuple[datetime, int]]:
+        self.advance(now)
+        return iter(self._overdue)
+
+    def clear(self):
+        self._heap.clear()
+        self._due.clear()
+        self._overdue.clear()
+        self._due_days = 0
+
+    def _compact(self):
+        self._heap = [(due_date, book_id) for book_id, due_date in self._due.items()
+                      if (due_date, book_id) not in self._overdue]
+        heapq.heapify(self._heap)
+
+
+class Catalogue:
+    # Books are kept in a dict keyed by id. Dicts preserve insertion order, so
+    # iteration matches the old list order while lookup, duplicate checks,
+    # inserts and deletes are all O(1) regardless of catalogue size.
+    #
+    # Aggregate counts used by /api/stats are maintained incrementally, so all
+    # state changes must go through add/remove/issue/return_book. Extra
+    # indexes (anything with add/discard/clear) can be attached with add_index
+    # and are kept in sync with inserts and deletes; indexes that also define
+    # update(book) are called after every issue and return. A lazy index is
+    # only built, from the books present at that point, by the first
+    # ensure(index) or locked(index), so recovery and startup don't pay for
+    # it up front and requests aren't held up while it is built. An
+    # index with build(books) is filled through that in one call instead of
+    # one add() per book.
+    #
+    # load_snapshot() swaps in a memory-mapped snapshot (see snapshot.py)
+    # whose books are decoded on first access. It clears every attached
+    # index; lazy ones are rebuilt by the next ensure(), so an index that is
+    # not lazy must not need the existing books (like the cache invalidator).
+    #
+    # Every mutation bumps `version` and is published to subscribers as a
+    # change record ({"version", "op", ...}); issue and return records also
+    # carry the time they happened ("at") and the loan's due date. apply() replays such a record
+    # without republishing it; replay is idempotent, so a record that is
+    # already reflected in the catalogue can be applied again safely.
+    # Subscribers that maintain views of the catalogue rather than storing it
+    # (subscribe(..., replay=True)) also receive the records passed to apply().
+    #
+    # Concurrency: each book id maps to one of LOCK_STRIPES locks, which makes
+    # the check-then-set in issue/return_book/remove atomic per book; the
+    # checks and building the change record happen under the stripe alone.
+    # The shared bookkeeping (counters, indexes, version numbers,
+    # subscribers) is guarded by `lock`, which is also held while listeners
+    # run so they see changes in version order: a store writes the record
+    # (WAL encoding, SQLite statements) and the event stream encodes its
+    # frame with it held. Mutations are therefore serialized by `lock` and
+    # by their listeners' cost; the stripes keep requests for different
+    # books from waiting on each other anywhere else. Request parsing and
+    # response serialization never hold it. Code reading an attached index
+    # directly should hold `lock` as well.
+
+    def __init__(self, books: Iterable[Book] = ()):
+        self._books: Dict[int, Book] = {}
+        self._ids = SortedList()
+        self._issued = 0
+        self._due_index = DueDateIndex()
+        self._indexes: List = []
+        self._pending: List = []
+        self._lazy: List = []
+        self._updates: List[Callable[[Book], None]] = []
+        self._touched: Optional[List[Book]] = None
+        self._generation = 0
+        self._build_lock = threading.Lock()
+        self._listeners: List[Callable[[dict], None]] = []
+        self._replay_listeners: List[Callable[[dict], None]] = []
+        self._durable = 0
+        self.version = 0
+        self.lock = threading.RLock()
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        for book in books:
+            self._add(book)
+
+    def __len__(self) -> int:
+        return len(self._books)
+
+    def __iter__(self) -> Iterator[Book]:
+        # One book at a time, so a snapshot-backed catalogue is not decoded
+        # all at once. Concurrent inserts and deletes can't break the loop: a
+        # dict's ids are copied first and books deleted since are skipped,
+        # and LazyBooks.values tolerates them itself.
+        books = self._books
+        if isinstance(books, dict):
+            return (book for book in map(books.get, list(books)) if book is not None)
+        return books.values()
+
+    def __contains__(self, book_id: int) -> bool:
+        return book_id in self._books
+
+    def get(self, book_id: int) -> Optional[Book]:
+        return self._books.get(book_id)
+
+    def add_index(self, index, lazy: bool = False):
+        with self.lock:
+            if lazy:
+                self._lazy.append(index)
+                self._pending.append(index)
+            else:
+                self._build(index)
+
+    def ensure(self, index):
+        # Builds a lazy index if it isn't yet; call before reading it, never
+        # with `lock` held (see locked()). The books are read without `lock`,
+        # so changes carry on during a long build: the books they touch are
+        # noted and re-added to the index before it is swapped in. A build
+        # that a load_snapshot() or clear() overtakes is thrown away and
+        # started again.
+        while index in self._pending:
+            with self._build_lock:
+                with self.lock:
+                    if index not in self._pending:
+                        return
+                    generation = self._generation
+                    self._touched = []
+                    books = iter(self)
+                built = False
+                try:
+                    built = self._build_unlocked(index, books, generation)
+                finally:
+                    with self.lock:
+                        self._touched = None
+                    if not built:
+                        index.clear()
+
+    def _build_unlocked(self, index, books: Iterator[Book], generation: int) -> bool:
+        if hasattr(index, "build"):
+            index.build(books)
+        else:
+            for book in books:
+                index.add(book)
+        # Catch up outside the lock while many books changed, so only the
+        # last few are re-added with it held. Once a pass no longer shrinks
+        # the backlog, changes outpace it and the rest is done under the lock.
+        backlog = None
+        for _ in range(CATCH_UP_ROUNDS):
+            with self.lock:
+                if generation != self._generation:
+                    return False
+                touched, self._touched = self._touched, []
+            if len(touched) <= CATCH_UP or backlog is not None and len(touched) >= backlog:
+                break
+            backlog = len(touched)
+            self._refresh(index, touched)
+        else:
+            touched = []
+        with self.lock:
+            if generation != self._generation:
+                return False
+            self._refresh(index, touched + self._touched)
+            self._pending.remove(index)
+            self._indexes.append(index)
+            if hasattr(index, "update"):
+                self._updates.append(index.update)
+        return True
+
+    @contextmanager
+    def locked(self, index=None):
+        # Holds `lock` with `index` (if given) built, for reading it.
+        while True:
+            if index is not None:
+                self.ensure(index)
+            self.lock.acquire()
+            if index not in self._pending:
+                break
+            # A load_snapshot() reset it in between.
+            self.lock.release()
+        try:
+            yield
+        finally:
+            self.lock.release()
+
+    def load_snapshot(self, snapshot):
+        # Replaces the contents with a MappedSnapshot's books without decoding
+        # them: ids, counts and due dates come straight from its columns.
+        with self.lock:
+            self._generation += 1
+            self._books = snapshot.books()
+            self._ids = SortedList(snapshot.sorted_ids())
+            self._issued = snapshot.issued_count()
+            self._due_index.clear()
+            for book_id, due_date in snapshot.loans():
+                self._due_index.add_due(book_id, due_date)
+            for index in self._indexes:
+                index.clear()
+            self._indexes = [i for i in self._indexes if i not in self._lazy]
+            self._pending = list(self._lazy)
+            self._updates = [i.update for i in self._indexes if hasattr(i, "update")]
+            self.version = snapshot.header["version"]
+
+    def subscribe(self, listener: Callable[[dict], None], replay: bool = False,
+                  durable: bool = False):
+        # Durable listeners (the stores) are called after all the others, so
+        # a change is only written out once every other listener took it.
+        with self.lock:
+            if durable:
+                self._listeners.append(listener)
+                self._durable += 1
+            else:
+                self._listeners.insert(len(self._listeners) - self._durable, listener)
+            if replay:
+                self._replay_listeners.append(listener)
+
+    def add(self, book: Book) -> bool:
+        record = {"op": "add", "book": book.to_dict()}
+        with self._stripe(book.id), self.lock:
+            if not self._add(book):
+                return False
+            self._publish(record, lambda: self._remove(book.id))
+        return True
+
+    def add_many(self, books: List[Book]) -> List[bool]:
+        # Bulk insert: one lock acquisition and one pass of duplicate checks
+        # against the id index for the whole batch. Returns, per book, whether
+        # it was added (False for ids already present).
+        added = []
+        records = [{"op": "add", "book": book.to_dict()} for book in books]
+        with self.lock:
+            for book, record in zip(books, records):
+                ok = self._add(book)
+                if ok:
+                    self._publish(record, lambda: self._remove(book.id))
+                added.append(ok)
+        return added
+
+    def remove(self, book_id: int) -> Optional[Book]:
+        with self._stripe(book_id), self.lock:
+            book = self._remove(book_id)
+            if book is not None:
+                self._publish({"op": "delete", "id": book_id}, lambda: self._add(book))
+        return book
+
+    def issue(self, book_id: int, due_date: datetime) -> Book:
+        with self._stripe(book_id):
+            book = self._books.get(book_id)
+            if book is None:
+                raise BookNotFound("Book not found")
+            if book.is_issued:
+                raise BookStateError("Book already issued")
+            record = {"op": "issue", "id": book_id, "dueDate": due_date.isoformat(),
+                      "at": datetime.now().isoformat()}
+            with self.lock:
+                self._issue(book, due_date)
+                self._publish(record, lambda: self._return(book))
+        return book
+
+    def return_book(self, book_id: int) -> Tuple[Book, Optional[datetime]]:
+        # Returns the book and the due date it had when it was returned.
+        with self._stripe(book_id):
+            book = self._books.get(book_id)
+            if book is None:
+                raise BookNotFound("Book not found")
+            if not book.is_issued:
+                raise BookStateError("Book is not issued")
+            due_date = book.due_date
+            record = {"op": "return", "id": book_id,
+                      "dueDate": due_date.isoformat() if due_date else None,
+                      "at": datetime.now().isoformat()}
+            with self.lock:
+                self._return(book)
+                self._publish(record, lambda: self._issue(book, due_date))
+        return book, due_date
+
+    def apply(self, record: dict):
+        op = record["op"]
+        book_id = record["book"]["id"] if op == "add" else record["id"]
+        with self._stripe(book_id), self.lock:
+            if op == "add":
+                self._add(Book.from_dict(record["book"]))
+            elif op == "delete":
+                self._remove(book_id)
+            else:
+                book = self._books.get(book_id)
+                if book is not None and op == "issue":
+                    self._issue(book, datetime.fromisoformat(record["dueDate"]))
+                elif book is not None and op == "return":
+                    self._return(book)
+            if record["version"] > self.version:
+                self.version = record["version"]
+                for listener in self._replay_listeners:
+                    listener(record)
+
+    def _build(self, index):
+        # Called with `lock` held; `index` is empty.
+        if hasattr(index, "build"):
+            index.build(self._books.values())
+        else:
+            for book in self._books.values():
+                index.add(book)
+        self._indexes.append(index)
+        if hasattr(index, "update"):
+            self._updates.append(index.update)
+
+    def _refresh(self, index, books: List[Book]):
+        # Brings a lazy index being built up to date with changed books.
+        for book in {id(book): book for book in books}.values():
+            index.discard(book)
+        for book_id in dict.fromkeys(book.id for book in books):
+            book = self._books.get(book_id)
+            if book is not None:
+                index.add(book)
+
+    def _stripe(self, book_id: int) -> threading.Lock:
+        return self._stripes[hash(book_id) % LOCK_STRIPES]
+
+    def _publish(self, record: dict, undo: Callable[[], object]):
+        # A failing listener (a WAL write, an encoding error) fails the whole
+        # change: `undo` reverts it so the catalogue is left as it was.
+        # Listeners that already took the record are not called back.
+        self.version += 1
+        record["version"] = self.version
+        try:
+            for listener in self._listeners:
+                listener(record)
+        except BaseException:
+            self.version -= 1
+            undo()
+            raise
+
+    def _add(self, book: Book) -> bool:
+        if book.id in self._books:
+            return False
+        self._books[book.id] = book
+        self._ids.add(book.id)
+        if self._touched is not None:
+            self._touched.append(book)
+        if book.is_issued:
+            self._issued += 1
+            self._due_index.add(book)
+        for index in self._indexes:
+            index.add(book)
+        return True
+
+    def _remove(self, book_id: int) -> Optional[Book]:
+        book = self._books.pop(book_id, None)
+        if book is None:
+            return None
+        self._ids.discard(book_id)
+        if self._touched is not None:
+            self._touched.append(book)
+        if book.is_issued:
+            self._issued -= 1
+            self._due_index.discard(book_id)
+        for index in self._indexes:
+            index.discard(book)
+        return book
+
+    def _issue(self, book: Book, due_date: datetime):
+        if not book.is_issued:
+            self._issued += 1
+        self._due_index.discard(book.id)
+        book.is_issued = True
+        book.due_date = due_date
+        self._due_index.add(book)
+        if self._touched is not None:
+            self._touched.append(book)
+        for update in self._updates:
+            update(book)
+
+    def _return(self, book: Book):
+        if book.is_issued:
+            self._issued -= 1
+        self._due_index.discard(book.id)
+        book.is_issued = False
+        book.due_date = None
+        if self._touched is not None:
+            self._touched.append(book)
+        for update in self._updates:
+            update(book)
+
+    def clear(self):
+        with self.lock:
+            self._generation += 1
+            self._books = {}
+            self._ids.clear()
+            self._issued = 0
+            self._due_index.clear()
+            for index in self._indexes:
+                index.clear()
+
+    def stats(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        with self.lock:
+            total = len(self._books)
+            return {
+                "total": total,
+                "issued": self._issued,
+                "available": total - self._issued,
+                "overdue": self._due_index.overdue_count(now or datetime.now()),
+            }
+
+    def overdue(self, now: Optional[datetime] = None, offset: int = 0,
+                limit: Optional[int] = None) -> Tuple[List[Book], int, int]:
+        # Overdue books, most overdue first, with the total number of overdue
+        # books and of days overdue. Costs O(offset + limit), not O(n).
+        now = now or datetime.now()
+        with self.lock:
+            stop = None if limit is None else offset + limit
+            entries = islice(self._due_index.overdue(now), offset, stop)
+            books = [self._books[book_id] for _, book_id in entries]
+            return (books, self._due_index.overdue_count(now),
+                    self._due_index.overdue_days(now))
+
+    def advance_overdue(self, now: Optional[datetime] = None) -> Optional[datetime]:
+        # Brings the overdue set up to `now`; returns when the next book falls due.
+        with self.lock:
+            return self._due_index.advance(now or datetime.now())
+
+    def page(self, after: Optional[int] = None, limit: int = 50,
+             match: Optional[Callable[[Book], bool]] = None,
+             ids: Optional[Iterable[int]] = None) -> Tuple[List[Book], Optional[int]]:
+        # Books in id order starting after the cursor id. Only the ids up to
+        # the end of the page are visited; the cursor for the next page is the
+        # last id returned, or None once the catalogue is exhausted. `ids`
+        # narrows the walk to ascending candidate ids after the cursor taken
+        # from an attached index (build it while holding `lock`).
+        books: List[Book] = []
+        with self.lock:
+            if ids is None:
+                ids = self._ids.irange(minimum=after, inclusive=(False, True))
+            for book_id in ids:
+                book = self._books[book_id]
+                if match is None or match(book):
+                    books.append(book)
+                    if len(books) == limit:
+                        return books, book_id
+        return books, None
@@ -0,0 +1,72 @@
+from collections import deque
+from typing import Deque, List, Optional, Set, Tuple
+
+from catalogue import Catalogue
+
+CAPACITY = 100_000
+
+
+class ChangeLog:
+    # Bounded in-memory log of (version, book id) for every catalogue change,
+    # used to answer "what changed since version N" in O(changes).
+    #
+    # The log is complete for every version above `floor`. Once it is full the
+    # oldest entries drop off and the floor moves up; if it ever misses a
+    # version (e.g. a worker reloaded the catalogue wholesale) it restarts
+    # empty from the current version. Clients asking about versions below the
+    # floor have to resync in full.
+
+    def __init__(self, catalogue: Catalogue, capacity: int = CAPACITY):
+        self.catalogue = catalogue
+        self._entries: Deque[Tuple[int, int]] = deque(maxlen=capacity)
+        self._floor = catalogue.version
+        catalogue.subscribe(self._on_change, replay=True)
+
+    @property
+    def floor(self) -> int:
+        return self._floor
+
+    def changed_since(self, version: int) -> Optional[Set[int]]:
+        # Ids of books added, changed or deleted after `version`, or None if
+        # the log no longer covers that range.
+        with self.catalogue.lock:
+            latest = self._latest()
+            if latest != self.catalogue.version:
+                self._reset(self.catalogue.version)
+                latest = self._floor
+            if version < self._floor or version > latest:
+                return None
+            ids = set()
+            for entry_version, book_id in reversed(self._entries):
+                if entry_version <= version:
+                    break
+                ids.add(book_id)
+            return ids
+
+    def _on_change(self, record: dict):
+        version = record["version"]
+        if version != self._latest() + 1:
+            self._reset(version - 1)
+        if len(self._entries) == self._entries.maxlen:
+            self._floor = self._entries[0][0]
+        book_id = record["book"]["id"] if record["op"] == "add" else record["id"]
+        self._entries.append((version, book_id))
+
+    def _latest(self) -> int:
+        return self._entries[-1][0] if self._entries else self._floor
+
+    def _reset(self, version: int):
+        self._entries.clear()
+        self._floor = version
+
+
+def split_changes(catalogue: Catalogue, ids: Set[int]) -> Tuple[List, List[int]]:
+    # Current books for the ids that still exist, and the ids that are gone.
+    books, deleted = [], []
+    for book_id in sorted(ids):
+        book = catalogue.get(book_id)
+        if book is None:
+            deleted.append(book_id)
+        else:
+            books.append(book)
+    return books, deleted
@@ -0,0 +1,326 @@
+import glob
+import heapq
+import os
+import threading
+from array import array
+from collections import Counter
+from datetime import datetime
+from itertools import compress
+from operator import itemgetter
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from catalogue import EPOCH, MICROSECOND, Catalogue
+
+ISSUE, RETURN, FINE = 0, 1, 2
+KINDS = {ISSUE: "issue", RETURN: "return", FINE: "fine"}
+# Loan length recorded for a return whose issue was never seen (seeded
+# loans, history lost); older logs wrote 0. Only lengths > 0 are averaged.
+UNKNOWN_LOAN = -1
+
+# translate() tables turning the kind column into 0/1 selector masks.
+_MASKS = {kind: bytes(1 if i == kind else 0 for i in range(256)) for kind in KINDS}
+
+
+def month_of(ts: int) -> str:
+    return (EPOCH + ts * MICROSECOND).strftime("%Y-%m")
+
+
+def to_micros(moment: datetime) -> int:
+    return (moment - EPOCH) // MICROSECOND
+
+
+def month_bounds(ts: int) -> Tuple[int, int]:
+    # [start, end) of the calendar month holding `ts`, in microseconds.
+    moment = EPOCH + ts * MICROSECOND
+    start = moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return to_micros(start), to_micros(end)
+
+
+class Segment:
+    # One calendar month of circulation events stored column-wise in typed
+    # arrays (8 + 8 + 1 + 8 bytes per event). `value` is the due date for
+    # issues, the loan length in microseconds for returns and the amount for
+    # fines. `loans` counts the returns with a known loan length. Aggregates
+    # are kept up to date on append; rebuilding them for a loaded segment
+    # takes a few C-level passes over the columns.
+
+    def __init__(self, month: str):
+        self.month = month
+        self.ts = array("q")
+        self.book = array("q")
+        self.kind = array("b")
+        self.value = array("q")
+        self.borrows: Counter = Counter()
+        self.issues = 0
+        self.returns = 0
+        self.loans = 0
+        self.loan_total = 0
+        self.fines = 0
+        self.fine_total = 0
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def append(self, ts: int, book_id: int, kind: int, value: int):
+        self.ts.append(ts)
+        self.book.append(book_id)
+        self.kind.append(kind)
+        self.value.append(value)
+        if kind == ISSUE:
+            self.issues += 1
+            self.borrows[book_id] += 1
+        elif kind == RETURN:
+            self.returns += 1
+            if value > 0:
+                self.loans += 1
+                self.loan_total += value
+        else:
+            self.fines += 1
+            self.fine_total += value
+
+    def extend(self, ts: array, book: array, kind: array, value: array) -> Counter:
+        # Returns the borrows added.
+        self.ts.extend(ts)
+        self.book.extend(book)
+        self.kind.extend(kind)
+        self.value.extend(value)
+        kinds = kind.tobytes()
+        issues = kinds.translate(_MASKS[ISSUE])
+        returns = kinds.translate(_MASKS[RETURN])
+        fines = kinds.translate(_MASKS[FINE])
+        borrows = Counter(compress(book, issues))
+        self.borrows.update(borrows)
+        self.issues += issues.count(1)
+        self.returns += returns.count(1)
+        loans = [v for v in compress(value, returns) if v > 0]
+        self.loans += len(loans)
+        self.loan_total += sum(loans)
+        self.fines += fines.count(1)
+        self.fine_total += sum(compress(value, fines))
+        return borrows
+
+
+class CirculationLog:
+    # Append-only history of issues, returns and fines, built from the
+    # catalogue's change records and partitioned into monthly Segments.
+    # Aggregate queries read the per-month running totals, so their cost
+    # depends on the number of months (and, for rankings, of distinct books)
+    # rather than on the number of events.
+    #
+    # With a directory, each month is also appended to <directory>/YYYY-MM.log
+    # as fixed-width native int64 rows and reloaded column-wise at startup.
+    # That is for single-process storage (the WAL backend). sync() makes the
+    # rows written so far durable, one fsync per file for all the requests
+    # waiting on it like the WAL's group commit; requests call it after
+    # store.sync(). The two logs are fsynced separately, so a crash between
+    # them can leave the history one event ahead of or behind the catalogue.
+    #
+    # With `shared` (the SQLite store) the history lives in the database so
+    # every worker reports the same figures and they survive restarts: each
+    # worker appends the events of its own changes inside their transaction
+    # and folds in the table's new rows, its own and other workers', before
+    # answering a query.
+
+    def __init__(self, catalogue: Catalogue, fine: Callable[[datetime, datetime], int],
+                 directory: Optional[str] = None, shared=None):
+        self.catalogue = catalogue
+        self.fine = fine
+        self.directory = directory
+        self.shared = shared
+        self._segments: Dict[str, Segment] = {}
+        self._borrows: Counter = Counter()
+        self._open: Dict[int, int] = {}
+        self._files: Dict[str, int] = {}
+        self._dirty: Set[int] = set()
+        self._written = 0
+        self._durable = 0
+        self._seen = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+        # Other workers' changes reach this one as replays, but their events
+        # are in the shared table already.
+        catalogue.subscribe(self._on_change, replay=shared is None)
+
+    def __len__(self) -> int:
+        return sum(len(s) for s in self._segments.values())
+
+    def close(self):
+        with self._sync_lock, self._lock:
+            for fd in self._files.values():
+                os.close(fd)
+            self._files.clear()
+            self._dirty.clear()
+
+    def sync(self):
+        # Returns once every row written before the call is on disk. Callers
+        # queue on _sync_lock, so one fsync covers everything written while
+        # the previous one ran.
+        with self._lock:
+            target = self._written
+        if self._durable >= target:
+            return
+        with self._sync_lock:
+            if self._durable >= target:
+                return
+            with self._lock:
+                target = self._written
+                dirty, self._dirty = self._dirty, set()
+            try:
+                for fd in dirty:
+                    os.fsync(fd)
+            except OSError:
+                with self._lock:
+                    self._dirty |= dirty
+                raise
+            self._durable = target
+
+    def _on_change(self, record: dict):
+        if record["op"] not in ("issue", "return") or "at" not in record:
+            return
+        at = datetime.fromisoformat(record["at"])
+        ts = to_micros(at)
+        book_id = record["id"]
+        with self._lock:
+            if record["op"] == "issue":
+                due = to_micros(datetime.fromisoformat(record["dueDate"]))
+                self._record(ts, book_id, ISSUE, due)
+                return
+            issued_at = self._issued_at(book_id)
+            loan = ts - issued_at if issued_at is not None else UNKNOWN_LOAN
+            self._record(ts, book_id, RETURN, loan)
+            due_date = record.get("dueDate")
+            fine = self.fine(datetime.fromisoformat(due_date), at) if due_date else 0
+            if fine:
+                self._record(ts, book_id, FINE, fine)
+
+    def _issued_at(self, book_id: int) -> Optional[int]:
+        # Issue time of the book's open loan, if its issue was recorded.
+        if self.shared is None:
+            return self._open.pop(book_id, None)
+        last = self.shared.last_event(book_id, (ISSUE, RETURN))
+        return last[1] if last is not None and last[0] == ISSUE else None
+
+    def _record(self, ts: int, book_id: int, kind: int, value: int):
+        if self.shared is not None:
+            self.shared.append_event(ts, book_id, kind, value)
+            return
+        if kind == ISSUE:
+            self._open[book_id] = ts
+        self._append(ts, book_id, kind, value)
+
+    def _sync(self):
+        # Called with _lock held: folds in the shared table's new events,
+        # a month at a time.
+        if self.shared is None:
+            return
+        self._seen, rows = self.shared.events_since(self._seen)
+        start = end = 0
+        batch: List[Sequence[int]] = []
+        for row in rows:
+            if not start <= row[0] < end:
+                self._extend(batch)
+                batch = []
+                start, end = month_bounds(row[0])
+            batch.append(row)
+        self._extend(batch)
+
+    def _extend(self, rows: List[Sequence[int]]):
+        if not rows:
+            return
+        month = month_of(rows[0][0])
+        segment = self._segments.get(month)
+        if segment is None:
+            segment = self._segments[month] = Segment(month)
+        ts, book, kind, value = zip(*rows)
+        self._borrows.update(segment.extend(array("q", ts), array("q", book),
+                                            array("b", kind), array("q", value)))
+
+    def _append(self, ts: int, book_id: int, kind: int, value: int):
+        month = month_of(ts)
+        segment = self._segments.get(month)
+        if segment is None:
+            segment = self._segments[month] = Segment(month)
+        segment.append(ts, book_id, kind, value)
+        if kind == ISSUE:
+            self._borrows[book_id] += 1
+        if self.directory:
+            fd = self._files.get(month)
+            if fd is None:
+                path = os.path.join(self.directory, f"{month}.log")
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                self._files[month] = fd
+            os.write(fd, array("q", (ts, book_id, kind, value)).tobytes())
+            self._dirty.add(fd)
+            self._written += 1
+
+    def _load(self):
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.log"))):
+            rows = array("q")
+            with open(path, "rb") as f:
+                data = f.read()
+            # Drop a torn last row from a crash mid-write.
+            rows.frombytes(data[:len(data) - len(data) % (4 * rows.itemsize)])
+            month = os.path.basename(path)[:-4]
+            segment = self._segments[month] = Segment(month)
+            self._borrows.update(segment.extend(rows[0::4], rows[1::4], array("b", rows[2::4]),
+                                                rows[3::4]))
+        # Loans still open need their issue time for the loan length: the
+        # last issue of each book still on loan, unless the book was returned
+        # after it (the current loan's issue was then never recorded).
+        last_issue: Dict[int, int] = {}
+        last_return: Dict[int, int] = {}
+        for month in sorted(self._segments):
+            segment = self._segments[month]
+            kinds = segment.kind.tobytes()
+            for last, kind in ((last_issue, ISSUE), (last_return, RETURN)):
+                mask = kinds.translate(_MASKS[kind])
+                last.update(zip(compress(segment.book, mask), compress(segment.ts, mask)))
+        self._open = {}
+        for book_id, ts in last_issue.items():
+            book = self.catalogue.get(book_id)
+            if book is not None and book.is_issued and last_return.get(book_id, -1) < ts:
+                self._open[book_id] = ts
+
+    def _months(self, start: Optional[str], end: Optional[str]) -> List[Segment]:
+        return [self._segments[m] for m in sorted(self._segments)
+                if (start is None or m >= start) and (end is None or m <= end)]
+
+    def fines_by_month(self, start: Optional[str] = None,
+                       end: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            self._sync()
+            return [{"month": s.month, "fines": s.fines, "total": s.fine_total}
+                    for s in self._months(start, end)]
+
+    def loans(self, start: Optional[str] = None, end: Optional[str] = None) -> dict:
+        # Returns whose loan length is unknown are counted but not averaged.
+        with self._lock:
+            self._sync()
+            segments = self._months(start, end)
+            months = [{"month": s.month, "issues": s.issues, "returns": s.returns,
+                       "averageDays": _days(s.loan_total, s.loans)} for s in segments]
+            returns = sum(s.returns for s in segments)
+            loans = sum(s.loans for s in segments)
+            loan_total = sum(s.loan_total for s in segments)
+        return {"returns": returns, "averageDays": _days(loan_total, loans), "months": months}
+
+    def most_borrowed(self, limit: int = 10, start: Optional[str] = None,
+                      end: Optional[str] = None) -> List[Tuple[int, int]]:
+        with self._lock:
+            self._sync()
+            if start is None and end is None:
+                counts = self._borrows
+            else:
+                counts = Counter()
+                for segment in self._months(start, end):
+                    counts.update(segment.borrows)
+            return heapq.nlargest(limit, counts.items(), key=itemgetter(1))
+
+
+def _days(total: int, count: int) -> Optional[float]:
+    # Average of `count` durations summing to `total` microseconds, in days.
+    return round(total / count / 86_400_000_000, 2) if count else None
@@ -0,0 +1,99 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Optional
+
+from flask import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional, used when installed
+    brotli = None
+
+MIN_SIZE = 1400
+COMPRESSIBLE = ("application/json", "application/x-ndjson", "text/")
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+# Preference order when the client accepts several encodings.
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def accepted_encoding(request: Request, available) -> Optional[str]:
+    accept = request.accept_encodings
+    for encoding in ENCODINGS:
+        if encoding in available and accept[encoding]:
+            return encoding
+    return None
+
+
+def compress(data: bytes, encoding: str, best: bool = False) -> bytes:
+    # `best` is for bodies compressed once and served many times; responses
+    # compressed per request use fast settings.
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if best else 4)
+    return gzip.compress(data, compresslevel=9 if best else 5, mtime=0)
+
+
+class StaticAsset:
+    # A frontend file loaded once at startup and kept in memory together with
+    # its precompressed encodings. The ETag is a hash of the content, so it
+    # only changes on deploys that change the file.
+
+    def __init__(self, path: str, body: Optional[bytes] = None):
+        if body is None:
+            with open(path, "rb") as f:
+                body = f.read()
+        self.mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.bodies: Dict[Optional[str], bytes] = {None: body}
+        for encoding in ENCODINGS:
+            compressed = compress(body, encoding, best=True)
+            if len(compressed) < len(body):
+                self.bodies[encoding] = compressed
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        encoding = accepted_encoding(request, self.bodies)
+        etag = self.digest if encoding is None else f"{self.digest}-{encoding}"
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(self.bodies[encoding], mimetype=self.mimetype)
+            if encoding is not None:
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = cache_control
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+def hashed_name(name: str, asset: StaticAsset) -> str:
+    # app.js -> app.3f2a9c0d1e4b5a67.js
+    base, ext = os.path.splitext(name)
+    return f"{base}.{asset.digest}{ext}"
+
+
+def compress_response(request: Request, response: Response) -> Response:
+    # Compresses large buffered text/JSON responses on the fly. Streamed
+    # responses (exports, events) and bodies under MIN_SIZE are left alone,
+    # since compressing them costs more than it saves.
+    if (response.status_code != 200 or response.is_streamed
+            or response.direct_passthrough or "Content-Encoding" in response.headers
+            or not response.mimetype.startswith(COMPRESSIBLE)):
+        return response
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    if len(body) < MIN_SIZE:
+        return response
+    encoding = accepted_encoding(request, ENCODINGS)
+    if encoding is None:
+        return response
+
+    response.set_data(compress(body, encoding))
+    response.headers["Content-Encoding"] = encoding
+    # The compressed body is no longer byte-identical to the one the ETag was
+    # issued for; a weak ETag still revalidates (see main.conditional).
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from catalogue import Catalogue
+from serialization import dumps
+
+RING_SIZE = 1024
+KEEPALIVE = 15.0
+POLL_INTERVAL = 0.5
+MAX_POLL_BACKOFF = 30.0
+
+log = logging.getLogger(__name__)
+
+
+class Broadcaster:
+    # Fans catalogue changes out to Server-Sent Events clients.
+    #
+    # Each change is encoded into an SSE frame exactly once and kept in a
+    # small ring buffer; every connection is just a generator holding the last
+    # version it sent and waiting on one shared condition. Sending an event to
+    # N clients therefore costs N socket writes and nothing else, and an idle
+    # connection holds no queue of its own. A client that falls further
+    # behind than the ring gets a "resync" event and catches up through
+    # /api/changes.
+    #
+    # astream() is the same stream for asyncio servers: waiting connections
+    # share one asyncio.Event per event loop, woken once per change, so they
+    # hold no thread at all.
+    #
+    # `poll` (e.g. store.refresh) is run by one background thread while
+    # clients are connected, so changes made by other worker processes are
+    # pushed even when this worker receives no other requests.
+
+    def __init__(self, catalogue: Catalogue, poll: Optional[Callable[[], None]] = None,
+                 ring_size: int = RING_SIZE, keepalive: float = KEEPALIVE):
+        self.catalogue = catalogue
+        self.poll = poll
+        self.keepalive = keepalive
+        self._ring: Deque[Tuple[int, bytes]] = deque(maxlen=ring_size)
+        self._cond = threading.Condition()
+        self._latest = catalogue.version
+        self._clients = 0
+        self._poller: Optional[threading.Thread] = None
+        self._stats_frame = b""
+        self._stats_at = 0.0
+        self._loops: Dict[asyncio.AbstractEventLoop, asyncio.Event] = {}
+        catalogue.subscribe(self._on_change, replay=True)
+
+    @property
+    def clients(self) -> int:
+        return self._clients
+
+    def stream(self, last_event_id: Optional[int] = None) -> Iterator[bytes]:
+        with self._cond:
+            self._clients += 1
+            cursor = self._latest if last_event_id is None else last_event_id
+            self._start_poller()
+        try:
+            yield b"retry: 3000\n\n" + self._stats()
+            while True:
+                frames, cursor = self._wait(cursor)
+                yield b"".join(frames) if frames else self._stats()
+        finally:
+            with self._cond:
+                self._clients -= 1
+
+    async def astream(self, last_event_id: Optional[int] = None) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            self._clients += 1
+            cursor = self._latest if last_event_id is None else last_event_id
+            self._loops.setdefault(loop, asyncio.Event())
+            self._start_poller()
+        try:
+            yield b"retry: 3000\n\n" + self._stats()
+            while True:
+                with self._cond:
+                    frames, cursor = self._collect(cursor)
+                    changed = self._loops[loop]
+                if frames:
+                    yield b"".join(frames)
+                    continue
+                try:
+                    await asyncio.wait_for(changed.wait(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield self._stats()
+        finally:
+            with self._cond:
+                self._clients -= 1
+
+    def _on_change(self, record: dict):
+        # Called under the catalogue lock, in the order versions are assigned.
+        version = record["version"]
+        book_id = record["book"]["id"] if record["op"] == "add" else record["id"]
+        book = self.catalogue.get(book_id)
+        data = (b'{"version":' + dumps(version) + b',"op":' + dumps(record["op"])
+                + b',"id":' + dumps(book_id)
+                + b',"book":' + (book.to_json() if book is not None else b"null")
+                + b',"stats":' + dumps(self.catalogue.stats()) + b"}")
+        frame = b"id: %d\nevent: change\ndata: %s\n\n" % (version, data)
+        with self._cond:
+            self._ring.append((version, frame))
+            self._latest = version
+            self._cond.notify_all()
+            loops = list(self._loops)
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._wake, loop)
+            except RuntimeError:
+                # The loop has been closed.
+                with self._cond:
+                    self._loops.pop(loop, None)
+
+    def _wake(self, loop: asyncio.AbstractEventLoop):
+        # Runs on `loop`: release everything waiting on the current event and
+        # give later waiters a fresh one.
+        with self._cond:
+            changed = self._loops[loop]
+            self._loops[loop] = asyncio.Event()
+        changed.set()
+
+    def _wait(self, cursor: int) -> Tuple[List[bytes], int]:
+        with self._cond:
+            if self._latest == cursor:
+                self._cond.wait(self.keepalive)
+            return self._collect(cursor)
+
+    def _collect(self, cursor: int) -> Tuple[List[bytes], int]:
+        # Frames after `cursor` and the new cursor; call with _cond held.
+        if self._latest == cursor:
+            return [], cursor
+        oldest = self._ring[0][0] if self._ring else self._latest + 1
+        if cursor + 1 < oldest or cursor > self._latest:
+            frame = b"id: %d\nevent: resync\ndata: {}\n\n" % self._latest
+            return [frame], self._latest
+        frames = []
+        for version, frame in reversed(self._ring):
+            if version <= cursor:
+                break
+            frames.append(frame)
+        frames.reverse()
+        return frames, self._latest
+
+    def _stats(self) -> bytes:
+        # Overdue counts move with the clock, so idle connections get a stats
+        # event instead of a bare keepalive; it is computed at most once per
+        # keepalive interval no matter how many clients are waiting.
+        #
+        # _on_change holds the catalogue lock and then takes _cond, so the
+        # catalogue must never be called into with _cond held.
+        now = time.monotonic()
+        with self._cond:
+            if self._stats_frame and now - self._stats_at < self.keepalive:
+                return self._stats_frame
+        frame = b"event: stats\ndata: " + dumps(self.catalogue.stats()) + b"\n\n"
+        with self._cond:
+            self._stats_frame = frame
+            self._stats_at = now
+        return frame
+
+    def _start_poller(self):
+        if self.poll is None or (self._poller is not None and self._poller.is_alive()):
+            return
+        self._poller = threading.Thread(target=self._poll_loop, name="sse-poller", daemon=True)
+        self._poller.start()
+
+    def _poll_loop(self):
+        # A failing poll is logged and retried with the interval doubling up
+        # to MAX_POLL_BACKOFF, so a broken store logs at most that often.
+        delay = POLL_INTERVAL
+        while self._clients:
+            try:
+                self.poll()
+                delay = POLL_INTERVAL
+            except Exception:
+                delay = min(delay * 2, MAX_POLL_BACKOFF)
+                log.exception("change poll failed; retrying in %.1fs", delay)
+            time.sleep(delay)
@@ -0,0 +1,169 @@
+import heapq
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from catalogue import EPOCH, MICROSECOND, Book
+from sortedindex import SortedList
+
+
+class FieldIndex:
+    # Secondary indexes for filtered listing: book ids by author (compared
+    # case-insensitively, like the isIssued/author/yearFrom/yearTo filters),
+    # by publication year and by availability. Every posting is a SortedList
+    # of ids, so a filtered page is read in id order from the cursor exactly
+    # like an unfiltered one and the cursor stays a plain book id.
+    #
+    # A query is driven by its most selective filter; the other filters are
+    # checked per book by the caller. Listing one author, one availability
+    # state or one year range therefore costs O(log n + page), not O(n).
+    #
+    # Loan status is the only field that changes after insertion; the
+    # catalogue calls update() after every issue and return.
+
+    def __init__(self):
+        self._authors: Dict[str, SortedList] = {}
+        self._years: Dict[int, SortedList] = {}
+        self._year_keys = SortedList()
+        self._status = {True: SortedList(), False: SortedList()}
+
+    def __len__(self) -> int:
+        return len(self._status[True]) + len(self._status[False])
+
+    def add(self, book: Book):
+        _posting(self._authors, book.author.lower()).add(book.id)
+        if book.year not in self._years:
+            self._year_keys.add(book.year)
+        _posting(self._years, book.year).add(book.id)
+        self._status[book.is_issued].add(book.id)
+
+    def discard(self, book: Book):
+        _discard(self._authors, book.author.lower(), book.id)
+        if _discard(self._years, book.year, book.id):
+            self._year_keys.discard(book.year)
+        self._status[True].discard(book.id)
+        self._status[False].discard(book.id)
+
+    def update(self, book: Book):
+        self._status[not book.is_issued].discard(book.id)
+        self._status[book.is_issued].add(book.id)
+
+    def clear(self):
+        self._authors.clear()
+        self._years.clear()
+        self._year_keys.clear()
+        self._status[True].clear()
+        self._status[False].clear()
+
+    def ids(self, after: Optional[int] = None, is_issued: Optional[bool] = None,
+            author: Optional[str] = None, year_from: Optional[int] = None,
+            year_to: Optional[int] = None) -> Optional[Iterator[int]]:
+        # Ascending candidate ids after the cursor from the most selective
+        # filter, or None without filters (scan the catalogue instead). A
+        # year range is the union of its years' postings, merged lazily.
+        candidates: List[Tuple[int, List[SortedList]]] = []
+        if is_issued is not None:
+            posting = self._status[is_issued]
+            candidates.append((len(posting), [posting]))
+        if author is not None:
+            posting = self._authors.get(author.lower())
+            if posting is None:
+                return iter(())
+            candidates.append((len(posting), [posting]))
+        if year_from is not None or year_to is not None:
+            years = [self._years[y] for y in self._year_keys.irange(year_from, year_to)]
+            candidates.append((sum(len(p) for p in years), years))
+        if not candidates:
+            return None
+        _, postings = min(candidates, key=itemgetter(0))
+        ranges = [p.irange(minimum=after, inclusive=(False, True)) for p in postings]
+        return ranges[0] if len(ranges) == 1 else heapq.merge(*ranges)
+
+
+def _posting(postings: dict, key) -> SortedList:
+    posting = postings.get(key)
+    if posting is None:
+        posting = postings[key] = SortedList()
+    return posting
+
+
+def _discard(postings: dict, key, book_id: int) -> bool:
+    # Returns True when the posting for `key` became empty and was dropped.
+    posting = postings.get(key)
+    if posting is None or not posting.discard(book_id):
+        return False
+    if not posting:
+        del postings[key]
+        return True
+    return False
+
+
+class OrderIndex:
+    # Books ordered by (key(book), id), for sorted listing and top-k queries:
+    # a page or the first k books is a bisect plus a walk, O(log n + k), and
+    # inserts, deletes and loan changes are O(log n) instead of re-sorting
+    # per request. Books whose key is None (the due date of an available
+    # book) are left out. Keys are JSON values so a position can travel in a
+    # cursor.
+    #
+    # A key that changes after insertion needs `mutable`: the index then
+    # remembers each book's key so update() can move it.
+
+    def __init__(self, key: Callable[[Book], Any], mutable: bool = False):
+        self.key = key
+        self._order = SortedList()
+        self._keys: Optional[Dict[int, Any]] = {} if mutable else None
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def add(self, book: Book):
+        key = self.key(book)
+        if key is None:
+            return
+        self._order.add((key, book.id))
+        if self._keys is not None:
+            self._keys[book.id] = key
+
+    def discard(self, book: Book):
+        if self._keys is None:
+            key = self.key(book)
+        else:
+            key = self._keys.pop(book.id, None)
+        if key is not None:
+            self._order.discard((key, book.id))
+
+    def update(self, book: Book):
+        if self._keys is not None:
+            self.discard(book)
+            self.add(book)
+
+    def clear(self):
+        self._order.clear()
+        if self._keys is not None:
+            self._keys.clear()
+
+    def position(self, book: Book) -> Tuple[Any, int]:
+        return self.key(book), book.id
+
+    def ids(self, after: Optional[Tuple[Any, int]] = None,
+            reverse: bool = False) -> Iterator[int]:
+        # Ids in order (descending with `reverse`) strictly after a position.
+        if reverse:
+            entries = self._order.irange(maximum=after, inclusive=(True, False), reverse=True)
+        else:
+            entries = self._order.irange(minimum=after, inclusive=(False, True))
+        return map(itemgetter(1), entries)
+
+
+def title_key(book: Book) -> str:
+    return book.title.casefold()
+
+
+def year_key(book: Book) -> int:
+    return book.year
+
+
+def due_key(book: Book) -> Optional[int]:
+    # Microseconds since EPOCH, like Book's own due date field.
+    due_date = book.due_date
+    return None if due_date is None else (due_date - EPOCH) // MICROSECOND
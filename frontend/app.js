@@ -0,0 +1,666 @@
+// ----------------- FRONTEND STATE -----------------
+let books = [];
+let syncVersion = null;
+let storeId = null;
+let currentView = "home";
+let selectedBook = null;
+const issueDays = 7;
+
+function showNotification(msg, type = "info") {
+  const box = document.getElementById("notification");
+  const text = document.getElementById("notification-text");
+  const icon = document.getElementById("notification-icon");
+
+  const baseClasses = "fixed top-6 right-6 px-6 py-4 rounded-xl shadow-2xl flex items-center gap-3 animate-slideIn z-50";
+  let bg = "bg-blue-500";
+  let iconChar = "ℹ️";
+
+  if (type === "success") { bg = "bg-emerald-500"; iconChar = "✅"; }
+  if (type === "error")   { bg = "bg-red-500";     iconChar = "❌"; }
+  if (type === "warning") { bg = "bg-amber-500";   iconChar = "⚠️"; }
+
+  box.className = baseClasses + " text-white " + bg;
+  text.textContent = msg;
+  icon.textContent = iconChar;
+  box.classList.remove("hidden");
+
+  setTimeout(() => {
+    box.classList.add("hidden");
+  }, 3000);
+}
+
+// --------------- STATUS UTILS ----------------------
+function getBookStatus(book) {
+  if (!book.isIssued) {
+    return {
+      text: "Available",
+      icon: "📗",
+      color: "text-emerald-600",
+      bg: "bg-emerald-100",
+      border: "border-emerald-300"
+    };
+  }
+  const today = new Date();
+  const due = book.dueDate ? new Date(book.dueDate) : null;
+  if (due && today > due) {
+    return {
+      text: "Overdue",
+      icon: "⚠️",
+      color: "text-red-600",
+      bg: "bg-red-100",
+      border: "border-red-300"
+    };
+  }
+  return {
+    text: "Issued",
+    icon: "📕",
+    color: "text-blue-600",
+    bg: "bg-blue-100",
+    border: "border-blue-300"
+  };
+}
+
+function updateStatsBar() {
+  fetch("/api/stats")
+    .then(r => r.json())
+    .then(showStats)
+    .catch(() => {});
+}
+
+function showStats(stats) {
+  document.getElementById("total-count").textContent = stats.total;
+  document.getElementById("issued-count").textContent = stats.issued;
+  document.getElementById("available-count").textContent = stats.available;
+  document.getElementById("overdue-count").textContent = stats.overdue;
+}
+
+// --------------- API CALLS -------------------------
+function loadBooks() {
+  const loaded = [];
+  let version = null;
+  function loadPage(cursor) {
+    let url = "/api/books?limit=1000";
+    if (cursor !== null) url += `&cursor=${cursor}`;
+    return fetch(url)
+      .then(r => {
+        if (version === null) {
+          version = parseInt(r.headers.get("X-Catalogue-Version"));
+          storeId = r.headers.get("X-Store-Id");
+        }
+        return r.json();
+      })
+      .then(page => {
+        loaded.push(...page.books);
+        if (page.nextCursor !== null) return loadPage(page.nextCursor);
+        books = loaded;
+        // Changes made while paging are picked up by the next sync.
+        syncVersion = version;
+        saveCachedBooks();
+      });
+  }
+  return loadPage(null);
+}
+
+function syncBooks() {
+  if (syncVersion === null) return loadBooks();
+  return fetch(`/api/changes?since=${syncVersion}&store=${storeId}`)
+    .then(r => r.json())
+    .then(delta => {
+      if (delta.resync) return loadBooks();
+      const changed = new Map(delta.books.map(b => [b.id, b]));
+      const deleted = new Set(delta.deleted);
+      books = books
+        .filter(b => !deleted.has(b.id))
+        .map(b => {
+          const updated = changed.get(b.id);
+          if (updated) changed.delete(b.id);
+          return updated || b;
+        })
+        .concat([...changed.values()]);
+      syncVersion = delta.version;
+      saveCachedBooks();
+    });
+}
+
+function saveCachedBooks() {
+  try {
+    localStorage.setItem("libraryhub-books",
+      JSON.stringify({ storeId, version: syncVersion, books }));
+  } catch (e) {
+    // Quota exceeded on large catalogues; the next visit loads in full.
+  }
+}
+
+function loadCachedBooks() {
+  try {
+    const cached = JSON.parse(localStorage.getItem("libraryhub-books"));
+    if (cached && Array.isArray(cached.books)) {
+      books = cached.books;
+      syncVersion = cached.version;
+      storeId = cached.storeId;
+      return true;
+    }
+  } catch (e) {}
+  return false;
+}
+
+function listenForChanges() {
+  if (!window.EventSource) return;
+  const source = new EventSource(`/api/events?store=${storeId}`);
+  let pending = null;
+  source.addEventListener("stats", e => showStats(JSON.parse(e.data)));
+  source.addEventListener("change", e => {
+    const change = JSON.parse(e.data);
+    showStats(change.stats);
+    if (syncVersion === null || change.version <= syncVersion) return;
+    if (change.version !== syncVersion + 1) {
+      pending = pending || syncBooks().finally(() => { pending = null; refreshView(); });
+      return;
+    }
+    const i = books.findIndex(b => b.id === change.id);
+    if (!change.book) {
+      if (i >= 0) books.splice(i, 1);
+    } else if (i >= 0) {
+      books[i] = change.book;
+    } else {
+      books.push(change.book);
+    }
+    syncVersion = change.version;
+    refreshView();
+  });
+  source.addEventListener("resync", () => {
+    pending = pending || syncBooks().finally(() => { pending = null; refreshView(); });
+  });
+}
+
+function refreshView() {
+  // Leave forms and the search box alone while the user is typing.
+  if (currentView !== "add" && currentView !== "search") render();
+}
+
+function apiIssueBook(id) {
+  return fetch(`/api/books/${id}/issue`, { method: "POST" })
+    .then(r => r.json());
+}
+
+function apiReturnBook(id) {
+  return fetch(`/api/books/${id}/return`, { method: "POST" })
+    .then(r => r.json());
+}
+
+function apiDeleteBook(id) {
+  return fetch(`/api/books/${id}`, { method: "DELETE" })
+    .then(r => r.json());
+}
+
+function apiAddBook(payload) {
+  return fetch("/api/books", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(payload)
+  }).then(r => r.json());
+}
+
+// --------------- RENDER FUNCTIONS ------------------
+function render() {
+  const container = document.getElementById("main-content");
+  if (currentView === "home") {
+    renderHome(container);
+  } else if (currentView === "search") {
+    renderSearch(container);
+  } else if (currentView === "issued") {
+    renderIssued(container);
+  } else if (currentView === "issue") {
+    renderIssue(container);
+  } else if (currentView === "add") {
+    renderAdd(container);
+  }
+}
+
+function renderHome(container) {
+  let html = `
+    <div class="mb-8">
+      <h2 class="text-3xl font-bold text-white mb-1">All Books</h2>
+      <p class="text-slate-400 text-sm">Click a book card to view details, issue, return, or delete.</p>
+    </div>
+    <div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6">
+  `;
+
+  if (books.length === 0) {
+    html += `
+      <div class="col-span-full text-center py-16">
+        <p class="text-slate-400 text-xl">No books in the library.</p>
+      </div>`;
+  } else {
+    books.forEach(book => {
+      const status = getBookStatus(book);
+      const duePart = book.dueDate
+        ? `<span class="text-amber-400 font-bold text-xs">📌 ${new Date(book.dueDate).toLocaleDateString()}</span>`
+        : "";
+      html += `
+        <div class="group backdrop-blur-xl bg-gradient-to-br from-slate-800/80 to-slate-900/80 rounded-2xl shadow-2xl overflow-hidden cursor-pointer transition-all duration-500 hover:scale-110 hover:shadow-2xl border border-slate-700/50 hover:border-cyan-400/50 h-72 hover:-translate-y-4"
+             data-book-id="${book.id}">
+          <div class="h-32 bg-gradient-to-br from-cyan-500 via-blue-600 to-purple-600 relative overflow-hidden group-hover:via-cyan-600 transition-all duration-300">
+            <div class="absolute inset-0 opacity-0 group-hover:opacity-20 transition-opacity duration-300 bg-white"></div>
+            <div class="p-5 text-white h-full flex flex-col justify-between">
+              <div>
+                <span class="text-3xl">${status.icon}</span>
+                <p class="text-xs font-semibold opacity-90 mt-1">ID: ${book.id}</p>
+              </div>
+              <span class="text-xs font-bold px-3 py-1.5 rounded-lg ${status.bg} ${status.color} w-fit border ${status.border}">
+                ${status.text}
+              </span>
+            </div>
+          </div>
+          <div class="p-5 flex flex-col justify-between flex-1 h-40">
+            <div>
+              <h3 class="font-bold text-base text-white line-clamp-2 mb-2">${book.title}</h3>
+              <p class="text-slate-400 text-xs mb-3 line-clamp-1">${book.author}</p>
+            </div>
+            <div class="flex justify-between items-center text-xs text-slate-400 border-t border-slate-700 pt-3">
+              <span>📅 ${book.year}</span>
+              ${duePart}
+            </div>
+          </div>
+        </div>
+      `;
+    });
+  }
+
+  html += "</div>";
+  container.innerHTML = html;
+
+  document.querySelectorAll("[data-book-id]").forEach(card => {
+    card.addEventListener("click", () => {
+      const id = parseInt(card.getAttribute("data-book-id"));
+      const book = books.find(b => b.id === id);
+      if (book) openModal(book);
+    });
+  });
+}
+
+function renderSearch(container) {
+  let html = `
+    <h2 class="text-3xl font-bold text-white mb-6">Search Books</h2>
+    <div class="mb-8">
+      <input id="search-input" type="text"
+             placeholder="🔍 Search by ID, title, or author..."
+             class="w-full px-6 py-4 rounded-2xl shadow-lg focus:outline-none focus:ring-2 focus:ring-cyan-500 bg-slate-800/80 text-white placeholder-slate-500 border border-slate-700 transition-all duration-300 text-base" />
+    </div>
+    <div id="search-results" class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6"></div>
+  `;
+  container.innerHTML = html;
+
+  const input = document.getElementById("search-input");
+  const results = document.getElementById("search-results");
+
+  let searchTimer = null;
+  let searchResults = [];
+
+  function renderResults(term) {
+    if (!term.trim()) {
+      showResults(books);
+      return;
+    }
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => {
+      fetch(`/api/search?limit=100&q=${encodeURIComponent(term)}`)
+        .then(r => r.json())
+        .then(data => {
+          if (input.value === term) showResults(data.books || []);
+        })
+        .catch(() => {});
+    }, 150);
+  }
+
+  function showResults(filtered) {
+    searchResults = filtered;
+    if (filtered.length === 0) {
+      results.innerHTML = `
+        <div class="col-span-full text-center py-16">
+          <p class="text-slate-400 text-xl">No books found.</p>
+        </div>`;
+      return;
+    }
+
+    let htmlCards = "";
+    filtered.forEach(book => {
+      const status = getBookStatus(book);
+      htmlCards += `
+        <div class="group backdrop-blur-xl bg-gradient-to-br from-slate-800/80 to-slate-900/80 rounded-2xl shadow-lg overflow-hidden cursor-pointer transition-all duration-300 hover:scale-105 hover:shadow-2xl border border-slate-700/50 hover:border-cyan-400/50"
+             data-book-id="${book.id}">
+          <div class="h-28 ${status.bg} p-5 flex flex-col justify-between">
+            <span class="text-2xl">${status.icon}</span>
+            <span class="text-xs font-bold ${status.color} w-fit">${status.text}</span>
+          </div>
+          <div class="p-4 bg-slate-800/80">
+            <h3 class="font-bold text-white mb-2 line-clamp-2">${book.title}</h3>
+            <p class="text-slate-400 text-sm line-clamp-1">${book.author}</p>
+            <p class="text-slate-500 text-xs mt-2">📅 ${book.year}</p>
+          </div>
+        </div>
+      `;
+    });
+    results.innerHTML = htmlCards;
+
+    document.querySelectorAll("#search-results [data-book-id]").forEach(card => {
+      card.addEventListener("click", () => {
+        const id = parseInt(card.getAttribute("data-book-id"));
+        const book = searchResults.find(b => b.id === id);
+        if (book) openModal(book);
+      });
+    });
+  }
+
+  input.addEventListener("input", () => renderResults(input.value));
+  renderResults("");
+}
+
+function renderIssued(container) {
+  const issuedBooks = books.filter(b => b.isIssued);
+  let html = `
+    <h2 class="text-3xl font-bold text-white mb-6">Issued Books</h2>
+    <div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6">
+  `;
+
+  if (issuedBooks.length === 0) {
+    html += `
+      <div class="col-span-full text-center py-16">
+        <p class="text-slate-400 text-xl">No issued books.</p>
+      </div>`;
+  } else {
+    const today = new Date();
+    issuedBooks.forEach(book => {
+      const status = getBookStatus(book);
+      const due = book.dueDate ? new Date(book.dueDate) : null;
+      const daysLeft = due ? Math.ceil((due - today) / (1000 * 60 * 60 * 24)) : 0;
+      const overdue = due && today > due;
+      const badgeText = overdue
+        ? `⚠️ ${Math.abs(daysLeft)} days overdue`
+        : `📅 ${daysLeft} days left`;
+      const badgeClass = overdue
+        ? "bg-red-500/20 text-red-400"
+        : "bg-blue-500/20 text-blue-400";
+
+      html += `
+        <div class="group backdrop-blur-xl bg-gradient-to-br from-slate-800/80 to-slate-900/80 rounded-2xl shadow-lg overflow-hidden cursor-pointer transition-all duration-300 hover:scale-105 hover:shadow-2xl border border-slate-700/50 hover:border-cyan-400/50"
+             data-book-id="${book.id}">
+          <div class="h-28 ${status.bg} p-5 flex flex-col justify-between">
+            <span class="text-2xl">${status.icon}</span>
+            <span class="text-xs font-bold ${status.color} w-fit">${status.text}</span>
+          </div>
+          <div class="p-4 bg-slate-800/80">
+            <h3 class="font-bold text-white mb-2 line-clamp-2">${book.title}</h3>
+            <p class="text-slate-400 text-sm line-clamp-1">${book.author}</p>
+            <div class="mt-3 p-2 rounded-lg text-xs font-bold ${badgeClass}">
+              ${badgeText}
+            </div>
+          </div>
+        </div>
+      `;
+    });
+  }
+
+  html += "</div>";
+  container.innerHTML = html;
+
+  document.querySelectorAll("[data-book-id]").forEach(card => {
+    card.addEventListener("click", () => {
+      const id = parseInt(card.getAttribute("data-book-id"));
+      const book = books.find(b => b.id === id);
+      if (book) openModal(book);
+    });
+  });
+}
+
+function renderIssue(container) {
+  const availableBooks = books.filter(b => !b.isIssued);
+  let html = `
+    <h2 class="text-3xl font-bold text-white mb-6">Quick Issue</h2>
+    <p class="text-slate-400 mb-6 text-sm">Issue any available book directly from this list.</p>
+    <div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6">
+  `;
+  if (availableBooks.length === 0) {
+    html += `
+      <div class="col-span-full text-center py-16">
+        <p class="text-slate-400 text-xl">All books are currently issued.</p>
+      </div>`;
+  } else {
+    availableBooks.forEach(book => {
+      html += `
+        <div class="backdrop-blur-xl bg-gradient-to-br from-slate-800/80 to-slate-900/80 rounded-2xl shadow-lg overflow-hidden hover:shadow-2xl transition-all duration-300 border border-slate-700/50 hover:border-emerald-400/50">
+          <div class="bg-gradient-to-r from-emerald-500 to-green-600 p-4">
+            <h3 class="text-white font-bold text-lg line-clamp-2">${book.title}</h3>
+          </div>
+          <div class="p-4">
+            <p class="text-slate-400 mb-2 text-sm line-clamp-2">${book.author}</p>
+            <p class="text-slate-500 text-xs mb-4">📅 ${book.year}</p>
+            <button class="issue-btn w-full bg-gradient-to-r from-emerald-500 to-green-600 hover:from-emerald-600 hover:to-green-700 text-white font-bold py-2.5 rounded-lg transition-all duration-300 transform hover:scale-105 shadow-lg"
+                    data-book-id="${book.id}">
+              📤 Issue Book
+            </button>
+          </div>
+        </div>
+      `;
+    });
+  }
+  html += "</div>";
+  container.innerHTML = html;
+
+  document.querySelectorAll(".issue-btn").forEach(btn => {
+    btn.addEventListener("click", () => {
+      const id = parseInt(btn.getAttribute("data-book-id"));
+      handleIssueBook(id);
+    });
+  });
+}
+
+function renderAdd(container) {
+  const html = `
+    <div class="max-w-xl mx-auto backdrop-blur-xl bg-gradient-to-br from-slate-800/90 to-slate-900/90 rounded-2xl shadow-2xl p-8 border border-slate-700/60">
+      <h2 class="text-3xl font-bold text-white mb-2">➕ Add New Book</h2>
+      <p class="text-slate-400 mb-6 text-sm">Fill the form to expand your library collection.</p>
+      <div class="space-y-4">
+        <div>
+          <label class="block text-white font-semibold mb-1 text-sm">Book ID</label>
+          <input id="add-id" type="number" class="w-full px-4 py-2 border-2 border-slate-600 rounded-xl focus:outline-none focus:border-cyan-500 focus:ring-2 focus:ring-cyan-500/20 bg-slate-700/50 text-white placeholder-slate-500" placeholder="101" />
+        </div>
+        <div>
+          <label class="block text-white font-semibold mb-1 text-sm">Title</label>
+          <input id="add-title" type="text" class="w-full px-4 py-2 border-2 border-slate-600 rounded-xl focus:outline-none focus:border-cyan-500 focus:ring-2 focus:ring-cyan-500/20 bg-slate-700/50 text-white placeholder-slate-500" placeholder="Enter book title" />
+        </div>
+        <div>
+          <label class="block text-white font-semibold mb-1 text-sm">Author</label>
+          <input id="add-author" type="text" class="w-full px-4 py-2 border-2 border-slate-600 rounded-xl focus:outline-none focus:border-cyan-500 focus:ring-2 focus:ring-cyan-500/20 bg-slate-700/50 text-white placeholder-slate-500" placeholder="Enter author name" />
+        </div>
+        <div>
+          <label class="block text-white font-semibold mb-1 text-sm">Year</label>
+          <input id="add-year" type="number" class="w-full px-4 py-2 border-2 border-slate-600 rounded-xl focus:outline-none focus:border-cyan-500 focus:ring-2 focus:ring-cyan-500/20 bg-slate-700/50 text-white placeholder-slate-500" placeholder="2024" />
+        </div>
+      </div>
+      <div class="flex gap-4 pt-6">
+        <button id="add-submit"
+                class="flex-1 bg-gradient-to-r from-cyan-500 to-blue-600 hover:from-cyan-600 hover:to-blue-700 text-white font-bold py-3 rounded-xl hover:shadow-lg transition-all duration-300 transform hover:scale-105">
+          ✅ Add Book
+        </button>
+        <button id="add-cancel"
+                class="flex-1 bg-slate-700 hover:bg-slate-600 text-white font-bold py-3 rounded-xl transition-all duration-300 border border-slate-600">
+          Cancel
+        </button>
+      </div>
+    </div>
+  `;
+  container.innerHTML = html;
+
+  document.getElementById("add-submit").addEventListener("click", () => {
+    const idVal = document.getElementById("add-id").value.trim();
+    const titleVal = document.getElementById("add-title").value.trim();
+    const authorVal = document.getElementById("add-author").value.trim();
+    const yearVal = document.getElementById("add-year").value.trim();
+
+    if (!idVal || !titleVal || !authorVal || !yearVal) {
+      showNotification("Please fill all fields", "error");
+      return;
+    }
+
+    apiAddBook({
+      id: parseInt(idVal),
+      title: titleVal,
+      author: authorVal,
+      year: parseInt(yearVal)
+    }).then(res => {
+      if (res.error) {
+        showNotification(res.error, "error");
+      } else {
+        books.push(res);
+        showNotification("✨ Book added successfully!", "success");
+        switchView("home");
+      }
+      updateStatsBar();
+    }).catch(() => {
+      showNotification("Error adding book", "error");
+    });
+  });
+
+  document.getElementById("add-cancel").addEventListener("click", () => {
+    switchView("home");
+  });
+}
+
+// --------------- MODAL HANDLING --------------------
+function openModal(book) {
+  selectedBook = book;
+  document.getElementById("modal-title").textContent = book.title;
+  document.getElementById("modal-author").textContent = book.author;
+  document.getElementById("modal-id").textContent = book.id;
+  document.getElementById("modal-year").textContent = book.year;
+
+  const status = getBookStatus(book);
+  const box = document.getElementById("modal-status-box");
+  const statusText = document.getElementById("modal-status-text");
+  const dueEl = document.getElementById("modal-due");
+
+  box.className = `p-4 rounded-xl border-2 ${status.bg} ${status.border}`;
+  statusText.className = `font-bold text-lg ${status.color}`;
+  statusText.textContent = status.text;
+
+  if (book.dueDate) {
+    dueEl.textContent = "📅 Due: " + new Date(book.dueDate).toLocaleDateString();
+  } else {
+    dueEl.textContent = "";
+  }
+
+  const issueBtn = document.getElementById("modal-issue-btn");
+  const returnBtn = document.getElementById("modal-return-btn");
+
+  if (book.isIssued) {
+    issueBtn.classList.add("hidden");
+    returnBtn.classList.remove("hidden");
+  } else {
+    issueBtn.classList.remove("hidden");
+    returnBtn.classList.add("hidden");
+  }
+
+  document.getElementById("modal-backdrop").classList.remove("hidden");
+}
+
+function closeModal() {
+  document.getElementById("modal-backdrop").classList.add("hidden");
+  selectedBook = null;
+}
+
+function handleIssueBook(id) {
+  apiIssueBook(id).then(res => {
+    if (res.error) {
+      showNotification(res.error, "error");
+      return;
+    }
+    books = books.map(b => b.id === id ? res : b);
+    showNotification("📤 Book issued!", "success");
+    updateStatsBar();
+    render();
+    if (selectedBook && selectedBook.id === id) {
+      openModal(res);
+    }
+  }).catch(() => {
+    showNotification("Error issuing book", "error");
+  });
+}
+
+function handleReturnBook(id) {
+  apiReturnBook(id).then(res => {
+    if (res.error) {
+      showNotification(res.error, "error");
+      return;
+    }
+    const updated = res.book;
+    books = books.map(b => b.id === id ? updated : b);
+    if (res.fine > 0) {
+      showNotification(`⚠️ Overdue! Fine: Rs. ${res.fine} (${res.daysOverdue} days)`, "warning");
+    } else {
+      showNotification("✅ Book returned on time!", "success");
+    }
+    updateStatsBar();
+    render();
+    closeModal();
+  }).catch(() => {
+    showNotification("Error returning book", "error");
+  });
+}
+
+function handleDeleteBook(id) {
+  if (!confirm("Are you sure you want to delete this book?")) return;
+  apiDeleteBook(id).then(() => {
+    books = books.filter(b => b.id !== id);
+    showNotification("🗑️ Book deleted", "info");
+    updateStatsBar();
+    render();
+    closeModal();
+  }).catch(() => {
+    showNotification("Error deleting book", "error");
+  });
+}
+
+// --------------- NAV + INIT ------------------------
+function switchView(view) {
+  currentView = view;
+  document.querySelectorAll(".nav-btn").forEach(btn => {
+    const v = btn.getAttribute("data-view");
+    if (v === view) {
+      btn.className = "nav-btn px-6 py-2 rounded-xl font-bold border bg-gradient-to-r from-cyan-500 to-blue-600 text-white shadow-lg border-cyan-400";
+    } else {
+      btn.className = "nav-btn px-6 py-2 rounded-xl font-bold border bg-slate-700/70 text-slate-300 border-slate-600 hover:bg-slate-600/80";
+    }
+  });
+  render();
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+  document.querySelectorAll(".nav-btn").forEach(btn => {
+    btn.addEventListener("click", () => {
+      const view = btn.getAttribute("data-view");
+      switchView(view);
+    });
+  });
+
+  document.getElementById("modal-close-btn").addEventListener("click", closeModal);
+  document.getElementById("modal-delete-btn").addEventListener("click", () => {
+    if (selectedBook) handleDeleteBook(selectedBook.id);
+  });
+  document.getElementById("modal-issue-btn").addEventListener("click", () => {
+    if (selectedBook) handleIssueBook(selectedBook.id);
+  });
+  document.getElementById("modal-return-btn").addEventListener("click", () => {
+    if (selectedBook) handleReturnBook(selectedBook.id);
+  });
+
+  document.getElementById("modal-backdrop").addEventListener("click", (e) => {
+    if (e.target.id === "modal-backdrop") closeModal();
+  });
+
+  (loadCachedBooks() ? syncBooks() : loadBooks()).then(() => {
+    updateStatsBar();
+    render();
+    listenForChanges();
+  });
+});
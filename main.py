@@ -1,9 +1,31 @@
+import atexit
+import base64
+import functools
+import json
+import os
 import threading
+import time
 import webbrowser
 from datetime import datetime, timedelta
-from typing import List, Optional
-
-from flask import Flask, jsonify, request, Response
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import Flask, g, jsonify, request, Response, stream_with_context
+
+import bulk
+from catalogue import Book, BookNotFound, BookStateError, Catalogue, int64, utf8
+from changelog import ChangeLog, split_changes
+from circulation import CirculationLog
+from compression import StaticAsset, compress_response, hashed_name, ASSET_MAX_AGE
+from events import Broadcaster
+from fieldindex import FieldIndex, OrderIndex, due_key, title_key, year_key
+from metrics import RequestMetrics, counters, gauges
+from persistence import open_store
+from profiler import DEFAULT_HZ, SamplingProfiler, write_profile
+from responsecache import (BOOKS, CATALOGUE, DEFAULT_MAX_BYTES, LOANS, CacheInvalidator,
+                           ResponseCache, author_tag, book_tag)
+from scheduler import OverdueScheduler
+from search import SearchIndex
+from serialization import dumps, json_array, json_response
 
 app = Flask(__name__)
 
@@ -12,35 +34,41 @@ app = Flask(__name__)
 ISSUE_DAYS = 7
 FINE_PER_DAY = 10
 
-
-class Book:
-    def __init__(self, id: int, title: str, author: str, year: int,
-                 is_issued: bool = False, due_date: Optional[datetime] = None):
-        self.id = id
-        self.title = title
-        self.author = author
-        self.year = year
-        self.is_issued = is_issued
-        self.due_date = due_date
-
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "title": self.title,
-            "author": self.author,
-            "year": self.year,
-            "isIssued": self.is_issued,
-            "dueDate": self.due_date.isoformat() if self.due_date else None,
-        }
-
-
-books_db: List[Book] = []
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+MAX_IMPORT_ERRORS = 100
+MAX_BATCH_SIZE = 1000
+BOOK_FIELDS = ("id", "title", "author", "year", "isIssued", "dueDate")
+PAGE_PARAMS = ("limit", "cursor", "fields", "isIssued", "author", "yearFrom", "yearTo",
+               "sort", "order")
+EVENT_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+books_db = Catalogue()
+# The search, filter and sort indexes are lazy: each is built on the first
+# request that needs it rather than while a worker boots.
+search_index = SearchIndex()
+books_db.add_index(search_index, lazy=True)
+field_index = FieldIndex()
+books_db.add_index(field_index, lazy=True)
+# Orders for /api/books?sort=, keyed by the parameter value.
+sort_indexes = {
+    "title": OrderIndex(title_key),
+    "year": OrderIndex(year_key),
+    "dueDate": OrderIndex(due_key, mutable=True),
+}
+for sort_index in sort_indexes.values():
+    books_db.add_index(sort_index, lazy=True)
+# Encoded bodies of read endpoints, dropped by tag as the catalogue changes.
+# LIBRARY_CACHE_BYTES=0 turns caching off.
+response_cache = ResponseCache(int(os.environ.get("LIBRARY_CACHE_BYTES", DEFAULT_MAX_BYTES)))
+books_db.add_index(CacheInvalidator(response_cache))
 
 
 def init_books():
-    global books_db
     now = datetime.now()
-    books_db = [
+    books_db.clear()
+    for book in [
         Book(101, "The C Programming Language", "Brian Kernighan", 1978),
         Book(102, "Clean Code", "Robert C. Martin", 2008),
         Book(103, "The Pragmatic Programmer", "Andrew Hunt", 1999,
@@ -57,858 +85,779 @@ def init_books():
         Book(111, "The Midnight Library", "Matt Haig", 2020,
              is_issued=True, due_date=now + timedelta(days=4)),
         Book(112, "Educated", "Tara Westover", 2018),
-    ]
-
-
-def find_book_index(book_id: int) -> int:
-    for i, b in enumerate(books_db):
-        if b.id == book_id:
-            return i
-    return -1
+    ]:
+        books_db.add(book)
+
+
+# Storage backend, see persistence.open_store: "memory" (default),
+# "wal:<directory>" or "sqlite:<database file>". LIBRARY_DATA_DIR on its own
+# selects the WAL backend. Use the SQLite backend when running several
+# gunicorn workers so they all see the same catalogue.
+DATA_DIR = os.environ.get("LIBRARY_DATA_DIR")
+STORAGE = os.environ.get("LIBRARY_STORAGE") or (f"wal:{DATA_DIR}" if DATA_DIR else "memory")
+
+store = open_store(STORAGE, books_db)
+with store.transaction():
+    if not store.recover():
+        init_books()
+store.start()
+atexit.register(store.close)
+
+changelog = ChangeLog(books_db)
+events = Broadcaster(books_db, poll=store.refresh)
+overdue_scheduler = OverdueScheduler(books_db)
+overdue_scheduler.start()
+
+# Circulation history (issues, returns, fines). Kept on disk next to the
+# write-ahead log with the WAL backend, in the shared database with SQLite
+# and in memory otherwise.
+storage_kind, _, storage_location = STORAGE.partition(":")
+circulation = CirculationLog(
+    books_db, lambda due_date, at: compute_fine(due_date, at)[0],
+    os.path.join(storage_location, "circulation") if storage_kind == "wal" else None,
+    shared=store if storage_kind == "sqlite" else None)
+atexit.register(circulation.close)
+
+# Sampling profiler. LIBRARY_PROFILE=<file> profiles the whole run and
+# writes the file at exit (.json for speedscope, otherwise collapsed stacks;
+# the pid is appended so each worker writes its own). With
+# LIBRARY_ADMIN_TOKEN set, the /api/admin/profile endpoints take short
+# profiles of the worker that serves them on demand.
+PROFILE_OUTPUT = os.environ.get("LIBRARY_PROFILE")
+PROFILE_HZ = int(os.environ.get("LIBRARY_PROFILE_HZ", DEFAULT_HZ))
+ADMIN_TOKEN = os.environ.get("LIBRARY_ADMIN_TOKEN")
+MAX_PROFILE_SECONDS = 300
+
+profiler = SamplingProfiler(PROFILE_HZ)
+if PROFILE_OUTPUT:
+    root, ext = os.path.splitext(PROFILE_OUTPUT)
+    profiler.start()
+    atexit.register(lambda: (profiler.stop(),
+                             write_profile(profiler, f"{root}.{os.getpid()}{ext}")))
+
+
+def mutation(handler):
+    # Runs a mutating handler inside a storage transaction and answers only
+    # once its changes, and the circulation history they add, are durable.
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        with store.transaction():
+            response = handler(*args, **kwargs)
+        store.sync()
+        circulation.sync()
+        return response
+    return wrapper
+
+
+# Handler latency and response counts per route, exposed on /metrics. The
+# hooks are registered first so they also time the other hooks.
+request_metrics = RequestMetrics()
+
+
+@app.before_request
+def start_timer():
+    request.environ["library.start"] = time.perf_counter()
+
+
+@app.after_request
+def record_metrics(response: Response) -> Response:
+    start = request.environ.get("library.start")
+    if start is not None:
+        rule = request.url_rule
+        request_metrics.record(request.method, rule.rule if rule is not None else "unmatched",
+                               time.perf_counter() - start, response.status_code)
+    return response
+
+
+@app.before_request
+def refresh_catalogue():
+    store.refresh()
+
+
+@app.after_request
+def compress(response: Response) -> Response:
+    return compress_response(request, response)
+
+
+def conditional(version: int, tag: str, build: Callable[[], Response],
+                cache_key: Optional[str] = None) -> Response:
+    # Strong ETag from the store id and the catalogue version (plus `tag`
+    # for anything else the response depends on). Matching polls get an
+    # empty 304 without the body ever being built. With a cache_key the body
+    # comes from the response cache when an earlier build is still valid.
+    #
+    # `version` is read by the caller before building, and the same value
+    # goes into X-Catalogue-Version: the body reflects at least that version,
+    # so a client syncing from it through /api/changes never skips a change.
+    etag = f"{store.store_id}-v{version}{tag}"
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = cached(cache_key, build) if cache_key else app.make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Catalogue-Version"] = str(version)
+    response.headers["X-Store-Id"] = store.store_id
+    return response
+
+
+def cached(key: str, build: Callable[[], Response]) -> Response:
+    # A cache miss builds the response and stores its body under the tags
+    # the build declared with depends_on(); without tags nothing is stored.
+    entry = response_cache.get(key)
+    if entry is not None:
+        return Response(entry.body, mimetype=entry.mimetype)
+    token = response_cache.token()
+    g.cache_tags = set()
+    response = app.make_response(build())
+    if response.status_code == 200 and g.cache_tags:
+        response_cache.put(key, response.get_data(), response.mimetype, g.cache_tags, token)
+    return response
+
+
+def depends_on(*tags: str):
+    tags_so_far = g.get("cache_tags")
+    if tags_so_far is not None:
+        tags_so_far.update(tags)
 
 
-init_books()
+# -------------------- API ENDPOINTS --------------------
 
+def compute_fine(due_date: Optional[datetime], today: datetime) -> Tuple[int, int]:
+    # Returns (fine, days overdue) for a book returned today.
+    if due_date and today > due_date:
+        days_overdue = (today.date() - due_date.date()).days
+        return days_overdue * FINE_PER_DAY, days_overdue
+    return 0, 0
+
+
+def parse_bool(value: str) -> bool:
+    value = value.lower()
+    if value in ("true", "1"):
+        return True
+    if value in ("false", "0"):
+        return False
+    raise ValueError(value)
+
+
+def parse_filters(args) -> Dict[str, Any]:
+    # Keyword arguments for FieldIndex.ids and book_filter.
+    filters: Dict[str, Any] = {}
+    if "isIssued" in args:
+        filters["is_issued"] = parse_bool(args["isIssued"])
+    if "author" in args:
+        filters["author"] = args["author"].strip().lower()
+    if "yearFrom" in args:
+        filters["year_from"] = int(args["yearFrom"])
+    if "yearTo" in args:
+        filters["year_to"] = int(args["yearTo"])
+    return filters
+
+
+def book_filter(filters: Dict[str, Any]) -> Optional[Callable[[Book], bool]]:
+    checks = []
+    if "is_issued" in filters:
+        is_issued = filters["is_issued"]
+        checks.append(lambda b: b.is_issued == is_issued)
+    if "author" in filters:
+        author = filters["author"]
+        checks.append(lambda b: b.author.lower() == author)
+    if "year_from" in filters:
+        year_from = filters["year_from"]
+        checks.append(lambda b: b.year >= year_from)
+    if "year_to" in filters:
+        year_to = filters["year_to"]
+        checks.append(lambda b: b.year <= year_to)
+    if not checks:
+        return None
+    return lambda b: all(check(b) for check in checks)
+
+
+def encode_cursor(position: Tuple[Any, int]) -> str:
+    return base64.urlsafe_b64encode(dumps(list(position))).decode()
+
+
+def decode_cursor(token: str, key_type: type) -> Tuple[Any, int]:
+    # Sorted pages resume after the (sort key, id) of the last book sent, so
+    # a book moving or disappearing between pages can't shift the next one.
+    key, book_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+    if not isinstance(key, key_type) or not isinstance(book_id, int):
+        raise ValueError(token)
+    return key, book_id
 
-# -------------------- API ENDPOINTS --------------------
 
 @app.route("/api/books", methods=["GET"])
 def get_books():
-    return jsonify([b.to_dict() for b in books_db])
+    return conditional(books_db.version, "", list_books, request.full_path)
+
+
+def list_books():
+    args = request.args
+    # Without paging parameters keep returning the full list for old clients.
+    if not any(param in args for param in PAGE_PARAMS):
+        depends_on(CATALOGUE)
+        return json_response(json_array(b.to_json() for b in books_db))
+
+    sort = args.get("sort")
+    order = args.get("order", "asc")
+    if sort is not None and sort not in sort_indexes:
+        return jsonify({"error": f"Unknown sort: {sort}"}), 400
+    if order not in ("asc", "desc") or (order == "desc" and sort is None):
+        return jsonify({"error": "order must be asc or desc, with sort"}), 400
+
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+        if sort is None:
+            cursor = int(args["cursor"]) if args.get("cursor") else None
+        else:
+            key_type = str if sort == "title" else int
+            cursor = decode_cursor(args["cursor"], key_type) if args.get("cursor") else None
+        filters = parse_filters(args)
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid query"}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+
+    fields = None
+    if args.get("fields"):
+        fields = [f.strip() for f in args["fields"].split(",") if f.strip()]
+        unknown = [f for f in fields if f not in BOOK_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Unknown field: {unknown[0]}"}), 400
+
+    # Unsorted, the most selective filter's index supplies the candidate ids
+    # and the rest are checked per book, so a page costs O(log n + candidates
+    # read). Sorted, the order index is walked from the cursor position and
+    # every filter is checked per book; the 20 soonest due is a 20-book walk.
+    if sort is None:
+        index = field_index if filters else None
+    else:
+        index = sort_index = sort_indexes[sort]
+    with books_db.locked(index):
+        if sort is None:
+            ids = field_index.ids(cursor, **filters)
+            page, next_cursor = books_db.page(cursor, limit, book_filter(filters), ids)
+        else:
+            ids = sort_index.ids(cursor, reverse=order == "desc")
+            page, last_id = books_db.page(None, limit, book_filter(filters), ids)
+            next_cursor = None
+            if last_id is not None:
+                next_cursor = encode_cursor(sort_index.position(page[-1]))
+    # A page is a window over an ordering, so it only changes when a book on
+    # it changes, a book joins the filtered set or (for loan filters and the
+    # due-date order) some loan changes.
+    depends_on(author_tag(filters["author"]) if "author" in filters else BOOKS,
+               *(book_tag(b.id) for b in page))
+    if "is_issued" in filters or sort == "dueDate":
+        depends_on(LOANS)
+    if fields:
+        rows = [b.to_dict() for b in page]
+        return jsonify({"books": [{f: row[f] for f in fields} for row in rows],
+                        "nextCursor": next_cursor})
+    return json_response(b'{"books":' + json_array(b.to_json() for b in page)
+                         + b',"nextCursor":' + dumps(next_cursor) + b"}")
+
+
+@app.route("/api/search", methods=["GET"])
+def search_books():
+    return conditional(books_db.version, "", run_search, request.full_path)
+
+
+def run_search():
+    query = request.args.get("q", "")
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+        offset = int(request.args.get("offset", 0))
+    except ValueError:
+        return jsonify({"error": "Invalid query"}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE or offset < 0:
+        return jsonify({"error": "Invalid query"}), 400
+
+    # Only matching needs the lock; ranking a broad multi-term query reads
+    # the index without it so it does not hold up other requests.
+    with books_db.locked(search_index):
+        rank = search_index.match(query, offset, limit)
+    ids, total = rank()
+    books = [book for book in map(books_db.get, ids) if book is not None]
+    next_offset = offset + limit if offset + limit < total else None
+    depends_on(BOOKS, *(book_tag(b.id) for b in books))
+    return json_response(b'{"books":' + json_array(b.to_json() for b in books)
+                         + b',"total":' + dumps(total)
+                         + b',"nextOffset":' + dumps(next_offset) + b"}")
+
+
+@app.route("/api/changes", methods=["GET"])
+def get_changes():
+    # Books added, changed or deleted since catalogue version `since`. When
+    # the change log no longer reaches back that far (or `store` names a
+    # different catalogue) the client is told to resync in full.
+    try:
+        since = int(request.args["since"])
+    except (KeyError, ValueError):
+        return jsonify({"error": "since must be a catalogue version"}), 400
+
+    with books_db.lock:
+        version = books_db.version
+        ids = None
+        if request.args.get("store", store.store_id) == store.store_id:
+            ids = changelog.changed_since(since)
+        if ids is not None:
+            books, deleted = split_changes(books_db, ids)
+
+    if ids is None:
+        return jsonify({"storeId": store.store_id, "version": version, "resync": True})
+    return json_response(b'{"storeId":' + dumps(store.store_id)
+                         + b',"version":' + dumps(version)
+                         + b',"resync":false,"books":' + json_array(b.to_json() for b in books)
+                         + b',"deleted":' + dumps(deleted) + b"}")
+
+
+@app.route("/api/events", methods=["GET"])
+def stream_events():
+    # Server-Sent Events: a "change" event (with fresh stats) for every
+    # catalogue change and a "stats" event when idle. Event ids are catalogue
+    # versions, so a reconnecting EventSource resumes via Last-Event-ID.
+    # Every open stream holds a worker thread under the threaded servers;
+    # serve many idle clients from gevent workers or the ASGI app instead.
+    cursor = event_cursor(request.headers, request.args)
+    response = Response(stream_with_context(events.stream(cursor)), mimetype="text/event-stream")
+    response.headers.extend(EVENT_HEADERS)
+    response.headers["X-Store-Id"] = store.store_id
+    return response
+
+
+def event_cursor(headers, args) -> Optional[int]:
+    # Version to resume the event stream from. A client holding another
+    # store's versions gets -1, which the broadcaster answers with a resync.
+    if args.get("store", store.store_id) != store.store_id:
+        return -1
+    try:
+        return int(headers["Last-Event-ID"])
+    except (KeyError, ValueError):
+        return None
 
 
 @app.route("/api/stats", methods=["GET"])
 def get_stats():
-    total = len(books_db)
-    issued = len([b for b in books_db if b.is_issued])
-    available = len([b for b in books_db if not b.is_issued])
+    # Overdue counts change with the clock as well as with the version.
+    version = books_db.version
+    stats = books_db.stats()
+
+    def build():
+        # Read again so a cached body is never older than the cache token.
+        depends_on(CATALOGUE)
+        return jsonify(books_db.stats())
+
+    return conditional(version, f"-o{stats['overdue']}", build,
+                       f"{request.full_path}|o{stats['overdue']}")
+
+
+@app.route("/api/overdue", methods=["GET"])
+def get_overdue():
+    # Overdue books, most overdue first, with the fine each would pay if
+    # returned today. Fines change at midnight, hence the date in the tag.
     now = datetime.now()
-    overdue = len([b for b in books_db
-                   if b.is_issued and b.due_date is not None and now > b.due_date])
-    return jsonify({
-        "total": total,
-        "issued": issued,
-        "available": available,
-        "overdue": overdue,
-    })
+    version = books_db.version
+    stats = books_db.stats(now)
+    state = f"o{stats['overdue']}-d{now.date().isoformat()}"
+    return conditional(version, f"-{state}", lambda: list_overdue(now),
+                       f"{request.full_path}|{state}")
+
+
+def list_overdue(now: datetime):
+    try:
+        offset = int(request.args.get("offset", 0))
+        limit = int(request.args.get("limit", MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "Invalid query"}), 400
+    if offset < 0 or not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+
+    books, total, days = books_db.overdue(now, offset, limit)
+    depends_on(LOANS, BOOKS)
+    rows = []
+    for book in books:
+        fine, days_overdue = compute_fine(book.due_date, now)
+        rows.append(book.to_json()[:-1]
+                    + b',"daysOverdue":%d,"fine":%d}' % (days_overdue, fine))
+    next_offset = offset + limit if offset + limit < total else None
+    return json_response(b'{"books":' + json_array(rows)
+                         + b',"total":' + dumps(total)
+                         + b',"totalFine":' + dumps(days * FINE_PER_DAY)
+                         + b',"nextOffset":' + dumps(next_offset) + b"}")
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    now = datetime.now()
+    stats = books_db.stats(now)
+    _, _, overdue_days = books_db.overdue(now, limit=0)
+    lines = request_metrics.render()
+    lines += gauges("library", [
+        ("books", "Books in the catalogue.", stats["total"]),
+        ("books_issued", "Books currently issued.", stats["issued"]),
+        ("books_overdue", "Issued books past their due date.", stats["overdue"]),
+        ("outstanding_fines", "Fines owed on overdue books if returned today.",
+         overdue_days * FINE_PER_DAY),
+        ("catalogue_version", "Catalogue change counter.", books_db.version),
+        ("event_clients", "Open /api/events streams.", events.clients),
+    ])
+    cache = response_cache.stats()
+    lines += gauges("library", [
+        ("response_cache_entries", "Responses held in the cache.", cache["entries"]),
+        ("response_cache_bytes", "Approximate size of the cached responses.", cache["bytes"]),
+    ])
+    lines += counters("library", [
+        ("response_cache_hits_total", "Responses served from the cache.", cache["hits"]),
+        ("response_cache_misses_total", "Cacheable responses that had to be built.",
+         cache["misses"]),
+        ("response_cache_evictions_total", "Entries evicted to stay under the size cap.",
+         cache["evictions"]),
+        ("response_cache_invalidations_total", "Entries dropped by catalogue changes.",
+         cache["invalidations"]),
+    ])
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+def admin_only(handler):
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({"error": "Not found"}), 404
+        if request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+            return jsonify({"error": "Forbidden"}), 403
+        return handler(*args, **kwargs)
+    return wrapper
+
+
+@app.route("/api/admin/profile", methods=["POST"])
+@admin_only
+def start_profile():
+    global profiler
+    data = request.get_json(silent=True) or {}
+    try:
+        hz = int(data.get("hz", PROFILE_HZ))
+        seconds = float(data.get("seconds", 30))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid data"}), 400
+    if not 1 <= hz <= 1000 or not 0 < seconds <= MAX_PROFILE_SECONDS:
+        return jsonify({"error": f"hz must be 1-1000 and seconds 0-{MAX_PROFILE_SECONDS}"}), 400
+    if profiler.running:
+        return jsonify({"error": "Profiler already running"}), 409
+    profiler = SamplingProfiler(hz)
+    profiler.start(seconds)
+    return jsonify(profiler.summary())
+
+
+@app.route("/api/admin/profile", methods=["DELETE"])
+@admin_only
+def stop_profile():
+    profiler.stop()
+    return jsonify(profiler.summary())
+
+
+@app.route("/api/admin/profile", methods=["GET"])
+@admin_only
+def get_profile():
+    # ?format=collapsed (default) or speedscope; ?summary=1 for the counters.
+    try:
+        summary = parse_bool(request.args.get("summary", "false"))
+    except ValueError:
+        return jsonify({"error": "summary must be true or false"}), 400
+    if summary:
+        return jsonify(profiler.summary())
+    if request.args.get("format") == "speedscope":
+        response = json_response(profiler.speedscope(f"library-backend pid {os.getpid()}"))
+        filename = "profile.speedscope.json"
+    else:
+        response = Response(profiler.collapsed(), mimetype="text/plain")
+        filename = "profile.collapsed.txt"
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+@app.route("/api/admin/cache", methods=["GET"])
+@admin_only
+def get_cache_stats():
+    return jsonify(response_cache.stats())
+
+
+@app.route("/api/admin/cache", methods=["DELETE"])
+@admin_only
+def clear_cache():
+    response_cache.clear()
+    return jsonify(response_cache.stats())
+
+
+def month_range(args) -> Tuple[Optional[str], Optional[str]]:
+    # ?from=YYYY-MM&to=YYYY-MM, both optional and inclusive.
+    months = []
+    for name in ("from", "to"):
+        value = args.get(name)
+        months.append(datetime.strptime(value, "%Y-%m").strftime("%Y-%m") if value else None)
+    return months[0], months[1]
+
+
+@app.route("/api/circulation/fines", methods=["GET"])
+def circulation_fines():
+    try:
+        start, end = month_range(request.args)
+    except ValueError:
+        return jsonify({"error": "from and to must be YYYY-MM"}), 400
+    months = circulation.fines_by_month(start, end)
+    return jsonify({"months": months, "total": sum(m["total"] for m in months)})
+
+
+@app.route("/api/circulation/loans", methods=["GET"])
+def circulation_loans():
+    try:
+        start, end = month_range(request.args)
+    except ValueError:
+        return jsonify({"error": "from and to must be YYYY-MM"}), 400
+    return jsonify(circulation.loans(start, end))
+
+
+@app.route("/api/circulation/top", methods=["GET"])
+def circulation_top():
+    # Most borrowed books; deleted books are listed with a null title.
+    try:
+        start, end = month_range(request.args)
+        limit = int(request.args.get("limit", 10))
+    except ValueError:
+        return jsonify({"error": "Invalid query"}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+    rows = []
+    for book_id, borrows in circulation.most_borrowed(limit, start, end):
+        book = books_db.get(book_id)
+        rows.append({"id": book_id, "borrows": borrows,
+                     "title": book.title if book else None,
+                     "author": book.author if book else None})
+    return jsonify({"books": rows})
 
 
 @app.route("/api/books", methods=["POST"])
+@mutation
 def add_book():
     data = request.get_json(force=True)
     try:
-        book_id = int(data.get("id"))
-        title = str(data.get("title", "")).strip()
-        author = str(data.get("author", "")).strip()
-        year = int(data.get("year"))
+        book_id = int64(data.get("id"))
+        title = utf8(data.get("title", ""))
+        author = utf8(data.get("author", ""))
+        year = int64(data.get("year"))
     except Exception:
         return jsonify({"error": "Invalid data"}), 400
 
     if not title or not author:
         return jsonify({"error": "Title and author are required"}), 400
 
-    if any(b.id == book_id for b in books_db):
+    new_book = Book(book_id, title, author, year)
+    if not books_db.add(new_book):
         return jsonify({"error": "Book ID already exists"}), 400
 
-    new_book = Book(book_id, title, author, year)
-    books_db.append(new_book)
     return jsonify(new_book.to_dict())
 
 
+@app.route("/api/books/import", methods=["POST"])
+@mutation
+def import_books():
+    # Streams NDJSON (default) or CSV (Content-Type: text/csv) from the request
+    # body; rows are validated and inserted in batches of bulk.BATCH_SIZE.
+    if request.mimetype == "text/csv":
+        rows = bulk.read_csv(request.stream)
+    else:
+        rows = bulk.read_ndjson(request.stream)
+
+    imported = 0
+    errors = []
+    error_count = 0
+    for batch in bulk.batches(rows):
+        books = []
+        lines = []
+        for line_no, row in batch:
+            try:
+                books.append(bulk.parse_book(row))
+                lines.append(line_no)
+            except ValueError as exc:
+                error_count += 1
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    errors.append({"line": line_no, "error": str(exc)})
+        for line_no, added in zip(lines, books_db.add_many(books)):
+            if added:
+                imported += 1
+            else:
+                error_count += 1
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    errors.append({"line": line_no, "error": "Book ID already exists"})
+
+    errors.sort(key=lambda e: e["line"])
+    return jsonify({"imported": imported, "failed": error_count, "errors": errors})
+
+
+@app.route("/api/books/export", methods=["GET"])
+def export_books():
+    if request.args.get("format", "ndjson") == "csv":
+        body, mimetype = bulk.write_csv(books_db), "text/csv"
+    else:
+        body, mimetype = bulk.write_ndjson(books_db), "application/x-ndjson"
+    return Response(stream_with_context(body), mimetype=mimetype)
+
+
 @app.route("/api/books/<int:book_id>/issue", methods=["POST"])
+@mutation
 def issue_book(book_id: int):
-    idx = find_book_index(book_id)
-    if idx == -1:
-        return jsonify({"error": "Book not found"}), 404
-
-    book = books_db[idx]
-    if book.is_issued:
-        return jsonify({"error": "Book already issued"}), 400
+    try:
+        book = books_db.issue(book_id, datetime.now() + timedelta(days=ISSUE_DAYS))
+    except BookNotFound as exc:
+        return jsonify({"error": str(exc)}), 404
+    except BookStateError as exc:
+        return jsonify({"error": str(exc)}), 400
 
-    book.is_issued = True
-    book.due_date = datetime.now() + timedelta(days=ISSUE_DAYS)
     return jsonify(book.to_dict())
 
 
 @app.route("/api/books/<int:book_id>/return", methods=["POST"])
+@mutation
 def return_book(book_id: int):
-    idx = find_book_index(book_id)
-    if idx == -1:
-        return jsonify({"error": "Book not found"}), 404
+    try:
+        book, due_date = books_db.return_book(book_id)
+    except BookNotFound as exc:
+        return jsonify({"error": str(exc)}), 404
+    except BookStateError as exc:
+        return jsonify({"error": str(exc)}), 400
 
-    book = books_db[idx]
-    if not book.is_issued:
-        return jsonify({"error": "Book is not issued"}), 400
+    fine, days_overdue = compute_fine(due_date, datetime.now())
+    return jsonify({
+        "book": book.to_dict(),
+        "fine": fine,
+        "daysOverdue": days_overdue,
+    })
+
+
+def batch_ids():
+    data = request.get_json(force=True, silent=True)
+    ids = data.get("ids") if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not 1 <= len(ids) <= MAX_BATCH_SIZE:
+        raise ValueError(f"ids must be a list of 1 to {MAX_BATCH_SIZE} book ids")
+    # int64() alone would take true and 1.9 as ids 1 and 1.
+    if any(isinstance(book_id, bool) or not isinstance(book_id, (int, str))
+           for book_id in ids):
+        raise ValueError("Invalid data")
+    try:
+        return [int64(book_id) for book_id in ids]
+    except ValueError:
+        raise ValueError("Invalid data")
 
-    today = datetime.now()
-    fine = 0
-    days_overdue = 0
 
-    if book.due_date and today > book.due_date:
-        days_overdue = (today.date() - book.due_date.date()).days
-        fine = days_overdue * FINE_PER_DAY
+@app.route("/api/books/issue", methods=["POST"])
+@mutation
+def issue_books():
+    # Issues every id in {"ids": [...]} in one request, one durable commit and
+    # one stats computation; failures are reported per item.
+    try:
+        ids = batch_ids()
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    due_date = datetime.now() + timedelta(days=ISSUE_DAYS)
+    results = []
+    issued = 0
+    for book_id in ids:
+        try:
+            book = books_db.issue(book_id, due_date)
+        except (BookNotFound, BookStateError) as exc:
+            results.append({"id": book_id, "error": str(exc)})
+            continue
+        issued += 1
+        results.append({"id": book_id, "book": book.to_dict()})
+
+    return jsonify({
+        "results": results,
+        "issued": issued,
+        "failed": len(ids) - issued,
+        "stats": books_db.stats(),
+    })
 
-    # Update book state
-    book.is_issued = False
-    book.due_date = None
+
+@app.route("/api/books/return", methods=["POST"])
+@mutation
+def return_books():
+    try:
+        ids = batch_ids()
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    today = datetime.now()
+    results = []
+    returned = 0
+    total_fine = 0
+    for book_id in ids:
+        try:
+            book, due_date = books_db.return_book(book_id)
+        except (BookNotFound, BookStateError) as exc:
+            results.append({"id": book_id, "error": str(exc)})
+            continue
+        fine, days_overdue = compute_fine(due_date, today)
+        returned += 1
+        total_fine += fine
+        results.append({
+            "id": book_id,
+            "book": book.to_dict(),
+            "fine": fine,
+            "daysOverdue": days_overdue,
+        })
 
     return jsonify({
-        "book": book.to_dict(),
-        "fine": fine,
-        "daysOverdue": days_overdue,
+        "results": results,
+        "returned": returned,
+        "failed": len(ids) - returned,
+        "totalFine": total_fine,
+        "stats": books_db.stats(),
     })
 
 
 @app.route("/api/books/<int:book_id>", methods=["DELETE"])
+@mutation
 def delete_book(book_id: int):
-    idx = find_book_index(book_id)
-    if idx == -1:
+    if books_db.remove(book_id) is None:
         return jsonify({"error": "Book not found"}), 404
-    del books_db[idx]
     return jsonify({"detail": "Book deleted"})
 
 
 # -------------------- HTML + JS FRONTEND --------------------
 
-HTML = """<!DOCTYPE html>
-<html lang="en">
-<head>
-  <meta charset="UTF-8" />
-  <title>LibraryHub - Python Library Management</title>
-  <meta name="viewport" content="width=device-width, initial-scale=1.0" />
-  <!-- Tailwind CDN -->
-  <script src="https://cdn.tailwindcss.com"></script>
-  <style>
-    @keyframes blob {
-      0%, 100% { transform: translate(0, 0) scale(1); }
-      33% { transform: translate(30px, -50px) scale(1.1); }
-      66% { transform: translate(-20px, 20px) scale(0.9); }
-    }
-    @keyframes fadeIn {
-      from { opacity: 0; transform: translateY(10px); }
-      to { opacity: 1; transform: translateY(0); }
-    }
-    @keyframes slideIn {
-      from { transform: translateX(400px); opacity: 0; }
-      to { transform: translateX(0); opacity: 1; }
-    }
-    .animate-blob { animation: blob 7s infinite; }
-    .animation-delay-2000 { animation-delay: 2s; }
-    .animation-delay-4000 { animation-delay: 4s; }
-    .animate-fadeIn { animation: fadeIn 0.4s ease-out; }
-    .animate-slideIn { animation: slideIn 0.4s ease-out; }
-    .scrollbar-hide::-webkit-scrollbar { display: none; }
-  </style>
-</head>
-<body class="min-h-screen bg-gradient-to-br from-slate-900 via-slate-800 to-slate-900">
-  <!-- Animated Background -->
-  <div class="fixed inset-0 overflow-hidden pointer-events-none">
-    <div class="absolute top-20 right-10 w-96 h-96 bg-gradient-to-br from-cyan-500 to-blue-600 rounded-full mix-blend-multiply filter blur-3xl opacity-10 animate-blob"></div>
-    <div class="absolute bottom-20 left-10 w-96 h-96 bg-gradient-to-br from-purple-500 to-pink-500 rounded-full mix-blend-multiply filter blur-3xl opacity-10 animate-blob animation-delay-2000"></div>
-    <div class="absolute top-1/2 left-1/2 w-96 h-96 bg-gradient-to-br from-blue-500 to-cyan-500 rounded-full mix-blend-multiply filter blur-3xl opacity-10 animate-blob animation-delay-4000"></div>
-  </div>
-
-  <!-- Notification -->
-  <div id="notification"
-       class="hidden fixed top-6 right-6 px-6 py-4 rounded-xl shadow-2xl flex items-center gap-3 animate-slideIn z-50">
-    <span id="notification-icon" class="text-xl">ℹ️</span>
-    <span id="notification-text" class="text-sm font-medium"></span>
-  </div>
-
-  <!-- Modal -->
-  <div id="modal-backdrop"
-       class="hidden fixed inset-0 bg-black/70 flex items-center justify-center p-4 z-40 backdrop-blur-sm">
-    <div class="bg-gradient-to-br from-slate-800 to-slate-900 rounded-2xl shadow-2xl max-w-md w-full overflow-hidden border border-slate-700/50 animate-fadeIn"
-         id="modal-card">
-      <div class="bg-gradient-to-r from-cyan-500 via-blue-600 to-purple-600 p-6 text-white">
-        <h2 id="modal-title" class="text-2xl font-bold">Book Title</h2>
-        <p id="modal-author" class="text-sm opacity-90 mt-2">Author</p>
-      </div>
-      <div class="p-6 space-y-4">
-        <div class="grid grid-cols-2 gap-4">
-          <div class="bg-gradient-to-br from-slate-700/50 to-slate-800/50 p-4 rounded-xl border border-slate-600/50">
-            <p class="text-slate-400 text-xs font-semibold mb-1">ID</p>
-            <p id="modal-id" class="font-bold text-lg text-cyan-400"></p>
-          </div>
-          <div class="bg-gradient-to-br from-slate-700/50 to-slate-800/50 p-4 rounded-xl border border-slate-600/50">
-            <p class="text-slate-400 text-xs font-semibold mb-1">Year</p>
-            <p id="modal-year" class="font-bold text-lg text-blue-400"></p>
-          </div>
-        </div>
-        <div id="modal-status-box" class="p-4 rounded-xl border-2 bg-slate-800 border-slate-600">
-          <p id="modal-status-text" class="font-bold text-lg text-slate-200">Status</p>
-          <p id="modal-due" class="text-sm text-slate-300 mt-2"></p>
-        </div>
-        <div class="flex flex-col gap-3 pt-2">
-          <button id="modal-issue-btn"
-                  class="hidden w-full bg-gradient-to-r from-emerald-500 to-green-600 hover:from-emerald-600 hover:to-green-700 text-white font-bold py-3 rounded-xl transition-all duration-300 transform hover:scale-105 shadow-lg">
-            📤 Issue Book
-          </button>
-          <button id="modal-return-btn"
-                  class="hidden w-full bg-gradient-to-r from-amber-500 to-orange-600 hover:from-amber-600 hover:to-orange-700 text-white font-bold py-3 rounded-xl transition-all duration-300 transform hover:scale-105 shadow-lg">
-            📥 Return Book
-          </button>
-          <button id="modal-delete-btn"
-                  class="w-full bg-gradient-to-r from-red-500 to-pink-600 hover:from-red-600 hover:to-pink-700 text-white font-bold py-3 rounded-xl transition-all duration-300 transform hover:scale-105 shadow-lg">
-            🗑️ Delete
-          </button>
-          <button id="modal-close-btn"
-                  class="w-full bg-slate-700 hover:bg-slate-600 text-white font-bold py-3 rounded-xl transition-all duration-300 border border-slate-600">
-            Close
-          </button>
-        </div>
-      </div>
-    </div>
-  </div>
-
-  <div class="relative z-10">
-    <!-- Header -->
-    <header class="backdrop-blur-md bg-gradient-to-r from-slate-900/95 via-slate-800/95 to-slate-900/95 border-b border-cyan-500/20 sticky top-0 z-30 shadow-2xl">
-      <div class="max-w-7xl mx-auto px-6 py-6 flex justify-between items-center">
-        <div class="flex items-center gap-4">
-          <div class="p-3 bg-gradient-to-br from-cyan-500 to-blue-600 rounded-xl shadow-lg">
-            <svg xmlns="http://www.w3.org/2000/svg" class="w-8 h-8 text-white" fill="none" viewBox="0 0 24 24" stroke="currentColor">
-              <path stroke-linecap="round" stroke-linejoin="round" stroke-width="1.5"
-                    d="M4.5 5.25h15m-15 3.75h15m-15 3.75h15m-15 3.75h15" />
-            </svg>
-          </div>
-          <div>
-            <h1 class="text-4xl font-black text-transparent bg-clip-text bg-gradient-to-r from-cyan-400 to-blue-500">
-              LibraryHub
-            </h1>
-            <p class="text-xs text-slate-400">Modern Library Management • Python Backend</p>
-          </div>
-        </div>
-      </div>
-      <!-- Stats -->
-      <div class="border-t border-slate-700/50 px-6 py-3 flex gap-6 overflow-x-auto scrollbar-hide max-w-7xl mx-auto">
-        <div class="flex items-center gap-3 bg-gradient-to-r from-emerald-500/20 to-emerald-500/10 px-4 py-2 rounded-lg border border-emerald-500/30 whitespace-nowrap">
-          <span class="text-emerald-400 text-lg">✅</span>
-          <span class="text-sm text-slate-200">
-            <span id="available-count" class="font-bold text-emerald-400">0</span> Available
-          </span>
-        </div>
-        <div class="flex items-center gap-3 bg-gradient-to-r from-blue-500/20 to-blue-500/10 px-4 py-2 rounded-lg border border-blue-500/30 whitespace-nowrap">
-          <span class="text-blue-400 text-lg">📕</span>
-          <span class="text-sm text-slate-200">
-            <span id="issued-count" class="font-bold text-blue-400">0</span> Issued
-          </span>
-        </div>
-        <div class="flex items-center gap-3 bg-gradient-to-r from-red-500/20 to-red-500/10 px-4 py-2 rounded-lg border border-red-500/30 whitespace-nowrap">
-          <span class="text-red-400 text-lg">⚠️</span>
-          <span class="text-sm text-slate-200">
-            <span id="overdue-count" class="font-bold text-red-400">0</span> Overdue
-          </span>
-        </div>
-        <div class="flex items-center gap-3 bg-gradient-to-r from-slate-500/20 to-slate-500/10 px-4 py-2 rounded-lg border border-slate-500/30 whitespace-nowrap">
-          <span class="text-slate-300 text-lg">📚</span>
-          <span class="text-sm text-slate-200">
-            <span id="total-count" class="font-bold text-slate-100">0</span> Total
-          </span>
-        </div>
-      </div>
-    </header>
-
-    <!-- Navigation -->
-    <nav class="backdrop-blur-md bg-slate-800/60 border-b border-slate-700/50 sticky top-[92px] z-20">
-      <div class="max-w-7xl mx-auto px-6 flex gap-3 py-3 overflow-x-auto scrollbar-hide">
-        <button data-view="home"
-                class="nav-btn px-6 py-2 rounded-xl font-bold border bg-gradient-to-r from-cyan-500 to-blue-600 text-white shadow-lg border-cyan-400">
-          📚 All Books
-        </button>
-        <button data-view="search"
-                class="nav-btn px-6 py-2 rounded-xl font-bold border bg-slate-700/70 text-slate-300 border-slate-600 hover:bg-slate-600/80">
-          🔍 Search
-        </button>
-        <button data-view="issued"
-                class="nav-btn px-6 py-2 rounded-xl font-bold border bg-slate-700/70 text-slate-300 border-slate-600 hover:bg-slate-600/80">
-          📤 Issued Books
-        </button>
-        <button data-view="issue"
-                class="nav-btn px-6 py-2 rounded-xl font-bold border bg-slate-700/70 text-slate-300 border-slate-600 hover:bg-slate-600/80">
-          ✅ Quick Issue
-        </button>
-        <button data-view="add"
-                class="nav-btn px-6 py-2 rounded-xl font-bold border bg-slate-700/70 text-slate-300 border-slate-600 hover:bg-slate-600/80">
-          ➕ Add Book
-        </button>
-      </div>
-    </nav>
-
-    <!-- Main Content -->
-    <main class="max-w-7xl mx-auto px-6 py-8 min-h-[calc(100vh-200px)]">
-      <div id="main-content" class="animate-fadeIn text-slate-200">
-        <!-- Filled by JavaScript -->
-      </div>
-    </main>
-  </div>
-
-  <script>
-    // ----------------- FRONTEND STATE -----------------
-    let books = [];
-    let currentView = "home";
-    let selectedBook = null;
-    const issueDays = 7;
-
-    function showNotification(msg, type = "info") {
-      const box = document.getElementById("notification");
-      const text = document.getElementById("notification-text");
-      const icon = document.getElementById("notification-icon");
-
-      const baseClasses = "fixed top-6 right-6 px-6 py-4 rounded-xl shadow-2xl flex items-center gap-3 animate-slideIn z-50";
-      let bg = "bg-blue-500";
-      let iconChar = "ℹ️";
-
-      if (type === "success") { bg = "bg-emerald-500"; iconChar = "✅"; }
-      if (type === "error")   { bg = "bg-red-500";     iconChar = "❌"; }
-      if (type === "warning") { bg = "bg-amber-500";   iconChar = "⚠️"; }
-
-      box.className = baseClasses + " text-white " + bg;
-      text.textContent = msg;
-      icon.textContent = iconChar;
-      box.classList.remove("hidden");
-
-      setTimeout(() => {
-        box.classList.add("hidden");
-      }, 3000);
-    }
-
-    // --------------- STATUS UTILS ----------------------
-    function getBookStatus(book) {
-      if (!book.isIssued) {
-        return {
-          text: "Available",
-          icon: "📗",
-          color: "text-emerald-600",
-          bg: "bg-emerald-100",
-          border: "border-emerald-300"
-        };
-      }
-      const today = new Date();
-      const due = book.dueDate ? new Date(book.dueDate) : null;
-      if (due && today > due) {
-        return {
-          text: "Overdue",
-          icon: "⚠️",
-          color: "text-red-600",
-          bg: "bg-red-100",
-          border: "border-red-300"
-        };
-      }
-      return {
-        text: "Issued",
-        icon: "📕",
-        color: "text-blue-600",
-        bg: "bg-blue-100",
-        border: "border-blue-300"
-      };
-    }
-
-    function updateStatsBar() {
-      fetch("/api/stats")
-        .then(r => r.json())
-        .then(stats => {
-          document.getElementById("total-count").textContent = stats.total;
-          document.getElementById("issued-count").textContent = stats.issued;
-          document.getElementById("available-count").textContent = stats.available;
-          document.getElementById("overdue-count").textContent = stats.overdue;
-        })
-        .catch(() => {});
-    }
-
-    // --------------- API CALLS -------------------------
-    function loadBooks() {
-      return fetch("/api/books")
-        .then(r => r.json())
-        .then(data => {
-          books = data;
-        });
-    }
-
-    function apiIssueBook(id) {
-      return fetch(`/api/books/${id}/issue`, { method: "POST" })
-        .then(r => r.json());
-    }
-
-    function apiReturnBook(id) {
-      return fetch(`/api/books/${id}/return`, { method: "POST" })
-        .then(r => r.json());
-    }
-
-    function apiDeleteBook(id) {
-      return fetch(`/api/books/${id}`, { method: "DELETE" })
-        .then(r => r.json());
-    }
-
-    function apiAddBook(payload) {
-      return fetch("/api/books", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(payload)
-      }).then(r => r.json());
-    }
-
-    // --------------- RENDER FUNCTIONS ------------------
-    function render() {
-      const container = document.getElementById("main-content");
-      if (currentView === "home") {
-        renderHome(container);
-      } else if (currentView === "search") {
-        renderSearch(container);
-      } else if (currentView === "issued") {
-        renderIssued(container);
-      } else if (currentView === "issue") {
-        renderIssue(container);
-      } else if (currentView === "add") {
-        renderAdd(container);
-      }
-    }
-
-    function renderHome(container) {
-      let html = `
-        <div class="mb-8">
-          <h2 class="text-3xl font-bold text-white mb-1">All Books</h2>
-          <p class="text-slate-400 text-sm">Click a book card to view details, issue, return, or delete.</p>
-        </div>
-        <div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6">
-      `;
-
-      if (books.length === 0) {
-        html += `
-          <div class="col-span-full text-center py-16">
-            <p class="text-slate-400 text-xl">No books in the library.</p>
-          </div>`;
-      } else {
-        books.forEach(book => {
-          const status = getBookStatus(book);
-          const duePart = book.dueDate
-            ? `<span class="text-amber-400 font-bold text-xs">📌 ${new Date(book.dueDate).toLocaleDateString()}</span>`
-            : "";
-          html += `
-            <div class="group backdrop-blur-xl bg-gradient-to-br from-slate-800/80 to-slate-900/80 rounded-2xl shadow-2xl overflow-hidden cursor-pointer transition-all duration-500 hover:scale-110 hover:shadow-2xl border border-slate-700/50 hover:border-cyan-400/50 h-72 hover:-translate-y-4"
-                 data-book-id="${book.id}">
-              <div class="h-32 bg-gradient-to-br from-cyan-500 via-blue-600 to-purple-600 relative overflow-hidden group-hover:via-cyan-600 transition-all duration-300">
-                <div class="absolute inset-0 opacity-0 group-hover:opacity-20 transition-opacity duration-300 bg-white"></div>
-                <div class="p-5 text-white h-full flex flex-col justify-between">
-                  <div>
-                    <span class="text-3xl">${status.icon}</span>
-                    <p class="text-xs font-semibold opacity-90 mt-1">ID: ${book.id}</p>
-                  </div>
-                  <span class="text-xs font-bold px-3 py-1.5 rounded-lg ${status.bg} ${status.color} w-fit border ${status.border}">
-                    ${status.text}
-                  </span>
-                </div>
-              </div>
-              <div class="p-5 flex flex-col justify-between flex-1 h-40">
-                <div>
-                  <h3 class="font-bold text-base text-white line-clamp-2 mb-2">${book.title}</h3>
-                  <p class="text-slate-400 text-xs mb-3 line-clamp-1">${book.author}</p>
-                </div>
-                <div class="flex justify-between items-center text-xs text-slate-400 border-t border-slate-700 pt-3">
-                  <span>📅 ${book.year}</span>
-                  ${duePart}
-                </div>
-              </div>
-            </div>
-          `;
-        });
-      }
-
-      html += "</div>";
-      container.innerHTML = html;
-
-      document.querySelectorAll("[data-book-id]").forEach(card => {
-        card.addEventListener("click", () => {
-          const id = parseInt(card.getAttribute("data-book-id"));
-          const book = books.find(b => b.id === id);
-          if (book) openModal(book);
-        });
-      });
-    }
-
-    function renderSearch(container) {
-      let html = `
-        <h2 class="text-3xl font-bold text-white mb-6">Search Books</h2>
-        <div class="mb-8">
-          <input id="search-input" type="text"
-                 placeholder="🔍 Search by ID, title, or author..."
-                 class="w-full px-6 py-4 rounded-2xl shadow-lg focus:outline-none focus:ring-2 focus:ring-cyan-500 bg-slate-800/80 text-white placeholder-slate-500 border border-slate-700 transition-all duration-300 text-base" />
-        </div>
-        <div id="search-results" class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6"></div>
-      `;
-      container.innerHTML = html;
-
-      const input = document.getElementById("search-input");
-      const results = document.getElementById("search-results");
-
-      function renderResults(term) {
-        const t = term.toLowerCase();
-        const filtered = books.filter(b =>
-          b.id.toString().includes(t) ||
-          b.title.toLowerCase().includes(t) ||
-          b.author.toLowerCase().includes(t)
-        );
-
-        if (filtered.length === 0) {
-          results.innerHTML = `
-            <div class="col-span-full text-center py-16">
-              <p class="text-slate-400 text-xl">No books found.</p>
-            </div>`;
-          return;
-        }
-
-        let htmlCards = "";
-        filtered.forEach(book => {
-          const status = getBookStatus(book);
-          htmlCards += `
-            <div class="group backdrop-blur-xl bg-gradient-to-br from-slate-800/80 to-slate-900/80 rounded-2xl shadow-lg overflow-hidden cursor-pointer transition-all duration-300 hover:scale-105 hover:shadow-2xl border border-slate-700/50 hover:border-cyan-400/50"
-                 data-book-id="${book.id}">
-              <div class="h-28 ${status.bg} p-5 flex flex-col justify-between">
-                <span class="text-2xl">${status.icon}</span>
-                <span class="text-xs font-bold ${status.color} w-fit">${status.text}</span>
-              </div>
-              <div class="p-4 bg-slate-800/80">
-                <h3 class="font-bold text-white mb-2 line-clamp-2">${book.title}</h3>
-                <p class="text-slate-400 text-sm line-clamp-1">${book.author}</p>
-                <p class="text-slate-500 text-xs mt-2">📅 ${book.year}</p>
-              </div>
-            </div>
-          `;
-        });
-        results.innerHTML = htmlCards;
-
-        document.querySelectorAll("#search-results [data-book-id]").forEach(card => {
-          card.addEventListener("click", () => {
-            const id = parseInt(card.getAttribute("data-book-id"));
-            const book = books.find(b => b.id === id);
-            if (book) openModal(book);
-          });
-        });
-      }
-
-      input.addEventListener("input", () => renderResults(input.value));
-      renderResults("");
-    }
-
-    function renderIssued(container) {
-      const issuedBooks = books.filter(b => b.isIssued);
-      let html = `
-        <h2 class="text-3xl font-bold text-white mb-6">Issued Books</h2>
-        <div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6">
-      `;
-
-      if (issuedBooks.length === 0) {
-        html += `
-          <div class="col-span-full text-center py-16">
-            <p class="text-slate-400 text-xl">No issued books.</p>
-          </div>`;
-      } else {
-        const today = new Date();
-        issuedBooks.forEach(book => {
-          const status = getBookStatus(book);
-          const due = book.dueDate ? new Date(book.dueDate) : null;
-          const daysLeft = due ? Math.ceil((due - today) / (1000 * 60 * 60 * 24)) : 0;
-          const overdue = due && today > due;
-          const badgeText = overdue
-            ? `⚠️ ${Math.abs(daysLeft)} days overdue`
-            : `📅 ${daysLeft} days left`;
-          const badgeClass = overdue
-            ? "bg-red-500/20 text-red-400"
-            : "bg-blue-500/20 text-blue-400";
-
-          html += `
-            <div class="group backdrop-blur-xl bg-gradient-to-br from-slate-800/80 to-slate-900/80 rounded-2xl shadow-lg overflow-hidden cursor-pointer transition-all duration-300 hover:scale-105 hover:shadow-2xl border border-slate-700/50 hover:border-cyan-400/50"
-                 data-book-id="${book.id}">
-              <div class="h-28 ${status.bg} p-5 flex flex-col justify-between">
-                <span class="text-2xl">${status.icon}</span>
-                <span class="text-xs font-bold ${status.color} w-fit">${status.text}</span>
-              </div>
-              <div class="p-4 bg-slate-800/80">
-                <h3 class="font-bold text-white mb-2 line-clamp-2">${book.title}</h3>
-                <p class="text-slate-400 text-sm line-clamp-1">${book.author}</p>
-                <div class="mt-3 p-2 rounded-lg text-xs font-bold ${badgeClass}">
-                  ${badgeText}
-                </div>
-              </div>
-            </div>
-          `;
-        });
-      }
-
-      html += "</div>";
-      container.innerHTML = html;
-
-      document.querySelectorAll("[data-book-id]").forEach(card => {
-        card.addEventListener("click", () => {
-          const id = parseInt(card.getAttribute("data-book-id"));
-          const book = books.find(b => b.id === id);
-          if (book) openModal(book);
-        });
-      });
-    }
-
-    function renderIssue(container) {
-      const availableBooks = books.filter(b => !b.isIssued);
-      let html = `
-        <h2 class="text-3xl font-bold text-white mb-6">Quick Issue</h2>
-        <p class="text-slate-400 mb-6 text-sm">Issue any available book directly from this list.</p>
-        <div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6">
-      `;
-      if (availableBooks.length === 0) {
-        html += `
-          <div class="col-span-full text-center py-16">
-            <p class="text-slate-400 text-xl">All books are currently issued.</p>
-          </div>`;
-      } else {
-        availableBooks.forEach(book => {
-          html += `
-            <div class="backdrop-blur-xl bg-gradient-to-br from-slate-800/80 to-slate-900/80 rounded-2xl shadow-lg overflow-hidden hover:shadow-2xl transition-all duration-300 border border-slate-700/50 hover:border-emerald-400/50">
-              <div class="bg-gradient-to-r from-emerald-500 to-green-600 p-4">
-                <h3 class="text-white font-bold text-lg line-clamp-2">${book.title}</h3>
-              </div>
-              <div class="p-4">
-                <p class="text-slate-400 mb-2 text-sm line-clamp-2">${book.author}</p>
-                <p class="text-slate-500 text-xs mb-4">📅 ${book.year}</p>
-                <button class="issue-btn w-full bg-gradient-to-r from-emerald-500 to-green-600 hover:from-emerald-600 hover:to-green-700 text-white font-bold py-2.5 rounded-lg transition-all duration-300 transform hover:scale-105 shadow-lg"
-                        data-book-id="${book.id}">
-                  📤 Issue Book
-                </button>
-              </div>
-            </div>
-          `;
-        });
-      }
-      html += "</div>";
-      container.innerHTML = html;
-
-      document.querySelectorAll(".issue-btn").forEach(btn => {
-        btn.addEventListener("click", () => {
-          const id = parseInt(btn.getAttribute("data-book-id"));
-          handleIssueBook(id);
-        });
-      });
-    }
-
-    function renderAdd(container) {
-      const html = `
-        <div class="max-w-xl mx-auto backdrop-blur-xl bg-gradient-to-br from-slate-800/90 to-slate-900/90 rounded-2xl shadow-2xl p-8 border border-slate-700/60">
-          <h2 class="text-3xl font-bold text-white mb-2">➕ Add New Book</h2>
-          <p class="text-slate-400 mb-6 text-sm">Fill the form to expand your library collection.</p>
-          <div class="space-y-4">
-            <div>
-              <label class="block text-white font-semibold mb-1 text-sm">Book ID</label>
-              <input id="add-id" type="number" class="w-full px-4 py-2 border-2 border-slate-600 rounded-xl focus:outline-none focus:border-cyan-500 focus:ring-2 focus:ring-cyan-500/20 bg-slate-700/50 text-white placeholder-slate-500" placeholder="101" />
-            </div>
-            <div>
-              <label class="block text-white font-semibold mb-1 text-sm">Title</label>
-              <input id="add-title" type="text" class="w-full px-4 py-2 border-2 border-slate-600 rounded-xl focus:outline-none focus:border-cyan-500 focus:ring-2 focus:ring-cyan-500/20 bg-slate-700/50 text-white placeholder-slate-500" placeholder="Enter book title" />
-            </div>
-            <div>
-              <label class="block text-white font-semibold mb-1 text-sm">Author</label>
-              <input id="add-author" type="text" class="w-full px-4 py-2 border-2 border-slate-600 rounded-xl focus:outline-none focus:border-cyan-500 focus:ring-2 focus:ring-cyan-500/20 bg-slate-700/50 text-white placeholder-slate-500" placeholder="Enter author name" />
-            </div>
-            <div>
-              <label class="block text-white font-semibold mb-1 text-sm">Year</label>
-              <input id="add-year" type="number" class="w-full px-4 py-2 border-2 border-slate-600 rounded-xl focus:outline-none focus:border-cyan-500 focus:ring-2 focus:ring-cyan-500/20 bg-slate-700/50 text-white placeholder-slate-500" placeholder="2024" />
-            </div>
-          </div>
-          <div class="flex gap-4 pt-6">
-            <button id="add-submit"
-                    class="flex-1 bg-gradient-to-r from-cyan-500 to-blue-600 hover:from-cyan-600 hover:to-blue-700 text-white font-bold py-3 rounded-xl hover:shadow-lg transition-all duration-300 transform hover:scale-105">
-              ✅ Add Book
-            </button>
-            <button id="add-cancel"
-                    class="flex-1 bg-slate-700 hover:bg-slate-600 text-white font-bold py-3 rounded-xl transition-all duration-300 border border-slate-600">
-              Cancel
-            </button>
-          </div>
-        </div>
-      `;
-      container.innerHTML = html;
-
-      document.getElementById("add-submit").addEventListener("click", () => {
-        const idVal = document.getElementById("add-id").value.trim();
-        const titleVal = document.getElementById("add-title").value.trim();
-        const authorVal = document.getElementById("add-author").value.trim();
-        const yearVal = document.getElementById("add-year").value.trim();
-
-        if (!idVal || !titleVal || !authorVal || !yearVal) {
-          showNotification("Please fill all fields", "error");
-          return;
-        }
-
-        apiAddBook({
-          id: parseInt(idVal),
-          title: titleVal,
-          author: authorVal,
-          year: parseInt(yearVal)
-        }).then(res => {
-          if (res.error) {
-            showNotification(res.error, "error");
-          } else {
-            books.push(res);
-            showNotification("✨ Book added successfully!", "success");
-            switchView("home");
-          }
-          updateStatsBar();
-        }).catch(() => {
-          showNotification("Error adding book", "error");
-        });
-      });
-
-      document.getElementById("add-cancel").addEventListener("click", () => {
-        switchView("home");
-      });
-    }
-
-    // --------------- MODAL HANDLING --------------------
-    function openModal(book) {
-      selectedBook = book;
-      document.getElementById("modal-title").textContent = book.title;
-      document.getElementById("modal-author").textContent = book.author;
-      document.getElementById("modal-id").textContent = book.id;
-      document.getElementById("modal-year").textContent = book.year;
-
-      const status = getBookStatus(book);
-      const box = document.getElementById("modal-status-box");
-      const statusText = document.getElementById("modal-status-text");
-      const dueEl = document.getElementById("modal-due");
-
-      box.className = `p-4 rounded-xl border-2 ${status.bg} ${status.border}`;
-      statusText.className = `font-bold text-lg ${status.color}`;
-      statusText.textContent = status.text;
-
-      if (book.dueDate) {
-        dueEl.textContent = "📅 Due: " + new Date(book.dueDate).toLocaleDateString();
-      } else {
-        dueEl.textContent = "";
-      }
-
-      const issueBtn = document.getElementById("modal-issue-btn");
-      const returnBtn = document.getElementById("modal-return-btn");
-
-      if (book.isIssued) {
-        issueBtn.classList.add("hidden");
-        returnBtn.classList.remove("hidden");
-      } else {
-        issueBtn.classList.remove("hidden");
-        returnBtn.classList.add("hidden");
-      }
-
-      document.getElementById("modal-backdrop").classList.remove("hidden");
-    }
-
-    function closeModal() {
-      document.getElementById("modal-backdrop").classList.add("hidden");
-      selectedBook = null;
-    }
-
-    function handleIssueBook(id) {
-      apiIssueBook(id).then(res => {
-        if (res.error) {
-          showNotification(res.error, "error");
-          return;
-        }
-        books = books.map(b => b.id === id ? res : b);
-        showNotification("📤 Book issued!", "success");
-        updateStatsBar();
-        render();
-        if (selectedBook && selectedBook.id === id) {
-          openModal(res);
-        }
-      }).catch(() => {
-        showNotification("Error issuing book", "error");
-      });
-    }
-
-    function handleReturnBook(id) {
-      apiReturnBook(id).then(res => {
-        if (res.error) {
-          showNotification(res.error, "error");
-          return;
-        }
-        const updated = res.book;
-        books = books.map(b => b.id === id ? updated : b);
-        if (res.fine > 0) {
-          showNotification(`⚠️ Overdue! Fine: Rs. ${res.fine} (${res.daysOverdue} days)`, "warning");
-        } else {
-          showNotification("✅ Book returned on time!", "success");
-        }
-        updateStatsBar();
-        render();
-        closeModal();
-      }).catch(() => {
-        showNotification("Error returning book", "error");
-      });
-    }
-
-    function handleDeleteBook(id) {
-      if (!confirm("Are you sure you want to delete this book?")) return;
-      apiDeleteBook(id).then(() => {
-        books = books.filter(b => b.id !== id);
-        showNotification("🗑️ Book deleted", "info");
-        updateStatsBar();
-        render();
-        closeModal();
-      }).catch(() => {
-        showNotification("Error deleting book", "error");
-      });
-    }
-
-    // --------------- NAV + INIT ------------------------
-    function switchView(view) {
-      currentView = view;
-      document.querySelectorAll(".nav-btn").forEach(btn => {
-        const v = btn.getAttribute("data-view");
-        if (v === view) {
-          btn.className = "nav-btn px-6 py-2 rounded-xl font-bold border bg-gradient-to-r from-cyan-500 to-blue-600 text-white shadow-lg border-cyan-400";
-        } else {
-          btn.className = "nav-btn px-6 py-2 rounded-xl font-bold border bg-slate-700/70 text-slate-300 border-slate-600 hover:bg-slate-600/80";
-        }
-      });
-      render();
-    }
-
-    document.addEventListener("DOMContentLoaded", () => {
-      document.querySelectorAll(".nav-btn").forEach(btn => {
-        btn.addEventListener("click", () => {
-          const view = btn.getAttribute("data-view");
-          switchView(view);
-        });
-      });
-
-      document.getElementById("modal-close-btn").addEventListener("click", closeModal);
-      document.getElementById("modal-delete-btn").addEventListener("click", () => {
-        if (selectedBook) handleDeleteBook(selectedBook.id);
-      });
-      document.getElementById("modal-issue-btn").addEventListener("click", () => {
-        if (selectedBook) handleIssueBook(selectedBook.id);
-      });
-      document.getElementById("modal-return-btn").addEventListener("click", () => {
-        if (selectedBook) handleReturnBook(selectedBook.id);
-      });
-
-      document.getElementById("modal-backdrop").addEventListener("click", (e) => {
-        if (e.target.id === "modal-backdrop") closeModal();
-      });
-
-      loadBooks().then(() => {
-        updateStatsBar();
-        render();
-      });
-    });
-  </script>
-</body>
-</html>
-"""
+# The frontend lives in frontend/ and is loaded and precompressed once at
+# startup. Scripts are served under content-hashed names and cached for a
+# year; the page itself is revalidated on every load (a 304 when unchanged)
+# so deploys are picked up immediately.
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend")
+
+assets = {}
+with open(os.path.join(FRONTEND_DIR, "index.html"), "rb") as f:
+    page = f.read()
+for name in ("app.js",):
+    asset = StaticAsset(os.path.join(FRONTEND_DIR, name))
+    assets[hashed_name(name, asset)] = asset
+    page = page.replace(f"/assets/{name}".encode(), f"/assets/{hashed_name(name, asset)}".encode())
+index_page = StaticAsset(os.path.join(FRONTEND_DIR, "index.html"), page)
 
 
 @app.route("/", methods=["GET"])
 def index():
-    return Response(HTML, mimetype="text/html")
+    return index_page.response(request, "no-cache")
+
+
+@app.route("/assets/<name>", methods=["GET"])
+def static_asset(name: str):
+    asset = assets.get(name)
+    if asset is None:
+        return jsonify({"error": "Not found"}), 404
+    return asset.response(request, f"public, max-age={ASSET_MAX_AGE}, immutable")
+
 
 # -------------------- REPLIT → RENDER COMPATIBLE SERVER --------------------
-import os
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 10000))   # Render dynamically assigns PORT
@@ -0,0 +1,126 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels).
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Layout of a per-route row: one counter per bucket plus +Inf, the latency
+# sum, then response counts for status classes 1xx..5xx.
+_SUM = len(BUCKETS) + 1
+_STATUS = _SUM + 1
+_ROW = _STATUS + 5
+# Row index for each status // 100; out-of-range codes count as 1xx/5xx.
+_STATUS_INDEX = tuple(_STATUS + min(max(c, 1), 5) - 1 for c in range(10))
+
+Key = Tuple[str, str]
+
+
+class RequestMetrics:
+    # Per-route latency histograms and response counts.
+    #
+    # Every thread records into its own dict of rows, so record() takes no
+    # lock and touches no shared state: a dict lookup, a bisect and three
+    # list increments, about half a microsecond. render() merges the threads' rows when /metrics is
+    # scraped. Threads that have exited (the threaded dev server starts one
+    # per connection) are folded into a retired total so the set of rows
+    # stays bounded by the number of live threads.
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._threads: List[Tuple[threading.Thread, Dict[Key, List[float]]]] = []
+        self._retired: Dict[Key, List[float]] = {}
+        self._registered = 0
+
+    def record(self, method: str, route: str, seconds: float, status: int):
+        try:
+            rows = self._local.rows
+        except AttributeError:
+            rows = self._register()
+        key = (method, route)
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = [0] * _ROW
+        row[bisect_left(BUCKETS, seconds)] += 1
+        row[_SUM] += seconds
+        row[_STATUS_INDEX[status // 100]] += 1
+
+    def snapshot(self) -> Dict[Key, List[float]]:
+        with self._lock:
+            self._retire()
+            merged = {key: list(row) for key, row in self._retired.items()}
+            for _, rows in self._threads:
+                for key, row in list(rows.items()):
+                    _add(merged.setdefault(key, [0] * _ROW), row)
+        return merged
+
+    def render(self, prefix: str = "library") -> List[str]:
+        lines = [f"# HELP {prefix}_http_request_duration_seconds Time spent in route handlers.",
+                 f"# TYPE {prefix}_http_request_duration_seconds histogram"]
+        responses = []
+        for (method, route), row in sorted(self.snapshot().items()):
+            labels = f'method="{method}",route="{_escape(route)}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), row):
+                cumulative += n
+                lines.append(f'{prefix}_http_request_duration_seconds_bucket'
+                             f'{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{prefix}_http_request_duration_seconds_sum{{{labels}}} {row[_SUM]:.6f}")
+            lines.append(f"{prefix}_http_request_duration_seconds_count{{{labels}}} {cumulative}")
+            for i in range(5):
+                if row[_STATUS + i]:
+                    responses.append(f'{prefix}_http_responses_total'
+                                     f'{{{labels},code="{i + 1}xx"}} {row[_STATUS + i]}')
+        lines.append(f"# HELP {prefix}_http_responses_total Responses by status class.")
+        lines.append(f"# TYPE {prefix}_http_responses_total counter")
+        return lines + responses
+
+    def _register(self) -> Dict[Key, List[float]]:
+        rows: Dict[Key, List[float]] = {}
+        self._local.rows = rows
+        with self._lock:
+            self._threads.append((threading.current_thread(), rows))
+            self._registered += 1
+            if self._registered % 256 == 0:
+                self._retire()
+        return rows
+
+    def _retire(self):
+        # Called with _lock held. A dead thread's rows can no longer change.
+        live = []
+        for thread, rows in self._threads:
+            if thread.is_alive():
+                live.append((thread, rows))
+                continue
+            for key, row in rows.items():
+                _add(self._retired.setdefault(key, [0] * _ROW), row)
+        self._threads = live
+
+
+def gauges(prefix: str, values: Iterable[Tuple[str, str, float]]) -> List[str]:
+    # (name, help, value) -> Prometheus gauge lines.
+    return _series(prefix, "gauge", values)
+
+
+def counters(prefix: str, values: Iterable[Tuple[str, str, float]]) -> List[str]:
+    # (name, help, value) -> Prometheus counter lines; names end in _total.
+    return _series(prefix, "counter", values)
+
+
+def _series(prefix: str, kind: str, values: Iterable[Tuple[str, str, float]]) -> List[str]:
+    lines = []
+    for name, help_text, value in values:
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+        lines.append(f"{prefix}_{name} {value}")
+    return lines
+
+
+def _add(total: List[float], row: List[float]):
+    for i, n in enumerate(row):
+        total[i] += n
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
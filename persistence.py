@@ -0,0 +1,333 @@
+import glob
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import nullcontext
+from typing import List, Optional, Tuple
+
+from catalogue import Catalogue
+from snapshot import MappedSnapshot, write_snapshot
+
+SNAPSHOT_EVERY = 50_000
+SNAPSHOT_INTERVAL = 300.0
+
+log = logging.getLogger(__name__)
+
+
+class WriteAheadLog:
+    # Append-only log of catalogue change records, one JSON object per line,
+    # split into numbered segment files. Appends only buffer the line; a
+    # single flusher thread writes whatever has accumulated and fsyncs it in
+    # one go (group commit), so concurrent writers share each disk sync
+    # instead of queueing behind one another.
+
+    def __init__(self, directory: str, segment: int):
+        self.directory = directory
+        self.segment = segment
+        self._file = open(self._segment_path(segment), "ab")
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._pending: List[bytes] = []
+        self._appended = 0
+        self._durable = 0
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._flusher = threading.Thread(target=self._run, name="wal-flusher", daemon=True)
+        self._flusher.start()
+
+    def append(self, record: dict) -> int:
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        with self._cond:
+            self._pending.append(line)
+            self._appended += 1
+            self._cond.notify_all()
+            return self._appended
+
+    @property
+    def appended(self) -> int:
+        return self._appended
+
+    def sync(self, ticket: Optional[int] = None):
+        # Block until record number `ticket` (default: everything appended so
+        # far) has been fsynced.
+        with self._cond:
+            target = self._appended if ticket is None else ticket
+            while self._durable < target:
+                if self._error is not None:
+                    raise OSError("write-ahead log is not writable") from self._error
+                self._cond.wait()
+
+    def rotate(self) -> int:
+        # Start a new segment and return its number. Everything appended
+        # before the call ends up in the previous segments.
+        with self._io_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+                target = self._appended
+                old = self._file
+                self.segment += 1
+                self._file = open(self._segment_path(self.segment), "ab")
+            self._write(old, batch, target)
+            old.close()
+            return self.segment
+
+    def close(self):
+        self.sync()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._flusher.join()
+        self._file.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._pending:
+                    return
+            with self._io_lock:
+                with self._cond:
+                    batch, self._pending = self._pending, []
+                    target = self._appended
+                if batch:
+                    self._write(self._file, batch, target)
+
+    def _write(self, file, batch: List[bytes], target: int):
+        try:
+            if batch:
+                file.write(b"".join(batch))
+                file.flush()
+                os.fsync(file.fileno())
+        except OSError as exc:
+            with self._cond:
+                self._error = exc
+                self._cond.notify_all()
+            return
+        with self._cond:
+            self._durable = max(self._durable, target)
+            self._cond.notify_all()
+
+    def _segment_path(self, segment: int) -> str:
+        return segment_path(self.directory, segment)
+
+
+def segment_path(directory: str, segment: int) -> str:
+    return os.path.join(directory, f"wal-{segment:08d}.log")
+
+
+def snapshot_path(directory: str, version: int) -> str:
+    return os.path.join(directory, f"snapshot-{version:012d}.snap")
+
+
+def list_segments(directory: str) -> List[int]:
+    paths = glob.glob(os.path.join(directory, "wal-*.log"))
+    return sorted(int(os.path.basename(p)[4:-4]) for p in paths)
+
+
+def list_snapshots(directory: str) -> List[str]:
+    # Binary snapshots, plus JSON-lines ones written by older versions.
+    paths = glob.glob(os.path.join(directory, "snapshot-*.snap"))
+    paths += glob.glob(os.path.join(directory, "snapshot-*.jsonl"))
+    return sorted(paths)
+
+
+class MemoryStore:
+    # Storage backend interface. The catalogue itself always lives in memory;
+    # a store decides how its changes are made durable and shared:
+    #
+    #   recover()      load previous state, False if there is none
+    #   transaction()  wraps every mutating request
+    #   refresh()      pick up changes made by other processes
+    #   sync()         block until this process's changes are durable
+    #
+    # `store_id` names the stored catalogue, so catalogue versions from
+    # different stores (or restarts of a memory store) are never confused.
+    #
+    # This base class keeps nothing and is used when no storage is configured.
+
+    def __init__(self, catalogue: Catalogue):
+        self.catalogue = catalogue
+        self.store_id = uuid.uuid4().hex[:12]
+
+    def recover(self) -> bool:
+        return False
+
+    def start(self):
+        pass
+
+    def transaction(self):
+        return nullcontext()
+
+    def refresh(self):
+        pass
+
+    def sync(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class PersistentStore(MemoryStore):
+    # Durable storage for a Catalogue: a write-ahead log of every change
+    # record plus periodic compact snapshots written by a background thread.
+    #
+    # Snapshots are fuzzy: the log is rotated first and the catalogue is then
+    # copied while requests keep running. Recovery loads the newest snapshot
+    # and replays every segment from the rotation point onwards; records the
+    # snapshot already reflects replay as no-ops (see Catalogue.apply).
+    #
+    # Snapshots use the binary format in snapshot.py and are memory-mapped on
+    # recovery, so startup time depends on the log tail rather than on the
+    # size of the catalogue.
+
+    def __init__(self, directory: str, catalogue: Catalogue,
+                 snapshot_every: int = SNAPSHOT_EVERY,
+                 snapshot_interval: float = SNAPSHOT_INTERVAL):
+        super().__init__(catalogue)
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.snapshot_interval = snapshot_interval
+        self.wal: Optional[WriteAheadLog] = None
+        self._snapshot_due = threading.Event()
+        self._snapshot_lock = threading.Lock()
+        self._last_snapshot_at = 0
+        self._stopped = threading.Event()
+        self._snapshotter: Optional[threading.Thread] = None
+        os.makedirs(directory, exist_ok=True)
+        self.store_id = self._load_store_id()
+
+    def recover(self) -> bool:
+        # Load the newest snapshot and replay the log tail into the catalogue.
+        # Returns False when the directory holds no previous state.
+        snapshot_segment, found = self._load_snapshot()
+        segments = [s for s in list_segments(self.directory) if s >= snapshot_segment]
+        for segment in segments:
+            self._replay(segment_path(self.directory, segment))
+        found = found or self.catalogue.version > 0
+
+        next_segment = max(segments + [snapshot_segment - 1, 0]) + 1
+        self.wal = WriteAheadLog(self.directory, next_segment)
+        self.catalogue.subscribe(self._on_change, durable=True)
+        return found
+
+    def start(self):
+        self._snapshotter = threading.Thread(target=self._snapshot_loop,
+                                             name="snapshotter", daemon=True)
+        self._snapshotter.start()
+
+    def sync(self):
+        self.wal.sync()
+
+    def snapshot(self) -> str:
+        with self._snapshot_lock:
+            segment = self.wal.rotate()
+            self._last_snapshot_at = self.wal.appended
+            version = self.catalogue.version
+            # Fuzzy: books are copied and read while requests continue, so
+            # the set may already include changes after `version`; replaying
+            # them is idempotent.
+            books = list(self.catalogue)
+            path = snapshot_path(self.directory, version)
+            write_snapshot(path, books, version=version, walSegment=segment)
+            self._fsync_directory()
+
+            for old in list_snapshots(self.directory):
+                if old != path:
+                    os.remove(old)
+            for old in list_segments(self.directory):
+                if old < segment:
+                    os.remove(segment_path(self.directory, old))
+            return path
+
+    def close(self):
+        self._stopped.set()
+        self._snapshot_due.set()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        if self.wal is not None:
+            self.wal.close()
+
+    def _on_change(self, record: dict):
+        appended = self.wal.append(record)
+        if appended - self._last_snapshot_at >= self.snapshot_every:
+            self._snapshot_due.set()
+
+    def _snapshot_loop(self):
+        failed = False
+        while not self._stopped.is_set():
+            self._snapshot_due.wait(self.snapshot_interval)
+            self._snapshot_due.clear()
+            if self._stopped.is_set():
+                return
+            if failed or self.wal.appended > self._last_snapshot_at:
+                try:
+                    self.snapshot()
+                    failed = False
+                except Exception:
+                    # Disk full, EIO, ...: segments are only removed after a
+                    # snapshot succeeds, so just try again next interval.
+                    log.exception("snapshot of %s failed", self.directory)
+                    failed = True
+
+    def _load_snapshot(self) -> Tuple[int, bool]:
+        snapshots = list_snapshots(self.directory)
+        if not snapshots:
+            return 0, False
+        if snapshots[-1].endswith(".snap"):
+            snapshot = MappedSnapshot(snapshots[-1])
+            self.catalogue.load_snapshot(snapshot)
+            return snapshot.header["walSegment"], True
+        with open(snapshots[-1], "rb") as f:
+            header = json.loads(f.readline())
+            catalogue = self.catalogue
+            catalogue.clear()
+            for line in f:
+                catalogue.apply({"op": "add", "book": json.loads(line), "version": 0})
+        catalogue.version = header["version"]
+        return header["walSegment"], True
+
+    def _replay(self, path: str):
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write was never
+                    # acknowledged to a client, so it is safe to drop.
+                    break
+                self.catalogue.apply(record)
+
+    def _load_store_id(self) -> str:
+        path = os.path.join(self.directory, "store-id")
+        if not os.path.exists(path):
+            with open(path + ".tmp", "w") as f:
+                f.write(self.store_id)
+            os.replace(path + ".tmp", path)
+        with open(path) as f:
+            return f.read().strip()
+
+    def _fsync_directory(self):
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        fd = os.open(self.directory, os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def open_store(spec: str, catalogue: Catalogue) -> MemoryStore:
+    # "memory", "wal:<directory>" or "sqlite:<database file>".
+    kind, _, location = spec.partition(":")
+    if kind == "memory":
+        return MemoryStore(catalogue)
+    if kind == "wal" and location:
+        return PersistentStore(location, catalogue)
+    if kind == "sqlite" and location:
+        from sqlite_store import SqliteStore
+        return SqliteStore(location, catalogue)
+    raise ValueError(f"Unknown storage backend: {spec!r}")
@@ -0,0 +1,156 @@
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from serialization import dumps
+
+DEFAULT_HZ = 100
+MAX_OVERHEAD = 0.02
+MAX_DEPTH = 64
+MAX_STACKS = 20_000
+
+# A thread whose innermost Python frame is one of these is blocked (waiting
+# for work, a lock or the network) rather than running, and is not sampled.
+IDLE_LEAVES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"), ("socket.py", "accept"), ("socket.py", "readinto"),
+    ("socketserver.py", "serve_forever"), ("queue.py", "get"),
+    ("events.py", "_poll_loop"),
+}
+
+Frame = Tuple[str, str, int]
+
+
+class SamplingProfiler:
+    # Statistical profiler for a running process. A background thread wakes
+    # `hz` times a second, reads every other thread's Python stack from
+    # sys._current_frames() and counts identical stacks. Nothing is hooked
+    # into the code being profiled, so requests run at full speed between
+    # samples.
+    #
+    # Overhead is bounded two ways: when a sample takes longer than
+    # MAX_OVERHEAD of the interval (many threads, deep stacks) the interval
+    # is stretched to match, and at most MAX_STACKS distinct stacks are kept,
+    # further ones being counted under a single "[other]" frame.
+
+    def __init__(self, hz: int = DEFAULT_HZ, max_overhead: float = MAX_OVERHEAD):
+        self.hz = hz
+        self.max_overhead = max_overhead
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self.sampling_seconds = 0.0
+        self._stacks: Dict[Tuple[Frame, ...], int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._deadline: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: Optional[float] = None):
+        self._stop.clear()
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._deadline = None if seconds is None else time.monotonic() + seconds
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        interval = 1.0 / self.hz
+        while not self._stop.is_set():
+            if self._deadline is not None and time.monotonic() >= self._deadline:
+                break
+            start = time.perf_counter()
+            self._sample(me)
+            spent = time.perf_counter() - start
+            self.sampling_seconds += spent
+            self._stop.wait(max(interval - spent, spent / self.max_overhead))
+        self.stopped_at = time.time()
+
+    def _sample(self, me: int):
+        stacks = self._stacks
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse()
+            key = tuple(stack)
+            if key not in stacks and len(stacks) >= MAX_STACKS:
+                key = (("", "[other]", 0),)
+            stacks[key] = stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def stacks(self) -> List[Tuple[Tuple[Frame, ...], int]]:
+        # Copy under the GIL; the sampler may be adding to the dict.
+        return list(self._stacks.copy().items())
+
+    def collapsed(self) -> str:
+        # Brendan Gregg's folded format, one "frame;frame;frame count" per
+        # line, as read by flamegraph.pl, speedscope and most viewers.
+        lines = []
+        for stack, count in self.stacks():
+            lines.append(";".join(_label(f).replace(";", ":") for f in stack) + f" {count}")
+        return "\n".join(sorted(lines)) + "\n"
+
+    def speedscope(self, name: str = "library-backend") -> bytes:
+        frames: Dict[Frame, int] = {}
+        samples, weights = [], []
+        for stack, count in self.stacks():
+            samples.append([frames.setdefault(f, len(frames)) for f in stack])
+            weights.append(count)
+        return dumps({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "exporter": "library-backend",
+            "name": name,
+            "activeProfileIndex": 0,
+            "shared": {"frames": [{"name": f[1], "file": _relative(f[0]), "line": f[2]}
+                                  for f in frames]},
+            "profiles": [{"type": "sampled", "name": name, "unit": "none",
+                          "startValue": 0, "endValue": sum(weights),
+                          "samples": samples, "weights": weights}],
+        })
+
+    def summary(self) -> dict:
+        if self.started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.stopped_at or time.time()) - self.started_at
+        return {"running": self.running, "hz": self.hz, "samples": self.samples,
+                "stacks": len(self._stacks), "seconds": round(elapsed, 3),
+                "overhead": round(self.sampling_seconds / elapsed, 4) if elapsed else 0.0}
+
+
+def _relative(path: str) -> str:
+    try:
+        return os.path.relpath(path)
+    except ValueError:
+        return path
+
+
+def _label(frame: Frame) -> str:
+    filename, name, line = frame
+    return f"{name} ({_relative(filename)}:{line})" if filename else name
+
+
+def write_profile(profiler: SamplingProfiler, path: str):
+    # Format by extension: .json for speedscope, anything else collapsed.
+    data = profiler.speedscope() if path.endswith(".json") else profiler.collapsed().encode()
+    with open(path, "wb") as f:
+        f.write(data)
@@ -0,0 +1,157 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Set
+
+from catalogue import Book
+
+DEFAULT_MAX_BYTES = 64 * 2**20
+# Rough per-entry and per-tag bookkeeping cost counted against the cap.
+ENTRY_OVERHEAD = 256
+TAG_OVERHEAD = 64
+
+# Dependency tags. CATALOGUE changes with anything, BOOKS with the set of
+# books (adds and deletes), LOANS with any issue or return; a book's own tag
+# and its author's change with that book.
+CATALOGUE = "catalogue"
+BOOKS = "books"
+LOANS = "loans"
+
+
+def book_tag(book_id: int) -> str:
+    return f"book:{book_id}"
+
+
+def author_tag(author: str) -> str:
+    return f"author:{author.lower()}"
+
+
+class Entry(NamedTuple):
+    body: bytes
+    mimetype: str
+    tags: frozenset
+    size: int
+
+
+class ResponseCache:
+    # In-process cache of encoded response bodies with LRU eviction under a
+    # byte cap. Each entry carries the dependency tags it was built from and
+    # a reverse index maps tags to keys, so invalidating a tag drops exactly
+    # the entries that depend on it. Bodies over a quarter of the cap are not
+    # cached at all rather than evicting everything else.
+    #
+    # A response built while an invalidation ran may already be stale, so
+    # put() takes the token() read before building and drops the entry if
+    # anything was invalidated since.
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.bytes = 0
+        self._entries: "OrderedDict[str, Entry]" = OrderedDict()
+        self._keys: Dict[str, Set[str]] = {}
+        self._token = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def token(self) -> int:
+        return self._token
+
+    def put(self, key: str, body: bytes, mimetype: str, tags: Iterable[str], token: int):
+        tags = frozenset(tags)
+        size = len(body) + len(key) + ENTRY_OVERHEAD + TAG_OVERHEAD * len(tags)
+        if size > self.max_bytes // 4:
+            return
+        with self._lock:
+            if token != self._token:
+                return
+            self._discard(key)
+            self._entries[key] = Entry(body, mimetype, tags, size)
+            self.bytes += size
+            for tag in tags:
+                self._keys.setdefault(tag, set()).add(key)
+            while self.bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tags: Iterable[str]):
+        with self._lock:
+            self._token += 1
+            if not self._entries:
+                return
+            for tag in tags:
+                for key in self._keys.pop(tag, ()):
+                    if self._discard(key):
+                        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._token += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._keys.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes,
+                    "maxBytes": self.max_bytes, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "invalidations": self.invalidations}
+
+    def _discard(self, key: str) -> bool:
+        # Called with _lock held.
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys[tag]
+        return True
+
+
+class CacheInvalidator:
+    # Catalogue index (see Catalogue.add_index) that turns every change to
+    # the catalogue into tag invalidations. Hooking in as an index rather
+    # than a subscriber also covers reloads, which clear the catalogue and
+    # re-add books without publishing change records.
+
+    def __init__(self, cache: ResponseCache):
+        self.cache = cache
+
+    def add(self, book: Book):
+        self.cache.invalidate(self._membership_tags(book))
+
+    def discard(self, book: Book):
+        self.cache.invalidate(self._membership_tags(book))
+
+    def update(self, book: Book):
+        self.cache.invalidate((CATALOGUE, LOANS, book_tag(book.id)))
+
+    def clear(self):
+        self.cache.clear()
+
+    @staticmethod
+    def _membership_tags(book: Book) -> Iterator[str]:
+        # Lazy, so bulk loads into an empty cache skip formatting the tags.
+        yield CATALOGUE
+        yield BOOKS
+        yield author_tag(book.author)
+        yield book_tag(book.id)
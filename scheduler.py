@@ -0,0 +1,55 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from catalogue import Catalogue
+
+MAX_SLEEP = 60.0
+
+
+class OverdueScheduler:
+    # Background thread that moves books into the catalogue's overdue set at
+    # the moment they fall due, rather than whenever the next stats request
+    # happens to look. It sleeps until the earliest due date in the heap and
+    # is woken early by new issues, which may fall due sooner. Sleeps are
+    # capped at MAX_SLEEP so a wall-clock jump is noticed within a minute.
+    #
+    # Outstanding fines need no pass of their own at midnight: the overdue
+    # set keeps the sum of its due days, so the total for the current day
+    # follows from the date alone (see DueDateIndex.overdue_days).
+
+    def __init__(self, catalogue: Catalogue):
+        self.catalogue = catalogue
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        catalogue.subscribe(self._on_change, replay=True)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="overdue-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _on_change(self, record: dict):
+        # Any new loan may come due before the current wake-up time; waking
+        # is cheap (nothing is due, so advancing just peeks at the heap) and
+        # bursts of issues coalesce into one wake-up.
+        if record["op"] == "issue" or (record["op"] == "add" and record["book"].get("isIssued")):
+            self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.clear()
+            now = datetime.now()
+            next_due = self.catalogue.advance_overdue(now)
+            timeout = MAX_SLEEP
+            if next_due is not None:
+                # The index moves books whose due date is strictly before now.
+                wait = (next_due - now + timedelta(microseconds=1)).total_seconds()
+                timeout = min(max(wait, 0.0), MAX_SLEEP)
+            self._wake.wait(timeout)
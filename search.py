@@ -0,0 +1,223 @@
+import heapq
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from catalogue import Book
+from sortedindex import SortedList
+
+TOKEN_RE = re.compile(r"\w+")
+MAX_PREFIX = 8
+TITLE_WEIGHT = 2
+AUTHOR_WEIGHT = 1
+EXACT_BONUS = 2
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex:
+    # Inverted index over title, author and id tokens. Every token is also
+    # registered under each of its prefixes up to MAX_PREFIX characters, so a
+    # typeahead query resolves to a dict lookup per term. Matching is AND over
+    # the query terms; candidates are ranked by field weight with a bonus for
+    # whole-token matches.
+    #
+    # Each prefix keeps the score a query term equal to it gives every book,
+    # and the books bucketed by that score, ids ascending. A single-term
+    # query -- what a search box sends on every keystroke -- reads its page
+    # off the top buckets in O(log n + offset + limit) however many books
+    # match. Other queries intersect the terms' books and rank them in
+    # rank(), which only reads dict entries and so can run without the
+    # catalogue lock.
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._scores: Dict[str, Dict[int, int]] = {}
+        self._ranked: Dict[str, Dict[int, SortedList]] = {}
+        self._doc_tokens: Dict[int, Tuple[str, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_tokens)
+
+    def add(self, book: Book):
+        weights = _weights(book)
+        for token, weight in weights.items():
+            self._postings.setdefault(token, {})[book.id] = weight
+        for prefix, score in _prefix_scores(weights).items():
+            self._scores.setdefault(prefix, {})[book.id] = score
+            bands = self._ranked.setdefault(prefix, {})
+            band = bands.get(score)
+            if band is None:
+                band = bands[score] = SortedList()
+            band.add(book.id)
+        self._doc_tokens[book.id] = tuple(weights)
+
+    def build(self, books: Iterable[Book]):
+        # Bulk add() into an empty index: each prefix's score buckets are
+        # made once at the end, sorted in one go, instead of one insert at a
+        # time.
+        postings, scores, doc_tokens = self._postings, self._scores, self._doc_tokens
+        for book in books:
+            book_id = book.id
+            weights = _weights(book)
+            for token, weight in weights.items():
+                posting = postings.get(token)
+                if posting is None:
+                    posting = postings[token] = {}
+                posting[book_id] = weight
+            for prefix, score in _prefix_scores(weights).items():
+                prefix_scores = scores.get(prefix)
+                if prefix_scores is None:
+                    prefix_scores = scores[prefix] = {}
+                prefix_scores[book_id] = score
+            doc_tokens[book_id] = tuple(weights)
+        for prefix, prefix_scores in scores.items():
+            self._ranked[prefix] = {
+                score: SortedList([i for i, s in prefix_scores.items() if s == score])
+                for score in set(prefix_scores.values())}
+
+    def discard(self, book: Book):
+        tokens = self._doc_tokens.pop(book.id, None)
+        if tokens is None:
+            return
+        weights = {token: self._postings[token].pop(book.id) for token in tokens}
+        for token in tokens:
+            if not self._postings[token]:
+                del self._postings[token]
+        for prefix, score in _prefix_scores(weights).items():
+            scores = self._scores[prefix]
+            del scores[book.id]
+            bands = self._ranked[prefix]
+            band = bands[score]
+            band.discard(book.id)
+            if not band:
+                del bands[score]
+            if not scores:
+                del self._scores[prefix]
+                del self._ranked[prefix]
+
+    def clear(self):
+        self._postings.clear()
+        self._scores.clear()
+        self._ranked.clear()
+        self._doc_tokens.clear()
+
+    def search(self, query: str, offset: int = 0,
+               limit: int = 20) -> Tuple[List[int], int]:
+        # Returns (book ids for the requested page, total number of matches).
+        return self.match(query, offset, limit)()
+
+    def match(self, query: str, offset: int = 0,
+              limit: int = 20) -> Callable[[], Tuple[List[int], int]]:
+        # The part of search() that needs the index to hold still (call it
+        # with the catalogue lock held): finds the matching books and returns
+        # a function that ranks them, which may run after the lock is
+        # released. Books deleted in between are left out of the page.
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return lambda: ([], 0)
+
+        postings = []
+        for term in terms:
+            scores = self._scores.get(term[:MAX_PREFIX])
+            if not scores:
+                return lambda: ([], 0)
+            postings.append(scores)
+        if len(terms) == 1 and len(terms[0]) <= MAX_PREFIX:
+            result = self._top(terms[0], offset, limit), len(postings[0])
+            return lambda: result
+
+        postings.sort(key=len)
+        candidates = postings[0].keys()
+        for scores in postings[1:]:
+            candidates = candidates & scores.keys()
+        if not isinstance(candidates, set):
+            candidates = set(candidates)
+        return lambda: self._rank(candidates, terms, offset, limit)
+
+    def _top(self, term: str, offset: int, limit: int) -> List[int]:
+        ids: List[int] = []
+        bands = self._ranked[term]
+        for score in sorted(bands, reverse=True):
+            band = bands[score]
+            if offset >= len(band):
+                offset -= len(band)
+                continue
+            ids.extend(band.islice(offset, offset + limit - len(ids)))
+            offset = 0
+            if len(ids) == limit:
+                break
+        return ids
+
+    def _rank(self, candidates: set, terms: List[str], offset: int,
+              limit: int) -> Tuple[List[int], int]:
+        long_terms = [t for t in terms if len(t) > MAX_PREFIX]
+        if long_terms:
+            candidates = {book_id for book_id in candidates
+                          if all(self._has_prefix(book_id, t) for t in long_terms)}
+        total = len(candidates)
+        scored = []
+        for book_id in candidates:
+            score = self._score(book_id, terms)
+            if score is not None:
+                scored.append((-score, book_id))
+        top = heapq.nsmallest(offset + limit, scored)
+        return [book_id for _, book_id in top[offset:]], total
+
+    def _score(self, book_id: int, terms: List[str]) -> Optional[int]:
+        # None once the book has left the index.
+        score = 0
+        for term in terms:
+            if len(term) <= MAX_PREFIX:
+                term_score = self._scores.get(term, {}).get(book_id)
+            else:
+                term_score = self._long_term_score(book_id, term)
+            if term_score is None:
+                return None
+            score += term_score
+        return score
+
+    def _long_term_score(self, book_id: int, term: str) -> Optional[int]:
+        tokens = self._doc_tokens.get(book_id)
+        if tokens is None:
+            return None
+        if term in tokens:
+            return self._postings.get(term, {}).get(book_id, 0) * EXACT_BONUS
+        return max((self._postings.get(token, {}).get(book_id, 0) for token in tokens
+                    if token.startswith(term)), default=None)
+
+    def _has_prefix(self, book_id: int, term: str) -> bool:
+        return any(token.startswith(term) for token in self._doc_tokens.get(book_id, ()))
+
+
+def _weights(book: Book) -> Dict[str, int]:
+    weights: Dict[str, int] = {}
+    for token in tokenize(book.title):
+        weights[token] = weights.get(token, 0) + TITLE_WEIGHT
+    for token in tokenize(book.author):
+        weights[token] = weights.get(token, 0) + AUTHOR_WEIGHT
+    weights.setdefault(str(book.id), TITLE_WEIGHT)
+    return weights
+
+
+def _prefix_scores(weights: Dict[str, int]) -> Dict[str, int]:
+    # Score of each prefix of a book's tokens as a query term: the token's
+    # weight with EXACT_BONUS when the term is a whole token, else the best
+    # weight among the tokens it is a prefix of.
+    scores: Dict[str, int] = {}
+    for token, weight in weights.items():
+        for prefix in _prefixes(token):
+            if scores.get(prefix, 0) < weight:
+                scores[prefix] = weight
+    for token, weight in weights.items():
+        if len(token) <= MAX_PREFIX:
+            scores[token] = weight * EXACT_BONUS
+    return scores
+
+
+@lru_cache(maxsize=1 << 16)
+def _prefixes(token: str) -> Tuple[str, ...]:
+    # Titles and authors share most of their words, so this is cached.
+    return tuple(token[:i] for i in range(1, min(len(token), MAX_PREFIX) + 1))
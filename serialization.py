@@ -0,0 +1,26 @@
+import json
+from typing import Any, Iterable
+
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # optional, used when installed
+    orjson = None
+
+JSON_MIMETYPE = "application/json"
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def json_array(items: Iterable[bytes]) -> bytes:
+    # Joins already-encoded JSON values into a JSON array.
+    return b"[" + b",".join(items) + b"]"
+
+
+def json_response(body: bytes, status: int = 200) -> Response:
+    return Response(body, status=status, mimetype=JSON_MIMETYPE)
@@ -0,0 +1,255 @@
+import json
+import mmap
+import os
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from itertools import compress
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from catalogue import EPOCH, MICROSECOND, Book
+
+MAGIC = b"LIBSNAP1"
+# Bytes reserved at the start of the file for the magic, length and header.
+HEADER_SLOT = 4096
+NO_DUE = -2**63
+ISSUED = 1
+
+# Column name -> array typecode. Each column starts on an 8-byte boundary.
+COLUMNS = {
+    "id": "q",           # in catalogue order
+    "due": "q",          # microseconds since EPOCH, NO_DUE when not issued
+    "title": "q",        # n + 1 offsets into the title heap
+    "year": "q",
+    "author": "i",       # index into the author table
+    "flags": "B",
+    "sortedId": "q",     # ids ascending ...
+    "position": "i",     # ... and the record each one is at
+    "authorText": "q",   # a + 1 offsets into the author heap
+}
+
+
+def write_snapshot(path: str, books: Iterable[Book], **header):
+    # Writes `books` (in the given order) plus any extra header fields, via
+    # a temporary file so readers never see a partial snapshot. The caller
+    # handles fsync of the directory. Ids and years must fit in int64 (see
+    # catalogue.int64); anything wider raises OverflowError.
+    ids, due, years, authors, flags = array("q"), array("q"), array("q"), array("i"), array("B")
+    titles: List[bytes] = []
+    title_offsets = array("q", [0])
+    author_index: Dict[str, int] = {}
+    for book in books:
+        ids.append(book.id)
+        due_date = book.due_date
+        due.append(NO_DUE if due_date is None else (due_date - EPOCH) // MICROSECOND)
+        years.append(book.year)
+        authors.append(author_index.setdefault(book.author, len(author_index)))
+        flags.append(ISSUED if book.is_issued else 0)
+        title = book.title.encode()
+        titles.append(title)
+        title_offsets.append(title_offsets[-1] + len(title))
+    author_texts = [a.encode() for a in author_index]
+    author_offsets = array("q", [0])
+    for text in author_texts:
+        author_offsets.append(author_offsets[-1] + len(text))
+    order = sorted(range(len(ids)), key=ids.__getitem__)
+    columns = {
+        "id": ids, "due": due, "title": title_offsets, "year": years, "author": authors,
+        "flags": flags, "sortedId": array("q", (ids[i] for i in order)),
+        "position": array("i", order), "authorText": author_offsets,
+    }
+    heaps = {"titleHeap": b"".join(titles), "authorHeap": b"".join(author_texts)}
+
+    # Lay the sections out after a fixed-size slot for the JSON header.
+    header.update(count=len(ids), authors=len(author_index), byteorder=sys.byteorder)
+    sections: Dict[str, Tuple[int, int]] = {}
+    offset = HEADER_SLOT
+    for name, data in list(columns.items()) + list(heaps.items()):
+        size = len(data) * data.itemsize if isinstance(data, array) else len(data)
+        sections[name] = (offset, size)
+        offset += _align(size)
+    header["sections"] = sections
+    encoded = json.dumps(header).encode()
+    if len(encoded) > HEADER_SLOT - len(MAGIC) - 4:
+        raise ValueError("snapshot header too large")
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + len(encoded).to_bytes(4, "little") + encoded)
+            for name, data in list(columns.items()) + list(heaps.items()):
+                f.seek(sections[name][0])
+                f.write(data.tobytes() if isinstance(data, array) else data)
+            f.truncate(offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class MappedSnapshot:
+    # Read-only view of a snapshot file through mmap. Columns are memoryviews
+    # straight onto the mapping, so opening one costs the header parse and
+    # nothing per book, and the pages live in the OS page cache where every
+    # worker process mapping the same file shares them. Books are decoded
+    # one at a time by book().
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a catalogue snapshot")
+        size = int.from_bytes(view[len(MAGIC):len(MAGIC) + 4], "little")
+        self.header = json.loads(bytes(view[len(MAGIC) + 4:len(MAGIC) + 4 + size]))
+        if self.header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written on a {self.header['byteorder']}-endian machine")
+        sections = self.header["sections"]
+        for name, typecode in COLUMNS.items():
+            start, length = sections[name]
+            setattr(self, "_" + name, view[start:start + length].cast(typecode))
+        start, length = sections["titleHeap"]
+        self._title_heap = view[start:start + length]
+        start, length = sections["authorHeap"]
+        self._author_heap = view[start:start + length]
+        self._author_cache: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return self.header["count"]
+
+    def find(self, book_id: int) -> int:
+        # Record number of a book id, or -1.
+        i = bisect_left(self._sortedId, book_id)
+        if i < len(self._sortedId) and self._sortedId[i] == book_id:
+            return self._position[i]
+        return -1
+
+    def id_at(self, record: int) -> int:
+        return self._id[record]
+
+    def book(self, record: int) -> Book:
+        titles = self._title
+        due = self._due[record]
+        return Book(self._id[record],
+                    str(self._title_heap[titles[record]:titles[record + 1]], "utf-8"),
+                    self._author_name(self._author[record]), self._year[record],
+                    is_issued=bool(self._flags[record] & ISSUED),
+                    due_date=None if due == NO_DUE else EPOCH + due * MICROSECOND)
+
+    def books(self) -> "LazyBooks":
+        return LazyBooks(self)
+
+    def sorted_ids(self) -> List[int]:
+        return self._sortedId.tolist()
+
+    def issued_count(self) -> int:
+        return bytes(self._flags).count(ISSUED)
+
+    def loans(self) -> Iterator[Tuple[int, datetime]]:
+        # (book id, due date) of every issued book, without decoding books.
+        issued = bytes(self._flags)
+        for book_id, due in zip(compress(self._id, issued), compress(self._due, issued)):
+            if due != NO_DUE:
+                yield book_id, EPOCH + due * MICROSECOND
+
+    def close(self):
+        # Only once nothing holds a memoryview onto the mapping any more.
+        self._map.close()
+
+    def _author_name(self, index: int) -> str:
+        author = self._author_cache.get(index)
+        if author is None:
+            offsets = self._authorText
+            author = str(self._author_heap[offsets[index]:offsets[index + 1]], "utf-8")
+            author = self._author_cache.setdefault(index, sys.intern(author))
+        return author
+
+
+class LazyBooks:
+    # The id -> Book mapping a Catalogue keeps, backed by a MappedSnapshot.
+    # A book is decoded the first time it is looked up and kept from then on,
+    # so in-place changes (issue, return) stick; books added later and ids
+    # deleted from the snapshot are tracked beside it. Iteration follows
+    # dict semantics: snapshot order, then books added since, and decodes
+    # books it has not kept yet without keeping them.
+
+    def __init__(self, snapshot: MappedSnapshot):
+        self.snapshot = snapshot
+        self._loaded: Dict[int, Book] = {}
+        self._added: Dict[int, Book] = {}
+        self._deleted = set()
+        # Orders a first lookup's store into _loaded against pop().
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.snapshot) - len(self._deleted) + len(self._added)
+
+    def __contains__(self, book_id: int) -> bool:
+        return self.get(book_id) is not None
+
+    def __getitem__(self, book_id: int) -> Book:
+        book = self.get(book_id)
+        if book is None:
+            raise KeyError(book_id)
+        return book
+
+    def __setitem__(self, book_id: int, book: Book):
+        if book_id not in self._deleted and self.snapshot.find(book_id) >= 0:
+            self._loaded[book_id] = book
+        else:
+            self._added[book_id] = book
+
+    def get(self, book_id: int, default: Optional[Book] = None) -> Optional[Book]:
+        book = self._added.get(book_id) or self._loaded.get(book_id)
+        if book is not None:
+            return book
+        if book_id in self._deleted:
+            return default
+        record = self.snapshot.find(book_id)
+        if record < 0:
+            return default
+        book = self.snapshot.book(record)
+        with self._lock:
+            # The book may have been deleted while it was decoded; setdefault
+            # so concurrent first lookups end up with the same object.
+            if book_id in self._deleted:
+                return default
+            return self._loaded.setdefault(book_id, book)
+
+    def pop(self, book_id: int, default: Optional[Book] = None) -> Optional[Book]:
+        book = self._added.pop(book_id, None)
+        if book is not None:
+            return book
+        book = self.get(book_id)
+        if book is None:
+            return default
+        with self._lock:
+            self._deleted.add(book_id)
+            self._loaded.pop(book_id, None)
+        return book
+
+    def values(self) -> Iterator[Book]:
+        # A snapshot id deleted and added again after the walk passed it was
+        # already yielded, so its new book is left out of the tail.
+        snapshot, loaded, deleted = self.snapshot, self._loaded, self._deleted
+        skipped = set()
+        for record in range(len(snapshot)):
+            book_id = snapshot.id_at(record)
+            if book_id in deleted:
+                skipped.add(book_id)
+                continue
+            book = loaded.get(book_id)
+            yield book if book is not None else snapshot.book(record)
+        for book in list(self._added.values()):
+            if book.id in skipped or snapshot.find(book.id) < 0:
+                yield book
+
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
@@ -0,0 +1,145 @@
+from bisect import bisect_left, bisect_right, insort
+from itertools import chain
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+
+class SortedList:
+    # Values are kept in a list of sorted buckets plus the max of each bucket.
+    # Finding a bucket is a bisect over the maxes and inserting or deleting
+    # only shifts one bucket of at most 2 * LOAD items, so updates stay cheap
+    # at millions of entries while ordered range scans remain plain list walks.
+
+    LOAD = 1000
+
+    def __init__(self, values: Iterable[Any] = ()):
+        self._lists: List[List[Any]] = []
+        self._maxes: List[Any] = []
+        values = sorted(values)
+        for i in range(0, len(values), self.LOAD):
+            bucket = values[i:i + self.LOAD]
+            self._lists.append(bucket)
+            self._maxes.append(bucket[-1])
+        self._len = len(values)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Any]:
+        return chain.from_iterable(self._lists)
+
+    def __reversed__(self) -> Iterator[Any]:
+        return chain.from_iterable(reversed(bucket) for bucket in reversed(self._lists))
+
+    def __contains__(self, value: Any) -> bool:
+        pos = bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            return False
+        bucket = self._lists[pos]
+        i = bisect_left(bucket, value)
+        return i < len(bucket) and bucket[i] == value
+
+    def add(self, value: Any):
+        maxes = self._maxes
+        if not maxes:
+            self._lists.append([value])
+            maxes.append(value)
+        else:
+            pos = bisect_left(maxes, value)
+            if pos == len(maxes):
+                pos -= 1
+                self._lists[pos].append(value)
+                maxes[pos] = value
+            else:
+                insort(self._lists[pos], value)
+            if len(self._lists[pos]) > 2 * self.LOAD:
+                self._split(pos)
+        self._len += 1
+
+    def discard(self, value: Any) -> bool:
+        pos = bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            return False
+        bucket = self._lists[pos]
+        i = bisect_left(bucket, value)
+        if i == len(bucket) or bucket[i] != value:
+            return False
+        del bucket[i]
+        if bucket:
+            self._maxes[pos] = bucket[-1]
+        else:
+            del self._lists[pos]
+            del self._maxes[pos]
+        self._len -= 1
+        return True
+
+    def remove(self, value: Any):
+        if not self.discard(value):
+            raise ValueError(f"{value!r} not in list")
+
+    def clear(self):
+        self._lists.clear()
+        self._maxes.clear()
+        self._len = 0
+
+    def islice(self, start: int, stop: int) -> List[Any]:
+        # Values at positions start..stop-1, skipping whole buckets to start.
+        values: List[Any] = []
+        for bucket in self._lists:
+            size = len(bucket)
+            if start < size:
+                values.extend(bucket[start:stop])
+                if stop <= size:
+                    break
+            start = max(start - size, 0)
+            stop -= size
+        return values
+
+    def irange(self, minimum: Optional[Any] = None, maximum: Optional[Any] = None,
+               inclusive: Tuple[bool, bool] = (True, True),
+               reverse: bool = False) -> Iterator[Any]:
+        # Yield values between minimum and maximum (None means unbounded) in
+        # order, starting with a bisect so cost is O(log n + k) for k values.
+        lists, maxes = self._lists, self._maxes
+        if not maxes:
+            return
+        lo_incl, hi_incl = inclusive
+        if minimum is None:
+            lo_pos, lo_idx = 0, 0
+        else:
+            find = bisect_left if lo_incl else bisect_right
+            lo_pos = find(maxes, minimum)
+            if lo_pos == len(maxes):
+                return
+            lo_idx = find(lists[lo_pos], minimum)
+        if maximum is None:
+            hi_pos, hi_idx = len(maxes) - 1, len(lists[-1])
+        else:
+            find = bisect_right if hi_incl else bisect_left
+            hi_pos = find(maxes, maximum)
+            if hi_pos == len(maxes):
+                hi_pos, hi_idx = len(maxes) - 1, len(lists[-1])
+            else:
+                hi_idx = find(lists[hi_pos], maximum)
+        if (lo_pos, lo_idx) >= (hi_pos, hi_idx):
+            return
+
+        if not reverse:
+            for pos in range(lo_pos, hi_pos + 1):
+                bucket = lists[pos]
+                start = lo_idx if pos == lo_pos else 0
+                stop = hi_idx if pos == hi_pos else len(bucket)
+                for i in range(start, stop):
+                    yield bucket[i]
+        else:
+            for pos in range(hi_pos, lo_pos - 1, -1):
+                bucket = lists[pos]
+                start = lo_idx if pos == lo_pos else 0
+                stop = hi_idx if pos == hi_pos else len(bucket)
+                for i in range(stop - 1, start - 1, -1):
+                    yield bucket[i]
+
+    def _split(self, pos: int):
+        bucket = self._lists[pos]
+        half = len(bucket) // 2
+        self._lists[pos:pos + 1] = [bucket[:half], bucket[half:]]
+        self._maxes[pos:pos + 1] = [bucket[half - 1], bucket[-1]]
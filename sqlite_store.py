@@ -0,0 +1,251 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Tuple
+
+from catalogue import Catalogue
+from persistence import MemoryStore
+from snapshot import MappedSnapshot, write_snapshot
+
+KEEP_CHANGES = 10_000
+# Rewrite the snapshot at startup once it is this many versions behind.
+SNAPSHOT_LAG = KEEP_CHANGES // 2
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    is_issued INTEGER NOT NULL DEFAULT 0,
+    due_date TEXT
+);
+CREATE TABLE IF NOT EXISTS changes (
+    version INTEGER PRIMARY KEY,
+    record TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS circulation (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    book INTEGER NOT NULL,
+    kind INTEGER NOT NULL,
+    value INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS circulation_book ON circulation (book);
+"""
+
+
+class SqliteStore(MemoryStore):
+    # Shares one catalogue between processes (e.g. gunicorn workers) through
+    # a SQLite database in WAL mode.
+    #
+    # Each process still serves reads from its own in-memory Catalogue and
+    # its indexes. Every change record is written to the `changes` table
+    # together with the updated `books` row; before each request a process
+    # replays the changes it has not seen yet, which is a single primary-key
+    # range query when nothing has changed.
+    #
+    # Mutating requests run inside BEGIN IMMEDIATE, which holds SQLite's
+    # write lock across all processes. The process catches up first, so the
+    # handler's checks (not found, already issued, ...) see the latest state
+    # and its new version number is the next global one.
+    #
+    # Starting a worker would mean reading every row of `books`, so a binary
+    # snapshot of the catalogue is kept next to the database (<path>.snapshot,
+    # see snapshot.py). A worker maps it, replays the changes made since and
+    # decodes books only as they are used; every worker maps the same file,
+    # so its pages are shared. When the changes since have been pruned the
+    # worker reads `books` as before. A worker that finds the snapshot
+    # missing or SNAPSHOT_LAG versions old writes a new one in the background.
+
+    def __init__(self, path: str, catalogue: Catalogue, keep_changes: int = KEEP_CHANGES):
+        super().__init__(catalogue)
+        self.path = path
+        self.snapshot_path = path + ".snapshot"
+        self._snapshot_version = 0
+        self.keep_changes = keep_changes
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('store_id', ?)",
+                     (self.store_id,))
+        self.store_id = conn.execute("SELECT value FROM meta WHERE key = 'store_id'").fetchone()[0]
+        catalogue.subscribe(self._on_change, durable=True)
+
+    def recover(self) -> bool:
+        self.refresh()
+        lag = self.catalogue.version - self._snapshot_version
+        if lag and (not self._snapshot_version or lag >= min(SNAPSHOT_LAG, self.keep_changes)):
+            threading.Thread(target=self.write_snapshot, name="snapshotter", daemon=True).start()
+        return self.catalogue.version > 0
+
+    def write_snapshot(self):
+        # Fuzzy like PersistentStore's snapshots: the version is read before
+        # the books are copied and replaying changes after it is idempotent.
+        version = self.catalogue.version
+        books = list(self.catalogue)
+        try:
+            write_snapshot(self.snapshot_path, books, version=version, storeId=self.store_id)
+        except Exception:
+            # Without a snapshot the next worker reads the books table.
+            log.exception("writing %s failed", self.snapshot_path)
+
+    def append_event(self, ts: int, book_id: int, kind: int, value: int):
+        # Circulation history shared by every worker (see circulation.py).
+        # Called from a change listener, so it commits with the change.
+        if not self._in_transaction():
+            raise RuntimeError("circulation events must be written inside store.transaction()")
+        self._connection().execute("INSERT INTO circulation (ts, book, kind, value) "
+                                   "VALUES (?, ?, ?, ?)", (ts, book_id, kind, value))
+
+    def last_event(self, book_id: int, kinds: Iterable[int]) -> Optional[Tuple[int, int]]:
+        # (kind, ts) of the book's latest event of one of `kinds`.
+        kinds = list(kinds)
+        return self._connection().execute(
+            "SELECT kind, ts FROM circulation WHERE book = ? AND kind IN (%s) "
+            "ORDER BY id DESC LIMIT 1" % ",".join("?" * len(kinds)),
+            (book_id, *kinds)).fetchone()
+
+    def events_since(self, after: int) -> Tuple[int, List[Tuple[int, int, int, int]]]:
+        # Events appended after event id `after`, in order, and the new
+        # last id. Writers hold the write lock, so ids commit in order.
+        rows = self._connection().execute(
+            "SELECT id, ts, book, kind, value FROM circulation WHERE id > ? ORDER BY id",
+            (after,)).fetchall()
+        return (rows[-1][0] if rows else after), [row[1:] for row in rows]
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if self._in_transaction():
+                yield
+                return
+
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            self._local.active = True
+            try:
+                self._catch_up(conn)
+                yield
+            except BaseException:
+                conn.execute("ROLLBACK")
+                # The in-memory catalogue may be ahead of the database now.
+                self._reload(conn)
+                raise
+            else:
+                conn.execute("COMMIT")
+            finally:
+                self._local.active = False
+
+    def refresh(self):
+        conn = self._connection()
+        row = conn.execute("SELECT max(version) FROM changes").fetchone()
+        if row[0] is not None and row[0] > self.catalogue.version:
+            with self._lock:
+                self._catch_up(conn)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _load_snapshot(self, oldest: int, latest: int) -> bool:
+        # Loads the snapshot file if its version is between `oldest` (the
+        # change before the first one retained) and `latest`.
+        if not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            snapshot = MappedSnapshot(self.snapshot_path)
+        except (OSError, ValueError):
+            return False
+        header = snapshot.header
+        if header.get("storeId") != self.store_id or not oldest <= header["version"] <= latest:
+            return False
+        self.catalogue.load_snapshot(snapshot)
+        self._snapshot_version = header["version"]
+        return True
+
+    def _in_transaction(self) -> bool:
+        return getattr(self._local, "active", False)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def _catch_up(self, conn: sqlite3.Connection):
+        version = self.catalogue.version
+        rows = conn.execute("SELECT version, record FROM changes WHERE version > ? "
+                            "ORDER BY version", (version,)).fetchall()
+        if not rows:
+            return
+        if rows[0][0] != version + 1:
+            # Older changes were pruned before this process saw them; start
+            # from the snapshot if the retained changes reach back to it.
+            if not self._load_snapshot(rows[0][0] - 1, rows[-1][0]):
+                self._reload(conn)
+                return
+            rows = [row for row in rows if row[0] > self.catalogue.version]
+        for _, record in rows:
+            self.catalogue.apply(json.loads(record))
+
+    def _reload(self, conn: sqlite3.Connection):
+        in_transaction = conn.in_transaction
+        if not in_transaction:
+            conn.execute("BEGIN")
+        try:
+            version = conn.execute("SELECT max(version) FROM changes").fetchone()[0] or 0
+            rows = conn.execute("SELECT id, title, author, year, is_issued, due_date "
+                                "FROM books ORDER BY rowid").fetchall()
+        finally:
+            if not in_transaction:
+                conn.execute("COMMIT")
+        catalogue = self.catalogue
+        catalogue.clear()
+        for book_id, title, author, year, is_issued, due_date in rows:
+            catalogue.apply({"op": "add", "version": 0, "book": {
+                "id": book_id, "title": title, "author": author, "year": year,
+                "isIssued": bool(is_issued), "dueDate": due_date,
+            }})
+        catalogue.version = version
+
+    def _on_change(self, record: dict):
+        if not self._in_transaction():
+            raise RuntimeError("catalogue changes must run inside store.transaction()")
+        conn = self._connection()
+        op = record["op"]
+        if op == "add":
+            book = record["book"]
+            conn.execute("INSERT INTO books (id, title, author, year, is_issued, due_date) "
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+                         (book["id"], book["title"], book["author"], book["year"],
+                          int(book["isIssued"]), book["dueDate"]))
+        elif op == "delete":
+            conn.execute("DELETE FROM books WHERE id = ?", (record["id"],))
+        elif op == "issue":
+            conn.execute("UPDATE books SET is_issued = 1, due_date = ? WHERE id = ?",
+                         (record["dueDate"], record["id"]))
+        elif op == "return":
+            conn.execute("UPDATE books SET is_issued = 0, due_date = NULL WHERE id = ?",
+                         (record["id"],))
+        version = record["version"]
+        conn.execute("INSERT INTO changes (version, record) VALUES (?, ?)",
+                     (version, json.dumps(record, separators=(",", ":"))))
+        if version % self.keep_changes == 0:
+            conn.execute("DELETE FROM changes WHERE version <= ?",
+                         (version - self.keep_changes,))